@@ -6,15 +6,16 @@ from flask_login import LoginManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from dotenv import load_dotenv
+from utils.database import RoutingSession, engine_options, register_engine_metrics
 
 load_dotenv()
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 csrf = CSRFProtect()
 login_manager = LoginManager()
 limiter = None
 
-def create_app():
+def create_app(db_profile='web'):
     app = Flask(__name__)
 
     # Configuration
@@ -22,15 +23,34 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'postgresql://localhost:5432/rent4')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # Connection pool settings: 'web' is sized to the worker's concurrency,
+    # 'batch' is a small pool with a longer statement timeout for scheduler jobs
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], db_profile)
+
+    # Optional read replica for read-only views (see utils.database.read_replica)
+    replica_url = os.environ.get('REPLICA_DATABASE_URL')
+    if replica_url:
+        app.config['SQLALCHEMY_BINDS'] = {
+            'replica': {'url': replica_url, **engine_options(replica_url, db_profile)}
+        }
+
     # CSRF Configuration for production
     app.config['WTF_CSRF_TIME_LIMIT'] = 3600  # 1 hour
     app.config['WTF_CSRF_SSL_STRICT'] = False  # Allow HTTPS behind proxy
 
     # Initialize extensions
     db.init_app(app)
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            register_engine_metrics(engine, db_profile if bind_key is None else f'{db_profile}_{bind_key}')
     csrf.init_app(app)
     login_manager.init_app(app)
 
+    from services import instrumentation, query_profiler, static_assets
+    instrumentation.init_app(app)
+    query_profiler.init_app(app)
+    static_assets.init_app(app)
+
     global limiter
     limiter = Limiter(
         app=app,
@@ -48,29 +68,70 @@ def create_app():
     from routes.main import main_bp
     from routes.properties import properties_bp
     from routes.payments import payments_bp
-    from routes.akahu import akahu_bp
+    from routes.akahu import akahu_bp, webhook as akahu_webhook
     from routes.stripe_routes import stripe_bp
+    from routes.metrics import metrics_bp
+    from routes.api import api_bp
+    from routes.admin import admin_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(properties_bp)
     app.register_blueprint(payments_bp)
     app.register_blueprint(akahu_bp)
+    # Akahu authenticates webhook deliveries with a signature, and bursts of them
+    # share a few source addresses
+    csrf.exempt(akahu_webhook)
+    limiter.exempt(akahu_webhook)
     app.register_blueprint(stripe_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(admin_bp)
+    limiter.exempt(metrics_bp)
+
+    # The JSON API authenticates with bearer tokens, not the session cookie,
+    # so CSRF does not apply; pollers get their own, higher rate limit
+    app.register_blueprint(api_bp)
+    csrf.exempt(api_bp)
+    limiter.limit(os.environ.get('API_RATE_LIMIT', '1000 per hour'))(api_bp)
 
     # Import models to register them with SQLAlchemy
-    from models import user, property
+    from models import (user, property, payment_check, bank_transaction, webhook_event, outbound_email,
+                        payment_stats)
+
+    from cli import register_commands
+    register_commands(app)
+
+    return app
 
-    # Create tables (only if database is available)
+def create_tables(app):
+    """Create any missing tables and columns (only if the database is available).
+
+    Deploy entry points call this once, not create_app, so building an app
+    for a CLI command, a scheduler job or a test opens no connection.
+    Raises SchemaUpgradeError if the database is reachable but can't be
+    brought up to date: the app would fail on every write to the affected
+    tables, so the deploy stops instead of starting it.
+    """
+    from utils.schema import SchemaUpgradeError, upgrade_schema
     try:
         with app.app_context():
             db.create_all()
-            print("Database tables created successfully")
+            for change in upgrade_schema(db.engine, db.metadata):
+                print(f"Schema upgraded: {change}")
+            # Don't leave pooled connections behind for forked workers to share
+            for engine in db.engines.values():
+                engine.dispose()
+        print("Database tables created successfully")
+    except SchemaUpgradeError as e:
+        print(f"Schema upgrade failed: {e}")
+        print("Fix the rows it names, then run `flask --app app db upgrade`")
+        raise
     except Exception as e:
         print(f"Database connection failed: {e}")
         print("Database tables will be created automatically when deployed")
 
-    # Initialize scheduler (with error handling)
+def start_scheduler(app):
+    """Start this process's scheduler (with error handling)"""
     try:
         from services.scheduler import init_scheduler
         init_scheduler(app)
@@ -79,11 +140,14 @@ def create_app():
         print(f"Scheduler initialization failed: {e}")
         print("Scheduler will be disabled")
 
-    return app
-
-# Create app instance for gunicorn
-app = create_app()
-
 if __name__ == '__main__':
+    from utils.schema import SchemaUpgradeError
+
+    app = create_app()
+    try:
+        create_tables(app)
+    except SchemaUpgradeError:
+        raise SystemExit(1)
+    start_scheduler(app)
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_ENV') == 'development')
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_ENV') == 'development')
@@ -0,0 +1,75 @@
+"""Concurrent login load test.
+
+Hammers the login form of a running Rent4 instance from many threads and
+reports latency percentiles, so the gunicorn worker modes in gunicorn.conf.py
+can be compared against each other.
+
+    python benchmarks/login_load.py --url http://localhost:8000 \
+        --email you@example.com --password secret --concurrency 20 --requests 400
+"""
+import argparse
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+CSRF_RE = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def login_once(base_url, email, password):
+    """Fetch the login form and submit it; returns (seconds, ok)"""
+    session = requests.Session()
+    started = time.perf_counter()
+    page = session.get(f'{base_url}/auth/login', timeout=60)
+    match = CSRF_RE.search(page.text)
+    response = session.post(
+        f'{base_url}/auth/login',
+        data={
+            'email': email,
+            'password': password,
+            'csrf_token': match.group(1) if match else ''
+        },
+        allow_redirects=False,
+        timeout=60
+    )
+    elapsed = time.perf_counter() - started
+    return elapsed, response.status_code == 302
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda _: login_once(base_url, args.email, args.password),
+                                range(args.requests)))
+    wall = time.perf_counter() - started
+
+    latencies = [elapsed for elapsed, _ in results]
+    failures = sum(1 for _, ok in results if not ok)
+
+    print(f"requests:    {len(results)} ({failures} failed)")
+    print(f"concurrency: {args.concurrency}")
+    print(f"throughput:  {len(results) / wall:.1f} req/s")
+    for pct in (50, 95, 99):
+        print(f"p{pct}:         {percentile(latencies, pct) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""Benchmark for the daily check_rent_payments run.
+
+Seeds a fresh database with synthetic landlords, properties and payment
+history (benchmarks/seed.py), points the app at stub Akahu and SMTP servers
+(benchmarks/stubs.py) and times one full payment check per size.
+
+    python benchmarks/payment_run.py --sizes 1000,10000,100000
+    python benchmarks/payment_run.py --sizes 1000 --akahu-latency 0.05 --update-baseline
+
+Each run reports wall time, SQL statements, peak Python memory and external
+calls. Results are compared against benchmarks/payment_run_baseline.json and
+the script exits non-zero when any size regresses beyond tolerance.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stubs import StubAkahuServer, StubSMTPServer  # noqa: E402
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'payment_run_baseline.json')
+
+# Allowed growth over the baseline before a metric counts as a regression
+TOLERANCES = {
+    'wall_seconds': 0.50,
+    'sql_queries': 0.10,
+    'peak_memory_mb': 0.25,
+    'akahu_calls': 0.10,
+    'akahu_kb': 0.10,
+    'emails_sent': 0.10,
+}
+
+
+def configure_environment(akahu, smtp):
+    """Point the app's outbound clients at the stubs before it is imported"""
+    os.environ['FLASK_ENV'] = 'development'  # keeps the scheduler off
+    os.environ['DATABASE_URL'] = 'sqlite://'  # replaced per size in run_size
+    os.environ['AKAHU_API_URL'] = akahu.url
+    os.environ['SMTP_SERVER'] = '127.0.0.1'
+    os.environ['SMTP_PORT'] = str(smtp.port)
+    os.environ['SMTP_USE_TLS'] = 'false'
+    os.environ['GMAIL_USER'] = 'benchmark@example.com'
+    os.environ['GMAIL_APP_PASSWORD'] = 'benchmark'
+    # Measure the check itself, not the send quota
+    os.environ['EMAIL_DAILY_LIMIT'] = '1000000'
+    os.environ['EMAIL_PER_MINUTE_LIMIT'] = '1000000'
+
+
+def run_size(size, args, akahu, smtp, workdir):
+    from sqlalchemy import event
+    from app import create_app, db
+    from benchmarks.seed import seed
+
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, f'bench_{size}.db')}"
+    app = create_app(db_profile='batch')
+    check_date = date.today() - timedelta(days=1)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        started = time.perf_counter()
+        akahu.transactions_by_token = seed(db, size, check_date, history_years=args.history_years,
+                                           rent_accounts=not args.all_accounts)
+        print(f"  seeded {size} properties in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        db.session.remove()
+
+        queries = [0]
+
+        def count_query(*_):
+            queries[0] += 1
+
+        engine = db.engine
+        event.listen(engine, 'after_cursor_execute', count_query)
+        akahu_before, bytes_before, smtp_before = akahu.calls, akahu.bytes_sent, smtp.messages
+
+        from routes.payments import check_rent_payments
+        from services import email_quota
+        from services.transaction_cache import akahu_client
+
+        # The HTTP session (and requests) load on first use; keep that one-off
+        # import out of the run's peak memory, as a long-lived process would
+        akahu_client.session
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        check_rent_payments()
+        wall = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        event.remove(engine, 'after_cursor_execute', count_query)
+        db.session.remove()
+        # Hand leased email tokens back while this size's database still exists
+        email_quota.release_leases()
+
+    return {
+        'wall_seconds': round(wall, 3),
+        'sql_queries': queries[0],
+        'peak_memory_mb': round(peak / (1024 * 1024), 2),
+        'akahu_calls': akahu.calls - akahu_before,
+        'akahu_kb': round((akahu.bytes_sent - bytes_before) / 1024, 1),
+        'emails_sent': smtp.messages - smtp_before,
+    }
+
+
+def compare(results, baseline):
+    """Return human-readable regressions of results against the baseline"""
+    regressions = []
+    for size, metrics in results.items():
+        expected = baseline.get(size)
+        if not expected:
+            continue
+        for name, tolerance in TOLERANCES.items():
+            limit = expected.get(name)
+            if limit is None:
+                continue
+            if metrics[name] > limit * (1 + tolerance) and metrics[name] - limit > 0.01:
+                regressions.append(
+                    f"{size} properties: {name} {metrics[name]} exceeds baseline {limit} (+{tolerance:.0%} allowed)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma-separated property counts')
+    parser.add_argument('--history-years', type=int, default=2)
+    parser.add_argument('--all-accounts', action='store_true',
+                        help="don't scope landlords' fetches to their rent account")
+    parser.add_argument('--akahu-latency', type=float, default=0.0, help='seconds per Akahu call')
+    parser.add_argument('--smtp-latency', type=float, default=0.0, help='seconds per email')
+    parser.add_argument('--database-url', help='empty database to use instead of a temp SQLite file')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='write these results as the new baseline')
+    args = parser.parse_args()
+
+    akahu = StubAkahuServer(latency=args.akahu_latency).start()
+    smtp = StubSMTPServer(latency=args.smtp_latency).start()
+    configure_environment(akahu, smtp)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in (int(s) for s in args.sizes.split(',')):
+            print(f"running {size} properties...", file=sys.stderr)
+            results[str(size)] = run_size(size, args, akahu, smtp, workdir)
+
+    akahu.stop()
+    smtp.stop()
+
+    header = (f"{'properties':>10} {'wall s':>9} {'queries':>9} {'peak MB':>9} {'akahu':>7} "
+              f"{'akahu KB':>9} {'emails':>7}")
+    print(header)
+    for size, m in results.items():
+        print(f"{size:>10} {m['wall_seconds']:>9} {m['sql_queries']:>9} {m['peak_memory_mb']:>9} "
+              f"{m['akahu_calls']:>7} {m['akahu_kb']:>9} {m['emails_sent']:>7}")
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline file; run with --update-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f))
+
+    if regressions:
+        print("\nPERFORMANCE REGRESSION")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+
+    print("\nwithin baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
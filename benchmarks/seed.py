@@ -0,0 +1,215 @@
+"""Synthetic landlords, properties and payment history for benchmarks."""
+import random
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+PASSWORD = 'benchmark-password'
+FREQUENCIES = (('Weekly', 0.60), ('Fortnightly', 0.15), ('Monthly', 0.25))
+BATCH_SIZE = 5000
+
+
+def _chunks(rows, size=BATCH_SIZE):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def _bulk_insert(db, model, rows):
+    for chunk in _chunks(rows):
+        db.session.execute(insert(model.__table__), chunk)
+
+
+def _due_dates(frequency, due_day_of_week, due_day, start, end):
+    """Every due date for a schedule between start and end (inclusive)"""
+    if frequency == 'Monthly':
+        day = start.replace(day=1)
+        while day <= end:
+            due = day.replace(day=due_day)
+            if start <= due <= end:
+                yield due
+            day = (day + timedelta(days=32)).replace(day=1)
+    else:
+        step = timedelta(days=7 if frequency == 'Weekly' else 14)
+        due = start + timedelta(days=(due_day_of_week - start.weekday()) % 7)
+        while due <= end:
+            yield due
+            due += step
+
+
+def _property_row(rng, property_id, owner, now):
+    frequency = rng.choices([f for f, _ in FREQUENCIES], weights=[w for _, w in FREQUENCIES])[0]
+    due_day_of_week = rng.randrange(7) if frequency != 'Monthly' else None
+    due_day = rng.randint(1, 28) if frequency == 'Monthly' else None
+    rent = Decimal(rng.randrange(300, 900, 5))
+    return {
+        'id': property_id,
+        'user_id': owner,
+        'address': f'{property_id} Benchmark Street',
+        'tenant_name': f'Tenant {property_id}',
+        'tenant_email': f'tenant{property_id}@example.com',
+        'rent_amount': rent,
+        'rent_frequency': frequency,
+        'rent_due_day_of_week': due_day_of_week,
+        'rent_due_day': due_day,
+        'bank_statement_keyword': f'RENT{property_id:06d}',
+        'send_tenant_reminder': rng.random() < 0.3,
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+def _history_rows(rng, prop, start, end, now):
+    rent = prop['rent_amount']
+    for due in _due_dates(prop['rent_frequency'], prop['rent_due_day_of_week'], prop['rent_due_day'], start, end):
+        roll = rng.random()
+        status = 'received' if roll < 0.9 else 'partial' if roll < 0.95 else 'missed'
+        yield {
+            'property_id': prop['id'],
+            'expected_amount': rent,
+            'actual_amount': None if status == 'missed' else rent if status == 'received' else rent / 2,
+            'due_date': due,
+            'received_date': None if status == 'missed' else due,
+            'status': status,
+            'transaction_description': None if status == 'missed' else prop['bank_statement_keyword'],
+            'landlord_notified': True,
+            'tenant_notified': False,
+            'created_at': now,
+            'updated_at': now,
+        }
+
+
+def _user_row(user_id, password_hash, now):
+    return {
+        'id': user_id,
+        'email': f'landlord{user_id}@example.com',
+        'password_hash': password_hash,
+        'first_name': 'Landlord',
+        'last_name': str(user_id),
+        'email_verified': True,
+        'is_premium': True,
+        'akahu_app_token': 'app_token',
+        'akahu_user_token': f'user-{user_id}',
+        'created_at': now,
+    }
+
+
+def seed(db, properties, check_date, landlords=None, history_years=2,
+         noise_transactions=20, rent_accounts=True, seed_value=1234):
+    """Populate an empty database and return Akahu transactions per user token.
+
+    Landlords own a skewed number of properties (most own one, a few own
+    hundreds). Properties get a Weekly/Fortnightly/Monthly mix and
+    `history_years` of RentPayment rows before check_date. The returned map
+    feeds benchmarks.stubs.StubAkahuServer with transactions on check_date:
+    rent lands in 'acc_rent', noise in 'acc_business'. With rent_accounts
+    every landlord has chosen 'acc_rent' as their only rent account.
+    """
+    from models.user import User, UserSetting
+    from services.transaction_cache import RENT_ACCOUNTS_KEY
+    from models.property import Property, RentPayment
+
+    rng = random.Random(seed_value)
+    landlords = landlords or max(1, properties // 5)
+    now = datetime.now(timezone.utc)
+    password_hash = generate_password_hash(PASSWORD)
+
+    _bulk_insert(db, User, [_user_row(user_id, password_hash, now) for user_id in range(1, landlords + 1)])
+
+    # Pareto-ish ownership: a long tail of single-property landlords
+    weights = [1.0 / (rank ** 1.1) for rank in range(1, landlords + 1)]
+    owners = rng.choices(range(1, landlords + 1), weights=weights, k=properties)
+
+    history_start = check_date - timedelta(days=365 * history_years)
+    history_end = check_date - timedelta(days=1)
+
+    property_rows = []
+    payment_rows = []
+    transactions = {}
+
+    for property_id in range(1, properties + 1):
+        owner = owners[property_id - 1]
+        prop = _property_row(rng, property_id, owner, now)
+        property_rows.append(prop)
+        payment_rows.extend(_history_rows(rng, prop, history_start, history_end, now))
+
+        # Today's bank feed: most tenants pay in full, some short, some not at all
+        roll = rng.random()
+        if roll < 0.9:
+            rent = float(prop['rent_amount'])
+            transactions.setdefault(f'user-{owner}', []).append({
+                'date': check_date.strftime('%Y-%m-%d'),
+                'amount': rent if roll < 0.8 else rent / 2,
+                'description': f"{prop['bank_statement_keyword']} {rng.choice(['AP', 'DC', 'BP'])}",
+                'reference': prop['bank_statement_keyword'],
+                'account': 'acc_rent',
+            })
+
+        if len(payment_rows) >= BATCH_SIZE * 4:
+            _bulk_insert(db, Property, property_rows)
+            _bulk_insert(db, RentPayment, payment_rows)
+            property_rows, payment_rows = [], []
+
+    _bulk_insert(db, Property, property_rows)
+    _bulk_insert(db, RentPayment, payment_rows)
+
+    # Unrelated transactions that every keyword scan has to skip over
+    for user_id in range(1, landlords + 1):
+        feed = transactions.setdefault(f'user-{user_id}', [])
+        for i in range(noise_transactions):
+            feed.append({
+                'date': check_date.strftime('%Y-%m-%d'),
+                'amount': -round(rng.uniform(2, 250), 2),
+                'description': rng.choice(['COUNTDOWN', 'Z ENERGY', 'SPARK', 'WATERCARE', 'IRD']),
+                'reference': None,
+                'account': 'acc_business',
+            })
+
+    if rent_accounts:
+        _bulk_insert(db, UserSetting, [
+            {'user_id': user_id, 'setting_key': RENT_ACCOUNTS_KEY, 'setting_value': 'acc_rent'}
+            for user_id in range(1, landlords + 1)
+        ])
+
+    for token, feed in transactions.items():
+        for i, transaction in enumerate(feed):
+            transaction['id'] = f'trans_{token}_{i}'
+
+    db.session.commit()
+    return transactions
+
+
+def seed_landlords(db, portfolio_sizes, check_date, history_years=2, seed_value=1234):
+    """Create one landlord per entry in portfolio_sizes owning that many properties.
+
+    Returns a list of (user_id, email, [property ids]) for driving requests.
+    """
+    from models.user import User
+    from models.property import Property, RentPayment
+
+    rng = random.Random(seed_value)
+    now = datetime.now(timezone.utc)
+    password_hash = generate_password_hash(PASSWORD)
+    history_start = check_date - timedelta(days=365 * history_years)
+    history_end = check_date - timedelta(days=1)
+
+    landlords = []
+    next_property_id = 1
+    for user_id, size in enumerate(portfolio_sizes, start=1):
+        user = _user_row(user_id, password_hash, now)
+        user['stripe_customer_id'] = f'cus_bench{user_id}'
+        _bulk_insert(db, User, [user])
+
+        property_rows = [_property_row(rng, property_id, user_id, now)
+                         for property_id in range(next_property_id, next_property_id + size)]
+        payment_rows = [row for prop in property_rows
+                        for row in _history_rows(rng, prop, history_start, history_end, now)]
+        _bulk_insert(db, Property, property_rows)
+        _bulk_insert(db, RentPayment, payment_rows)
+
+        landlords.append((user_id, user['email'], [p['id'] for p in property_rows]))
+        next_property_id += size
+
+    db.session.commit()
+    return landlords
@@ -0,0 +1,99 @@
+"""Cold-start profile: import time and app start-up, per phase and per package.
+
+Each repeat runs a fresh interpreter with `-X importtime` that imports the
+app module, builds the app and creates the tables against a temp SQLite
+database, the same steps wsgi.py takes in the gunicorn arbiter:
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 10 --top 20
+
+Reports the best time per phase, the packages whose imports cost the most
+(self time, summed over their modules) and the slowest single imports. It
+exits non-zero if a module that should load lazily (--lazy) was imported
+during start-up.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy SDKs only particular requests or jobs need
+LAZY_MODULES = 'stripe,requests,apscheduler'
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+app.create_tables(flask_app)
+done = time.perf_counter()
+print(json.dumps({
+    'phases': {'import app': imported - started, 'create_app': created - imported,
+               'create_tables': done - created},
+    'loaded': sorted(name for name in sys.modules if '.' not in name),
+}))
+"""
+
+
+def run_probe(database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, FLASK_ENV='development', PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['imports'] = parse_importtime(result.stderr)
+    return report
+
+
+def parse_importtime(stderr):
+    """[(module, self microseconds, cumulative microseconds)] from -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        imports.append((name, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='take the best of this many cold starts')
+    parser.add_argument('--top', type=int, default=15, help='packages and modules to list')
+    parser.add_argument('--lazy', default=LAZY_MODULES, help='comma-separated modules start-up must not import')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        reports = [run_probe(f"sqlite:///{os.path.join(workdir, f'startup_{n}.db')}") for n in range(args.repeat)]
+
+    best = min(reports, key=lambda report: sum(report['phases'].values()))
+    print(f"{'phase':<16} {'best ms':>9} {'median ms':>10}")
+    for phase in best['phases']:
+        times = sorted(report['phases'][phase] for report in reports)
+        print(f"{phase:<16} {min(times) * 1000:>9.1f} {times[len(times) // 2] * 1000:>10.1f}")
+    print(f"{'total':<16} {sum(best['phases'].values()) * 1000:>9.1f}")
+
+    packages = {}
+    for name, self_us, _ in best['imports']:
+        packages[name.split('.')[0]] = packages.get(name.split('.')[0], 0) + self_us
+    print(f"\n{'package':<32} {'self ms':>8}")
+    for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<32} {self_us / 1000:>8.1f}")
+
+    print(f"\n{'module':<48} {'self ms':>8} {'cumulative ms':>14}")
+    for name, self_us, cumulative_us in sorted(best['imports'], key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<48} {self_us / 1000:>8.1f} {cumulative_us / 1000:>14.1f}")
+
+    eager = [name for name in args.lazy.split(',') if name and name in best['loaded']]
+    if eager:
+        print(f"\nimported during start-up but meant to load lazily: {', '.join(eager)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Local stand-ins for Akahu and Gmail SMTP used by the benchmarks.
+
+Both servers run on background threads on 127.0.0.1, sleep for a
+configurable latency on every call and count what they were asked to do.
+"""
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class StubAkahuServer:
+    """Serves Akahu's account and transaction endpoints from an in-memory map.
+
+    transactions_by_token maps the bearer token to a list of dicts with
+    date ('YYYY-MM-DD'), amount, description, reference and optionally
+    account (default 'acc_default'). /accounts lists the accounts those
+    transactions use; /accounts/<id>/transactions filters to one of them.
+    """
+
+    def __init__(self, transactions_by_token=None, latency=0.0):
+        self.transactions_by_token = transactions_by_token or {}
+        self.latency = latency
+        self.calls = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                parsed = urlparse(self.path)
+                params = parse_qs(parsed.query)
+                start = params.get('start', [''])[0]
+                end = params.get('end', ['9999-12-31'])[0]
+                token = self.headers.get('Authorization', '').replace('Bearer ', '')
+                feed = stub.transactions_by_token.get(token, [])
+
+                path = parsed.path.strip('/').split('/')
+                if path == ['accounts']:
+                    names = sorted({t.get('account', 'acc_default') for t in feed})
+                    items = [{'_id': name, 'name': name, 'formatted_account': None, 'type': 'CHECKING'}
+                             for name in names]
+                    return self._reply({'success': True, 'items': items})
+                account = path[1] if len(path) == 3 and path[0] == 'accounts' else None
+
+                items = [
+                    {
+                        '_id': t.get('id', f'trans_{i}'),
+                        '_account': t.get('account', 'acc_default'),
+                        'date': f"{t['date']}T00:00:00.000Z",
+                        'amount': t['amount'],
+                        'description': t['description'],
+                        'meta': {'reference': t.get('reference')},
+                    }
+                    for i, t in enumerate(feed)
+                    if start <= t['date'] <= end and account in (None, t.get('account', 'acc_default'))
+                ]
+                self._reply({'success': True, 'items': items})
+
+            def _reply(self, payload):
+                body = json.dumps(payload).encode()
+
+                with stub._lock:
+                    stub.calls += 1
+                    stub.bytes_sent += len(body)
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StubSMTPServer:
+    """Minimal plain-text SMTP server that accepts AUTH and counts messages"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode() + b'\r\n')
+
+            def handle(self):
+                self.reply('220 stub ESMTP')
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode(errors='replace').strip().upper()
+
+                    if command.startswith(('EHLO', 'HELO')):
+                        self.wfile.write(b'250-stub\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n')
+                    elif command.startswith('AUTH'):
+                        self.reply('235 Authentication successful')
+                    elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                        self.reply('250 OK')
+                    elif command == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                            pass
+                        if stub.latency:
+                            time.sleep(stub.latency)
+                        with stub._lock:
+                            stub.messages += 1
+                        self.reply('250 Queued')
+                    elif command == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('502 Not implemented')
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
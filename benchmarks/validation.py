@@ -0,0 +1,97 @@
+"""Benchmark for property payload validation on large batches.
+
+Generates synthetic import rows (as a CSV reader would produce them, all
+strings) with a share of invalid rows, then times validating them one at a
+time with validate_property and in one pass with PROPERTY_SCHEMA.validate_many:
+
+    python benchmarks/validation.py
+    python benchmarks/validation.py --rows 10000,100000 --invalid 0.05 --repeat 5
+
+No database or app is needed; the validators are pure functions.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.validators import PROPERTY_SCHEMA, ValidationError, validate_property  # noqa: E402
+
+RENTS = ['350', '420.50', '480', '520', '575', '600', '650.00', '720', '850', '1200']
+
+
+def make_rows(count, invalid_share, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        frequency = rng.choice(['Weekly', 'Weekly', 'Fortnightly', 'Monthly'])
+        row = {
+            'address': f'{i} Benchmark Street, Auckland',
+            'tenant_name': f'Tenant {i}',
+            'tenant_email': f'Tenant{i}@Example.com',
+            'rent_amount': rng.choice(RENTS),
+            'rent_frequency': frequency,
+            'rent_due_day_of_week': str(rng.randrange(7)) if frequency != 'Monthly' else '',
+            'rent_due_day': str(rng.randint(1, 28)) if frequency == 'Monthly' else '',
+            'bank_statement_keyword': f'RENT {i}',
+            'send_tenant_reminder': rng.choice(['true', 'false', '']),
+        }
+        if rng.random() < invalid_share:
+            broken = rng.choice(['rent_amount', 'rent_frequency', 'day', 'address'])
+            if broken == 'rent_amount':
+                row['rent_amount'] = rng.choice(['-5', 'abc', '0'])
+            elif broken == 'rent_frequency':
+                row['rent_frequency'] = 'Yearly'
+            elif broken == 'day':
+                row['rent_due_day_of_week'] = row['rent_due_day'] = 'x'
+            else:
+                row['address'] = ' '
+        rows.append(row)
+    return rows
+
+
+def per_row(rows):
+    errors = 0
+    for row in rows:
+        try:
+            validate_property(row)
+        except ValidationError:
+            errors += 1
+    return errors
+
+
+def batch(rows):
+    return sum(1 for _, _, error in PROPERTY_SCHEMA.validate_many(enumerate(rows)) if error is not None)
+
+
+def best_of(repeat, fn, rows):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(rows)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='1000,10000,100000', help='comma-separated batch sizes')
+    parser.add_argument('--invalid', type=float, default=0.02, help='share of invalid rows')
+    parser.add_argument('--repeat', type=int, default=3, help='take the best of this many runs')
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'per-row s':>10} {'batch s':>9} {'rows/s batch':>13} {'speedup':>8} {'invalid':>8}")
+    for count in (int(n) for n in args.rows.split(',')):
+        rows = make_rows(count, args.invalid)
+        single, single_errors = best_of(args.repeat, per_row, rows)
+        batched, batch_errors = best_of(args.repeat, batch, rows)
+        assert single_errors == batch_errors, 'batch and per-row validation disagree'
+        print(f"{count:>8} {single:>10.3f} {batched:>9.3f} {count / batched:>13,.0f} "
+              f"{single / batched:>7.2f}x {batch_errors:>8}")
+
+
+if __name__ == '__main__':
+    main()
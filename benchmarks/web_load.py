@@ -0,0 +1,196 @@
+"""Offline load test for the key web routes.
+
+Drives the Flask app in-process with one test client per thread against a
+local SQLite (or any empty) database. Landlords with 1, 50 and 500 properties
+are seeded, and each route is reported separately per portfolio size:
+
+    python benchmarks/web_load.py
+    python benchmarks/web_load.py --portfolios 1,50,500 --requests 200 --concurrency 8
+
+Routes covered: auth.login, main.dashboard, payments.payment_history,
+properties.add_property and stripe_routes.stripe_webhook. Besides throughput
+and p50/p95/p99 latency, the mean SQL statements per request is reported so
+N+1 query patterns show up as a number that grows with portfolio size.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WEBHOOK_SECRET = 'whsec_benchmark'
+
+
+def configure_environment(database_url):
+    os.environ['FLASK_ENV'] = 'development'  # keeps the scheduler off
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['STRIPE_WEBHOOK_SECRET'] = WEBHOOK_SECRET
+    os.environ.setdefault('WEB_WORKER_CLASS', 'gthread')
+    os.environ.setdefault('WEB_THREADS', '16')
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def stripe_signature(payload):
+    timestamp = str(int(time.time()))
+    digest = hmac.new(WEBHOOK_SECRET.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+
+def build_routes(app, user_id, email, property_ids):
+    """Return {route name: callable(client, i) -> response}"""
+    from benchmarks.seed import PASSWORD
+
+    def login(client, i):
+        # A fresh, anonymous client so the password check actually runs
+        return app.test_client().post('/auth/login', data={'email': email, 'password': PASSWORD})
+
+    def dashboard(client, i):
+        return client.get('/dashboard')
+
+    def payment_history(client, i):
+        return client.get(f'/payments/history/{property_ids[i % len(property_ids)]}')
+
+    def add_property(client, i):
+        return client.post('/properties/add', data={
+            'address': f'{i} Load Test Road',
+            'tenant_name': 'Load Tenant',
+            'tenant_email': 'load.tenant@example.com',
+            'rent_amount': '550.00',
+            'rent_frequency': 'Weekly',
+            'rent_due_day_of_week': '2',
+            'bank_statement_keyword': f'LOAD{i}',
+        })
+
+    def stripe_webhook(client, i):
+        payload = json.dumps({
+            'id': f'evt_{i}',
+            'object': 'event',
+            'type': 'invoice.payment_succeeded',
+            'data': {'object': {'object': 'invoice', 'customer': f'cus_bench{user_id}'}},
+        })
+        return client.post('/subscription/webhook', data=payload,
+                           headers={'Stripe-Signature': stripe_signature(payload),
+                                    'Content-Type': 'application/json'})
+
+    return {
+        'auth.login': login,
+        'main.dashboard': dashboard,
+        'payments.payment_history': payment_history,
+        'properties.add_property': add_property,
+        'stripe_routes.stripe_webhook': stripe_webhook,
+    }
+
+
+def drive(app, route, email, requests_per_route, concurrency, query_counter):
+    """Run one route from `concurrency` threads; returns latencies and failures"""
+    from benchmarks.seed import PASSWORD
+
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+            local.client.post('/auth/login', data={'email': email, 'password': PASSWORD})
+        return local.client
+
+    def one(i):
+        c = client()
+        started = time.perf_counter()
+        response = route(c, i)
+        elapsed = time.perf_counter() - started
+        return elapsed, response.status_code < 400
+
+    # Warm each thread's session outside the timed window
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: client(), range(concurrency)))
+
+        queries_before = query_counter[0]
+        started = time.perf_counter()
+        results = list(pool.map(one, range(requests_per_route)))
+        wall = time.perf_counter() - started
+
+    latencies = [r[0] for r in results]
+    return {
+        'requests': len(results),
+        'failures': sum(1 for r in results if not r[1]),
+        'throughput': len(results) / wall if wall else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries_per_request': (query_counter[0] - queries_before) / max(len(results), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--portfolios', default='1,50,500', help='properties per seeded landlord')
+    parser.add_argument('--requests', type=int, default=100, help='requests per route per landlord')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--history-years', type=int, default=2)
+    parser.add_argument('--database-url', help='empty database to use instead of a temp SQLite file')
+    parser.add_argument('--output', help='also write results as JSON to this path')
+    args = parser.parse_args()
+
+    portfolios = [int(p) for p in args.portfolios.split(',')]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args.database_url or f"sqlite:///{os.path.join(workdir, 'web_load.db')}")
+
+        from sqlalchemy import event
+        from app import create_app, db
+        import app as app_module
+        from benchmarks.seed import seed_landlords
+
+        app = create_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        app_module.limiter.enabled = False
+
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            landlords = seed_landlords(db, portfolios, date.today() - timedelta(days=1),
+                                       history_years=args.history_years)
+            db.session.remove()
+
+            query_counter = [0]
+
+            def count_query(*_):
+                query_counter[0] += 1
+
+            event.listen(db.engine, 'after_cursor_execute', count_query)
+
+        results = []
+        for (user_id, email, property_ids), size in zip(landlords, portfolios):
+            for name, route in build_routes(app, user_id, email, property_ids).items():
+                print(f"  {size} properties: {name}", file=sys.stderr)
+                stats = drive(app, route, email, args.requests, args.concurrency, query_counter)
+                results.append(dict(stats, portfolio=size, route=name))
+
+    print(f"{'props':>6} {'route':<30} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sql/req':>8} {'fail':>5}")
+    for r in results:
+        print(f"{r['portfolio']:>6} {r['route']:<30} {r['throughput']:>8.1f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['queries_per_request']:>8.1f} {r['failures']:>5}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
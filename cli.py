@@ -0,0 +1,227 @@
+import click
+from flask.cli import AppGroup
+
+payment_runs_cli = AppGroup('payment-runs', help='Inspect the daily payment check ledger.')
+
+@payment_runs_cli.command('list')
+@click.option('--limit', default=20, show_default=True, help='Number of runs to show.')
+def list_runs(limit):
+    """Show the most recent payment check runs"""
+    from models.payment_check import PaymentCheckRun
+
+    runs = PaymentCheckRun.query.order_by(PaymentCheckRun.started_at.desc()).limit(limit).all()
+    click.echo(f"{'id':>6}  {'check date':<10}  {'slot':>4}  {'status':<21}  {'secs':>7}  {'scanned':>7}  {'due':>5}  "
+               f"{'recv':>5}  {'part':>5}  {'miss':>5}  {'err':>4}  {'settled':>7}  {'emails':>6}  {'akahu s':>7}")
+    for run in runs:
+        duration = f'{run.duration_seconds:.1f}' if run.duration_seconds is not None else '-'
+        slot = run.slot if run.slot is not None else '-'
+        click.echo(f"{run.id:>6}  {run.check_date.isoformat():<10}  {slot:>4}  {run.status:<21}  {duration:>7}  "
+                   f"{run.properties_scanned or 0:>7}  {run.properties_due or 0:>5}  {run.matched_count or 0:>5}  "
+                   f"{run.partial_count or 0:>5}  {run.missed_count or 0:>5}  {run.error_count or 0:>4}  "
+                   f"{run.settled_count or 0:>7}  {run.emails_queued or 0:>6}  {run.akahu_seconds or 0:>7.2f}")
+
+@payment_runs_cli.command('show')
+@click.argument('run_id', type=int)
+@click.option('--status', help='Only show outcomes with this status (e.g. error).')
+def show_run(run_id, status):
+    """Show the per-property outcomes of one run"""
+    from models.payment_check import PaymentCheckRun
+
+    run = PaymentCheckRun.query.get(run_id)
+    if run is None:
+        raise click.ClickException(f'No payment check run with id {run_id}')
+
+    click.echo(f'Run {run.id} for {run.check_date.isoformat()}: {run.status}')
+    if run.slot is not None:
+        click.echo(f'  slot {run.slot} ({run.time_zone})')
+    click.echo(f'  started {run.started_at}  finished {run.finished_at or "-"}  attempts {run.attempts or 1}')
+    if run.error:
+        click.echo(f'  error: {run.error}')
+
+    outcomes = run.outcomes
+    if status:
+        outcomes = outcomes.filter_by(status=status)
+    for outcome in outcomes.order_by('id'):
+        line = (f'  property {outcome.property_id:>6}  {outcome.status:<8}  '
+                f'{outcome.duration_ms or 0:>6}ms  akahu {outcome.akahu_ms or 0:>5}ms  '
+                f'emails {outcome.emails_queued or 0}  attempts {outcome.attempts or 0}')
+        if outcome.error:
+            line += f'  {outcome.error}'
+        click.echo(line)
+
+@payment_runs_cli.command('resume')
+@click.argument('run_id', type=int, required=False)
+def resume_run(run_id):
+    """Re-process the unfinished properties of a run (default: latest unfinished)"""
+    from models.payment_check import PaymentCheckRun
+    from routes.payments import resume_payment_check
+
+    if run_id is not None:
+        run = PaymentCheckRun.query.get(run_id)
+    else:
+        run = PaymentCheckRun.query.filter(PaymentCheckRun.status != 'completed') \
+            .order_by(PaymentCheckRun.started_at.desc()).first()
+    if run is None:
+        raise click.ClickException('No payment check run to resume')
+
+    click.echo(f'Resuming run {run.id} for {run.check_date.isoformat()} ({run.status})')
+    run = resume_payment_check(run)
+    click.echo(f'Run {run.id}: {run.status}, {run.error_count} properties still failing')
+
+properties_cli = AppGroup('properties', help='Manage landlords\' properties.')
+
+@properties_cli.command('import')
+@click.argument('path', type=click.File('rb'))
+@click.option('--user', 'email', required=True, help='Email of the landlord to import for.')
+@click.option('--format', 'import_format', type=click.Choice(['csv', 'json']),
+              help='File format (default: guessed from the file name).')
+@click.option('--dry-run', is_flag=True, help='Validate only; insert nothing.')
+def import_properties_command(path, email, import_format, dry_run):
+    """Bulk-import properties from a CSV or JSON file"""
+    from models.user import User
+    from services.property_import import guess_format, import_properties, read_rows
+
+    user = User.query.filter_by(email=email.strip().lower()).first()
+    if user is None:
+        raise click.ClickException(f'No user with email {email}')
+
+    rows = read_rows(path, import_format or guess_format(path.name))
+    try:
+        result = import_properties(user, rows, dry_run=dry_run)
+    except ValueError as e:
+        raise click.ClickException(f'Could not read {path.name}: {e}')
+
+    for row, field, message in result.errors:
+        click.echo(f'  row {row}: {message}' + (f' ({field})' if field else ''), err=True)
+    verb = 'valid' if dry_run else 'imported'
+    click.echo(f'{result.rows} rows read, {result.created} {verb}, {len(result.errors)} with errors')
+    if result.errors:
+        raise SystemExit(1)
+
+akahu_webhooks_cli = AppGroup('akahu-webhooks', help='Process and simulate Akahu webhook deliveries.')
+
+@akahu_webhooks_cli.command('process')
+@click.option('--limit', type=int, help='Process at most this many landlords.')
+def process_webhooks(limit):
+    """Match payments for landlords with queued webhook events"""
+    from services.akahu_webhooks import process_queue
+
+    results = process_queue(max_landlords=limit)
+    click.echo(f"{results['processed']} landlords processed, {results['failed']} failed, "
+               f"{results['recorded']} payments matched")
+
+@akahu_webhooks_cli.command('subscribe')
+@click.option('--user', 'user_ids', type=int, multiple=True, help='Only this landlord (repeatable).')
+def subscribe_webhooks(user_ids):
+    """Subscribe landlords with Akahu tokens to transaction webhooks"""
+    from app import db
+    from models.user import User
+    from services.akahu_webhooks import subscribe
+
+    query = User.query.filter(User.akahu_app_token.isnot(None), User.akahu_user_token.isnot(None))
+    if user_ids:
+        query = query.filter(User.id.in_(user_ids))
+    subscribed = failed = 0
+    for user in query.order_by(User.id):
+        if subscribe(user):
+            subscribed += 1
+        else:
+            failed += 1
+            click.echo(f'  user {user.id}: Akahu refused the subscription', err=True)
+        db.session.commit()
+    click.echo(f'{subscribed} landlords subscribed, {failed} failed')
+
+@akahu_webhooks_cli.command('send')
+@click.argument('user_id', type=int)
+@click.option('--url', default='http://127.0.0.1:5000/akahu/webhook', show_default=True,
+              help='Webhook endpoint to deliver to.')
+@click.option('--account', 'item_id', help='Akahu account id the notification is about.')
+@click.option('--code', 'webhook_code', default='DEFAULT_UPDATE', show_default=True, help='Webhook code.')
+def send_webhook(user_id, url, item_id, webhook_code):
+    """Sign and deliver a TRANSACTION notification, standing in for Akahu (development only)"""
+    import requests
+    from services.akahu_webhooks import TEST_SECRET, TEST_SIGNATURE_HEADER, build_payload, sign
+
+    if not TEST_SECRET:
+        raise click.ClickException('AKAHU_WEBHOOK_TEST_SECRET is not set')
+    body = build_payload(user_id, item_id=item_id, webhook_code=webhook_code)
+    response = requests.post(url, data=body, timeout=10, headers={
+        'Content-Type': 'application/json', TEST_SIGNATURE_HEADER: sign(body, TEST_SECRET)})
+    click.echo(f'{response.status_code} {response.text.strip()}')
+
+emails_cli = AppGroup('emails', help='Inspect the outbound email quota and queue.')
+
+@emails_cli.command('status')
+def email_status():
+    """Show the send quota buckets and the deferred queue"""
+    from services.email_quota import PRIORITIES, bucket_levels, queue_summary
+
+    for name, (tokens, capacity) in bucket_levels().items():
+        click.echo(f'{name:<8} {tokens:>8.1f} / {capacity} tokens')
+    queue = queue_summary()
+    for priority in PRIORITIES:
+        counts = '  '.join(f'{status} {queue.get((priority, status), 0)}'
+                           for status in ('deferred', 'sending', 'failed'))
+        click.echo(f'{priority:<12} {counts}')
+
+@emails_cli.command('flush')
+@click.option('--limit', default=500, show_default=True, help='Most messages to try.')
+def flush_emails(limit):
+    """Send deferred mail now, as far as the quota allows"""
+    from services.email_service import EmailService
+
+    sent, failed = EmailService().send_deferred(limit)
+    click.echo(f'{sent} sent, {failed} failed')
+
+assets_cli = AppGroup('assets', help='Build the fingerprinted, precompressed static files.')
+
+@assets_cli.command('build')
+def build_assets():
+    """Fingerprint and precompress static/ into static/dist/"""
+    from flask import current_app
+    from services.static_assets import BUILD_DIR, build
+
+    manifest = build(current_app.static_folder)
+    for name, hashed in sorted(manifest.items()):
+        click.echo(f'{name:<40} {hashed}')
+    click.echo(f'{len(manifest)} files written to static/{BUILD_DIR}; restart the app to serve them')
+
+payment_stats_cli = AppGroup('payment-stats', help='Maintain the monthly portfolio statistics.')
+
+@payment_stats_cli.command('backfill')
+@click.option('--user', 'user_ids', type=int, multiple=True, help='Only this landlord (repeatable).')
+def backfill_payment_stats(user_ids):
+    """Rebuild payment_stats_monthly from the recorded rent payments"""
+    from app import db
+    from services.payment_stats import backfill
+
+    rows = backfill(list(user_ids) or None)
+    db.session.commit()
+    click.echo(f'{rows} landlord-months written')
+
+db_cli = AppGroup('db', help='Bring the database schema up to date.')
+
+@db_cli.command('upgrade')
+def upgrade_database():
+    """Create missing tables, and add columns, indexes and constraints added to the models"""
+    from app import db
+    from utils.schema import SchemaUpgradeError, upgrade_schema
+
+    db.create_all()
+    try:
+        changes = upgrade_schema(db.engine, db.metadata)
+    except SchemaUpgradeError as e:
+        raise click.ClickException(str(e))
+    for change in changes:
+        click.echo(change)
+    click.echo(f'{len(changes)} changes; the schema is up to date')
+
+def register_commands(app):
+    """Attach the project's CLI command groups to the app"""
+    app.cli.add_command(payment_runs_cli)
+    app.cli.add_command(properties_cli)
+    app.cli.add_command(akahu_webhooks_cli)
+    app.cli.add_command(emails_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(payment_stats_cli)
+    app.cli.add_command(db_cli)
@@ -0,0 +1,82 @@
+import os
+
+# Gunicorn configuration for Railway / Docker deployments.
+#
+# WEB_WORKER_CLASS selects the concurrency model:
+#   gthread (default) - each worker serves WEB_THREADS requests concurrently
+#   gevent            - cooperative greenlets; outbound SMTP, Stripe, Akahu and
+#                       Postgres I/O yield instead of blocking the worker
+#   sync              - the original one-request-per-worker model
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = os.environ.get('WEB_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+threads = int(os.environ.get('WEB_THREADS', '8'))
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS', '100'))
+timeout = int(os.environ.get('WEB_TIMEOUT', '120'))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '30'))
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', '50'))
+# Load wsgi.py once in the arbiter and fork workers from it: they start faster
+# and share the imported code copy-on-write. Set WEB_PRELOAD=false if a
+# dependency misbehaves across fork. Off by default for gevent: the app's
+# module-level locks would be created before the worker monkey-patches
+# threading, and a real lock held by one greenlet blocks the whole worker.
+preload_app = os.environ.get('WEB_PRELOAD', 'false' if worker_class == 'gevent' else 'true').lower() == 'true'
+
+if worker_class == 'gevent' and preload_app:
+    # Patch in the arbiter too, before wsgi.py is loaded, so everything the
+    # workers inherit is already cooperative
+    from gevent import monkey
+    monkey.patch_all()
+
+# Expose the concurrency settings to the app so the SQLAlchemy pool can be
+# sized to match (see app.create_app)
+os.environ.setdefault('WEB_WORKER_CLASS', worker_class)
+os.environ.setdefault('WEB_THREADS', str(threads))
+os.environ.setdefault('WEB_WORKER_CONNECTIONS', str(worker_connections))
+
+
+def post_fork(server, worker):
+    # Connections opened in the arbiter (preload_app) belong to it; the worker
+    # opens its own instead of sharing the arbiter's sockets
+    from utils.database import dispose_after_fork
+    dispose_after_fork()
+
+    if worker_class == 'gevent':
+        # gunicorn monkey-patches the stdlib for gevent workers, but psycopg2
+        # is a C extension and needs an explicit wait callback to cooperate
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            server.log.warning("psycogreen not installed; database I/O will block the gevent worker")
+
+
+def post_worker_init(worker):
+    # The scheduler's threads must start after the fork, so each worker
+    # starts its own here rather than when the app is built
+    from app import start_scheduler
+    start_scheduler(worker.wsgi)
+
+    # Tell scheduler jobs to stop at their next checkpoint as soon as the
+    # worker is asked to stop, not only once its request loop has ended
+    import signal
+    from services import shutdown
+
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        shutdown.request()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+
+def worker_exit(server, worker):
+    # Drain the worker's scheduler before the process goes; SCHEDULER_DRAIN_SECONDS
+    # must stay under graceful_timeout or the arbiter kills the worker first
+    from services.scheduler import stop_scheduler
+    if not stop_scheduler():
+        server.log.warning("Worker %s exited with scheduler jobs still running", worker.pid)
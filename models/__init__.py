@@ -1,4 +1,11 @@
 from models.user import User, PasswordResetToken, UserSetting
 from models.property import Property, RentPayment
+from models.payment_check import PaymentCheckRun, PaymentCheckOutcome
+from models.bank_transaction import BankTransaction
+from models.webhook_event import AkahuWebhookEvent
+from models.outbound_email import DeferredEmail, EmailQuotaBucket
+from models.payment_stats import PaymentStatsMonthly
 
-__all__ = ['User', 'PasswordResetToken', 'UserSetting', 'Property', 'RentPayment']
\ No newline at end of file
+__all__ = ['User', 'PasswordResetToken', 'UserSetting', 'Property', 'RentPayment',
+           'PaymentCheckRun', 'PaymentCheckOutcome', 'BankTransaction', 'AkahuWebhookEvent',
+           'DeferredEmail', 'EmailQuotaBucket', 'PaymentStatsMonthly']
\ No newline at end of file
@@ -0,0 +1,46 @@
+from app import db
+from datetime import datetime, timezone
+from decimal import Decimal
+from sqlalchemy import DDL, event
+
+def to_cents(amount):
+    """Convert an amount in dollars (str, float or Decimal) to integer cents"""
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+class BankTransaction(db.Model):
+    """Local copy of a landlord's recent Akahu transactions, for search and reconciliation"""
+    __tablename__ = 'bank_transactions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    akahu_id = db.Column(db.String(64), nullable=False)
+
+    date = db.Column(db.Date, nullable=False)
+    amount_cents = db.Column(db.BigInteger, nullable=False)  # integer cents; negative for debits
+    description = db.Column(db.Text, nullable=False, default='')
+    reference = db.Column(db.String(255))
+
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'akahu_id'),
+        # Reconciliation and sync both scan one landlord's transactions by date
+        db.Index('ix_bank_transactions_user_date', 'user_id', 'date'),
+        # Trigram index so ILIKE '%term%' searches stay fast (PostgreSQL only)
+        db.Index('ix_bank_transactions_description_trgm', 'description',
+                 postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'}),
+    )
+
+    @property
+    def amount(self):
+        return Decimal(self.amount_cents).scaleb(-2)
+
+    def __repr__(self):
+        return f'<BankTransaction {self.user_id} {self.date} {self.amount}>'
+
+# The trigram operator class lives in the pg_trgm extension
+event.listen(
+    BankTransaction.__table__, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
@@ -0,0 +1,38 @@
+from app import db
+from datetime import datetime, timezone
+
+class DeferredEmail(db.Model):
+    """An email held back by the send quota (or a failed send), waiting to go out"""
+    __tablename__ = 'deferred_emails'
+
+    id = db.Column(db.Integer, primary_key=True)
+    priority = db.Column(db.String(20), nullable=False)  # 'critical', 'notification' or 'reminder'
+    rank = db.Column(db.Integer, nullable=False)  # 0 for critical; lower ranks are sent first
+
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.Text, nullable=False)
+    html_body = db.Column(db.Text, nullable=False)
+    text_body = db.Column(db.Text)
+
+    status = db.Column(db.String(20), nullable=False, default='deferred')  # 'deferred', 'sending' or 'failed'
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    not_before = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    # The queue is drained by priority, oldest first
+    __table_args__ = (db.Index('ix_deferred_emails_status_rank', 'status', 'rank', 'created_at'),)
+
+    def __repr__(self):
+        return f'<DeferredEmail {self.id} {self.priority} {self.status}>'
+
+class EmailQuotaBucket(db.Model):
+    """Persisted state of one send-rate token bucket, shared by every process"""
+    __tablename__ = 'email_quota_buckets'
+
+    name = db.Column(db.String(20), primary_key=True)  # 'minute' or 'day'
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<EmailQuotaBucket {self.name} {self.tokens:.1f}>'
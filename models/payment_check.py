@@ -0,0 +1,72 @@
+from app import db
+from datetime import datetime, timezone
+
+class PaymentCheckRun(db.Model):
+    __tablename__ = 'payment_check_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    check_date = db.Column(db.Date, nullable=False, index=True)
+    status = db.Column(db.String(25), nullable=False, default='running')  # 'running', 'completed', 'completed_with_errors', 'failed', 'interrupted'
+    # The landlords' time zone and check slot (services.check_schedule); both None for a run over everyone
+    time_zone = db.Column(db.String(64))
+    slot = db.Column(db.Integer)
+
+    # Timing
+    started_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    finished_at = db.Column(db.DateTime)
+
+    # Counters
+    properties_scanned = db.Column(db.Integer, default=0)
+    properties_due = db.Column(db.Integer, default=0)
+    matched_count = db.Column(db.Integer, default=0)
+    partial_count = db.Column(db.Integer, default=0)
+    missed_count = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    emails_queued = db.Column(db.Integer, default=0)
+    settled_count = db.Column(db.Integer, default=0)  # earlier pending/missed payments resolved by this run
+    akahu_seconds = db.Column(db.Float, default=0.0)
+
+    # Run-level failure, if the run itself aborted
+    error = db.Column(db.Text)
+    # Times the scheduler has started the run; a failed slot run is retried up to a cap
+    attempts = db.Column(db.Integer, default=1)
+
+    outcomes = db.relationship('PaymentCheckOutcome', backref='run', lazy='dynamic',
+                               cascade='all, delete-orphan')
+
+    __table_args__ = (
+        # One run per slot and check date, claimed by whichever process inserts it
+        # first; NULL slots (runs over everyone) never conflict
+        db.UniqueConstraint('time_zone', 'slot', 'check_date', name='uq_payment_check_runs_slot_date'),
+    )
+
+    @property
+    def duration_seconds(self):
+        if not self.finished_at:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+    def __repr__(self):
+        return f'<PaymentCheckRun {self.id} {self.check_date} {self.status}>'
+
+class PaymentCheckOutcome(db.Model):
+    __tablename__ = 'payment_check_outcomes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('payment_check_runs.id'), nullable=False, index=True)
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.id', ondelete='CASCADE'), nullable=False)
+
+    # 'received', 'partial', 'pending' (late window still open), 'missed', 'skipped' or 'error'
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    duration_ms = db.Column(db.Integer)
+    akahu_ms = db.Column(db.Integer)
+    emails_queued = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0)
+
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (db.UniqueConstraint('run_id', 'property_id'),)
+
+    def __repr__(self):
+        return f'<PaymentCheckOutcome run={self.run_id} property={self.property_id} {self.status}>'
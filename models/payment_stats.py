@@ -0,0 +1,32 @@
+from app import db
+from datetime import datetime, timezone
+
+class PaymentStatsMonthly(db.Model):
+    """One landlord's rent payments for one month of due dates, kept as running totals.
+
+    services.payment_stats adjusts the row whenever a RentPayment is written,
+    so the analytics views never scan rent_payments.
+    """
+    __tablename__ = 'payment_stats_monthly'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)  # first day of the month
+
+    # Payments recorded, by status; on_time counts full payments made by the due date
+    payments = db.Column(db.Integer, nullable=False, default=0)
+    received = db.Column(db.Integer, nullable=False, default=0)
+    partial = db.Column(db.Integer, nullable=False, default=0)
+    missed = db.Column(db.Integer, nullable=False, default=0)
+    pending = db.Column(db.Integer, nullable=False, default=0)
+    on_time = db.Column(db.Integer, nullable=False, default=0)
+
+    # Amounts in cents: rent due, rent received (full and partial), and what
+    # missed and partial payments left unpaid
+    expected_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    received_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    arrears_cents = db.Column(db.BigInteger, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<PaymentStatsMonthly {self.user_id} {self.month:%Y-%m}>'
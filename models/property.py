@@ -24,6 +24,11 @@ class Property(db.Model):
     # Email settings
     send_tenant_reminder = db.Column(db.Boolean, default=False)
 
+    # Days before/after the due date a payment still counts as on time
+    # (None uses PAYMENT_WINDOW_EARLY_DAYS / PAYMENT_WINDOW_LATE_DAYS)
+    payment_window_early_days = db.Column(db.Integer)
+    payment_window_late_days = db.Column(db.Integer)
+
     # Timestamps
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
@@ -44,9 +49,11 @@ class RentPayment(db.Model):
     received_date = db.Column(db.Date)
 
     # Status
-    status = db.Column(db.String(20), nullable=False)  # 'pending', 'received', 'missed', 'partial'
+    # 'pending' while the late window is still open, then 'received', 'partial' or 'missed'
+    status = db.Column(db.String(20), nullable=False)
 
     # Bank transaction details
+    bank_transaction_id = db.Column(db.Integer, db.ForeignKey('bank_transactions.id', ondelete='SET NULL'))
     transaction_description = db.Column(db.Text)
     transaction_reference = db.Column(db.String(255))
 
@@ -61,5 +68,13 @@ class RentPayment(db.Model):
     # Relationship
     property = db.relationship('Property', backref='rent_payments')
 
+    __table_args__ = (
+        # One payment per due date, whichever writer records it first; its index
+        # also serves per-property history lookups and keyset pagination by due date
+        db.UniqueConstraint('property_id', 'due_date', name='uq_rent_payments_property_due'),
+        # A transaction pays at most one due date per property
+        db.UniqueConstraint('bank_transaction_id', 'property_id'),
+    )
+
     def __repr__(self):
         return f'<RentPayment {self.property_id} - {self.due_date}>'
\ No newline at end of file
@@ -13,7 +13,7 @@ class User(UserMixin, db.Model):
     first_name = db.Column(db.String(100))
     last_name = db.Column(db.String(100))
     email_verified = db.Column(db.Boolean, default=False)
-    email_verification_token = db.Column(db.Text)
+    email_verification_token = db.Column(db.String(64), index=True)  # SHA-256 hex digest
     email_verification_expires = db.Column(db.DateTime)
     last_login = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
@@ -28,6 +28,12 @@ class User(UserMixin, db.Model):
     akahu_app_token = db.Column(db.String(255))
     akahu_user_token = db.Column(db.String(255))
 
+    # IANA zone the daily payment check slot is placed in (None: DEFAULT_TIME_ZONE)
+    time_zone = db.Column(db.String(64))
+
+    # JSON API access (SHA-256 hex digest of the bearer token)
+    api_token_hash = db.Column(db.String(64), unique=True, index=True)
+
     # Relationships
     properties = db.relationship('Property', backref='landlord', lazy=True)
     settings = db.relationship('UserSetting', backref='user', lazy=True)
@@ -39,6 +45,7 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
     def can_add_property(self):
+        from models.property import Property
         property_count = Property.query.filter_by(user_id=self.id).count()
         return property_count == 0 or self.is_premium
 
@@ -50,8 +57,8 @@ class PasswordResetToken(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    token = db.Column(db.Text, nullable=False)
-    expires_at = db.Column(db.DateTime, nullable=False)
+    token = db.Column(db.String(64), nullable=False, unique=True, index=True)  # SHA-256 hex digest
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
     used = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
@@ -63,4 +70,19 @@ class UserSetting(db.Model):
     setting_key = db.Column(db.Text, nullable=False)
     setting_value = db.Column(db.Text)
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'setting_key'),)
\ No newline at end of file
+    __table_args__ = (db.UniqueConstraint('user_id', 'setting_key'),)
+
+    @classmethod
+    def get_value(cls, user_id, key, default=None):
+        setting = cls.query.filter_by(user_id=user_id, setting_key=key).first()
+        return setting.setting_value if setting is not None else default
+
+    @classmethod
+    def set_value(cls, user_id, key, value):
+        """Create or update a setting; the caller commits"""
+        setting = cls.query.filter_by(user_id=user_id, setting_key=key).first()
+        if setting is None:
+            setting = cls(user_id=user_id, setting_key=key)
+            db.session.add(setting)
+        setting.setting_value = value
+        return setting
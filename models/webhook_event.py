@@ -0,0 +1,30 @@
+from app import db
+from datetime import datetime, timezone
+
+class AkahuWebhookEvent(db.Model):
+    """A verified Akahu webhook delivery waiting to be (or already) processed"""
+    __tablename__ = 'akahu_webhook_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    # SHA-256 of the signed body, so a redelivered notification is stored once
+    digest = db.Column(db.String(64), nullable=False, unique=True)
+
+    webhook_type = db.Column(db.String(50), nullable=False)
+    webhook_code = db.Column(db.String(50))
+    item_id = db.Column(db.String(64))  # the Akahu account the notification is about
+    payload = db.Column(db.Text, nullable=False)
+
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'processing', 'done', 'failed'
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+
+    received_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    claimed_at = db.Column(db.DateTime)
+    processed_at = db.Column(db.DateTime)
+
+    # The worker looks for the oldest queued events
+    __table_args__ = (db.Index('ix_akahu_webhook_events_status_received', 'status', 'received_at'),)
+
+    def __repr__(self):
+        return f'<AkahuWebhookEvent {self.id} user={self.user_id} {self.status}>'
@@ -0,0 +1,35 @@
+import os
+from functools import wraps
+from flask import Blueprint, render_template, abort
+from flask_login import login_required, current_user
+
+from services import check_schedule
+from utils.database import read_replica
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+# Comma-separated emails of the operators allowed into /admin
+ADMIN_EMAILS = {email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+def admin_required(view):
+    """Only logged-in users listed in ADMIN_EMAILS; everyone else gets a 404"""
+    @wraps(view)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if current_user.email.lower() not in ADMIN_EMAILS:
+            abort(404)
+        return view(*args, **kwargs)
+    return wrapper
+
+@admin_bp.route('/check-schedule')
+@admin_required
+@read_replica
+def check_schedule_view():
+    """How landlords are spread over today's payment check slots"""
+    slots = check_schedule.occupancy()
+    busiest = max(slots, key=lambda slot: slot['properties'], default=None)
+    return render_template('admin/check_schedule.html', slots=slots, busiest=busiest,
+                           slot_count=check_schedule.SLOT_COUNT,
+                           slot_minutes=check_schedule.CHECK_SLOT_MINUTES,
+                           window_start=check_schedule.CHECK_WINDOW_START,
+                           window_minutes=check_schedule.CHECK_WINDOW_MINUTES)
@@ -1,6 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import json
+import logging
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from app import db
+from services import akahu_webhooks, transaction_cache
+
+logger = logging.getLogger(__name__)
 
 akahu_bp = Blueprint('akahu', __name__, url_prefix='/akahu')
 
@@ -13,14 +18,86 @@ def setup():
 
         if not app_token or not user_token:
             flash('Please enter both App Token and User Token.', 'error')
-            return render_template('akahu/setup.html')
+            return _render_setup()
 
         # Update user's Akahu tokens
         current_user.akahu_app_token = app_token
         current_user.akahu_user_token = user_token
+        # Lets new payments be matched as Akahu reports them, not only by the daily check
+        akahu_webhooks.subscribe(current_user)
         db.session.commit()
 
         flash('Akahu integration configured successfully!', 'success')
         return redirect(url_for('main.dashboard'))
 
-    return render_template('akahu/setup.html')
\ No newline at end of file
+    return _render_setup()
+
+@akahu_bp.route('/accounts', methods=['POST'])
+@login_required
+def rent_accounts():
+    """Choose which linked accounts receive rent; none selected means all of them"""
+    account_ids = request.form.getlist('account_ids')
+    if account_ids:
+        # The ids end up in Akahu request paths and a comma-separated setting,
+        # so only accept accounts Akahu lists for this landlord
+        try:
+            linked = {account['id'] for account in transaction_cache.akahu_client.get_accounts(current_user)}
+        except Exception as e:
+            logger.warning(f"Could not list Akahu accounts for user {current_user.id}: {e}")
+            flash('Could not reach Akahu to check those accounts. Please try again.', 'error')
+            return redirect(url_for('akahu.setup'))
+        if not set(account_ids) <= linked:
+            flash('Please choose from your linked accounts.', 'error')
+            return redirect(url_for('akahu.setup'))
+
+    if transaction_cache.set_rent_account_ids(current_user, account_ids):
+        db.session.commit()
+        flash('Rent accounts updated. Transactions will be re-fetched from those accounts.', 'success')
+    else:
+        flash('Rent accounts unchanged.', 'info')
+    return redirect(url_for('akahu.setup'))
+
+@akahu_bp.route('/webhook', methods=['POST'])
+def webhook():
+    """Queue a signed Akahu notification for the webhook worker and acknowledge it.
+
+    Only TRANSACTION notifications for a known landlord are queued; anything
+    else is acknowledged and dropped so Akahu stops retrying it.
+    """
+    body = request.get_data()
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None
+    # Who it claims to be for; trusted only once the signature checks out
+    user = akahu_webhooks.payload_user(payload) if isinstance(payload, dict) else None
+
+    if not akahu_webhooks.verify_request(body, request.headers, user):
+        akahu_webhooks.webhook_events.inc(outcome='rejected')
+        return jsonify({'error': 'Invalid signature'}), 401
+    if not isinstance(payload, dict):
+        akahu_webhooks.webhook_events.inc(outcome='rejected')
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+
+    account_ids = transaction_cache.rent_account_ids(user) if user else []
+    if (user is None or payload.get('webhook_type') != 'TRANSACTION'
+            or (account_ids and payload.get('item_id') and payload['item_id'] not in account_ids)):
+        akahu_webhooks.webhook_events.inc(outcome='ignored')
+        return jsonify({'status': 'ignored'}), 200
+
+    if not akahu_webhooks.enqueue(user.id, body, payload):
+        akahu_webhooks.webhook_events.inc(outcome='duplicate')
+        return jsonify({'status': 'duplicate'}), 200
+    akahu_webhooks.webhook_events.inc(outcome='queued')
+    return jsonify({'status': 'queued'}), 202
+
+def _render_setup():
+    """The setup page, listing linked accounts once tokens are configured"""
+    accounts = None
+    if current_user.akahu_app_token and current_user.akahu_user_token:
+        try:
+            accounts = transaction_cache.akahu_client.get_accounts(current_user)
+        except Exception as e:
+            logger.warning(f"Could not list Akahu accounts for user {current_user.id}: {e}")
+    return render_template('akahu/setup.html', accounts=accounts,
+                           rent_account_ids=transaction_cache.rent_account_ids(current_user))
@@ -0,0 +1,310 @@
+import base64
+import hashlib
+import json
+from datetime import date
+from functools import wraps
+from flask import Blueprint, Response, g, jsonify, request
+from sqlalchemy import and_, func, or_
+
+from app import db
+from models.property import Property, RentPayment
+from models.user import User
+from utils.export import plain_value
+from utils.tokens import hash_token
+from utils.validators import PROPERTY_SCHEMA, ValidationError
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+PROPERTY_FIELDS = ('id', 'address', 'tenant_name', 'tenant_email', 'rent_amount', 'rent_frequency',
+                   'rent_due_day_of_week', 'rent_due_day', 'bank_statement_keyword',
+                   'send_tenant_reminder', 'payment_window_early_days', 'payment_window_late_days',
+                   'created_at', 'updated_at')
+PAYMENT_FIELDS = ('id', 'property_id', 'due_date', 'expected_amount', 'actual_amount', 'status',
+                  'received_date', 'transaction_description', 'transaction_reference',
+                  'landlord_notified', 'tenant_notified', 'created_at', 'updated_at')
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+
+@api_bp.errorhandler(APIError)
+def handle_api_error(e):
+    return jsonify({'error': e.message, **e.extra}), e.status
+
+
+@api_bp.errorhandler(404)
+def handle_not_found(e):
+    return jsonify({'error': 'Not found'}), 404
+
+
+@api_bp.errorhandler(405)
+def handle_method_not_allowed(e):
+    return jsonify({'error': 'Method not allowed'}), 405
+
+
+def api_login_required(view):
+    """Authenticate with `Authorization: Bearer <token>` from the profile page"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        user = None
+        if scheme.lower() == 'bearer' and token.strip():
+            user = User.query.filter_by(api_token_hash=hash_token(token.strip())).first()
+        if user is None:
+            response = jsonify({'error': 'A valid API token is required'})
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return response, 401
+        g.api_user = user
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# Pagination, field selection and conditional requests
+
+def _page_size():
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise APIError('limit must be an integer')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _encode_cursor(*values):
+    raw = json.dumps([plain_value(v) for v in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor():
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise APIError('Invalid cursor')
+
+
+def _selected_fields(allowed):
+    """Fields named in ?fields=a,b (default: all), validated against allowed"""
+    requested = request.args.get('fields')
+    if not requested:
+        return allowed
+    fields = tuple(name.strip() for name in requested.split(',') if name.strip())
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise APIError(f"Unknown fields: {', '.join(unknown)}", allowed=list(allowed))
+    return fields
+
+
+def _serialize(obj, fields):
+    return {name: plain_value(getattr(obj, name)) for name in fields}
+
+
+def _digest(value, length):
+    return hashlib.sha256(repr(value).encode()).hexdigest()[:length]
+
+
+def _etag(*parts):
+    """Weak ETag: a version tag over parts, plus the query string shaping the response.
+
+    If-None-Match compares the whole tag, so ?fields=a and ?fields=b are
+    cached apart. If-Match compares only the version (_tag_version), so a
+    write isn't refused over how the client happened to fetch the resource.
+    """
+    tag = _digest(parts, 32)
+    if request.args:
+        tag += '.' + _digest(sorted(request.args.items(multi=True)), 16)
+    return f'W/"{tag}"'
+
+
+def _tag_version(tag):
+    """The version part of one entity tag from a request header"""
+    tag = tag.strip()
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    return tag.strip('"').split('.')[0]
+
+
+def _not_modified(etag):
+    """True when the client's If-None-Match already covers this version"""
+    if_none_match = request.headers.get('If-None-Match', '')
+    return etag in (tag.strip() for tag in if_none_match.split(',')) or if_none_match.strip() == '*'
+
+
+def _conditional(etag, build):
+    """304 if the client is current, otherwise the full response from build()"""
+    if _not_modified(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _check_if_match(property):
+    """Optimistic concurrency: reject writes made against a stale version"""
+    if_match = request.headers.get('If-Match', '').strip()
+    if not if_match or if_match == '*':
+        return
+    if _property_version(property) not in (_tag_version(tag) for tag in if_match.split(',')):
+        raise APIError('Property was modified since it was fetched', 412)
+
+
+def _property_version(property):
+    return _digest(('property', property.id, property.updated_at), 32)
+
+
+def _property_etag(property):
+    return _etag('property', property.id, property.updated_at)
+
+
+def _get_property(property_id):
+    return Property.query.filter_by(id=property_id, user_id=g.api_user.id).first_or_404()
+
+
+# Properties
+
+@api_bp.route('/properties', methods=['GET'])
+@api_login_required
+def list_properties():
+    fields = _selected_fields(PROPERTY_FIELDS)
+    limit = _page_size()
+    after = _decode_cursor()
+
+    owned = Property.query.filter_by(user_id=g.api_user.id)
+    count, latest = db.session.query(func.count(Property.id), func.max(Property.updated_at)) \
+        .filter(Property.user_id == g.api_user.id).one()
+
+    def build():
+        query = owned
+        if after is not None:
+            try:
+                query = query.filter(Property.id > int(after[0]))
+            except (TypeError, ValueError, IndexError):
+                raise APIError('Invalid cursor')
+        page = query.order_by(Property.id).limit(limit + 1).all()
+        next_cursor = _encode_cursor(page[limit - 1].id) if len(page) > limit else None
+        return {'data': [_serialize(p, fields) for p in page[:limit]], 'next_cursor': next_cursor}
+
+    return _conditional(_etag('properties', g.api_user.id, count, latest), build)
+
+
+@api_bp.route('/properties', methods=['POST'])
+@api_login_required
+def create_property():
+    if not g.api_user.can_add_property():
+        raise APIError('You need to upgrade your account to add more properties.', 403)
+
+    values = _validated(request.get_json(silent=True))
+    property = Property(user_id=g.api_user.id, **values)
+    db.session.add(property)
+    db.session.commit()
+
+    response = jsonify(_serialize(property, PROPERTY_FIELDS))
+    response.status_code = 201
+    response.headers['Location'] = f'{api_bp.url_prefix}/properties/{property.id}'
+    response.headers['ETag'] = _property_etag(property)
+    return response
+
+
+@api_bp.route('/properties/<int:property_id>', methods=['GET'])
+@api_login_required
+def get_property(property_id):
+    property = _get_property(property_id)
+    fields = _selected_fields(PROPERTY_FIELDS)
+    return _conditional(_property_etag(property), lambda: _serialize(property, fields))
+
+
+@api_bp.route('/properties/<int:property_id>', methods=['PUT', 'PATCH'])
+@api_login_required
+def update_property(property_id):
+    """PUT replaces every field; PATCH merges the body into the current values"""
+    property = _get_property(property_id)
+    _check_if_match(property)
+
+    payload = request.get_json(silent=True)
+    if request.method == 'PATCH' and isinstance(payload, dict):
+        current = {field.name: getattr(property, field.name) for field in PROPERTY_SCHEMA.fields}
+        payload = {**current, **payload}
+
+    for name, value in _validated(payload).items():
+        setattr(property, name, value)
+    db.session.commit()
+
+    response = jsonify(_serialize(property, PROPERTY_FIELDS))
+    response.headers['ETag'] = _property_etag(property)
+    return response
+
+
+@api_bp.route('/properties/<int:property_id>', methods=['DELETE'])
+@api_login_required
+def delete_property(property_id):
+    property = _get_property(property_id)
+    _check_if_match(property)
+
+    db.session.delete(property)
+    db.session.commit()
+    return '', 204
+
+
+def _validated(payload):
+    if not isinstance(payload, dict):
+        raise APIError('Request body must be a JSON object')
+    try:
+        return PROPERTY_SCHEMA.validate(payload)
+    except ValidationError as e:
+        raise APIError(e.message, 422, field=e.field)
+
+
+# Payment history
+
+@api_bp.route('/payments', methods=['GET'])
+@api_login_required
+def list_payments():
+    """Payment history across every property, newest due date first"""
+    property_ids = db.session.query(Property.id).filter(Property.user_id == g.api_user.id)
+    return _payment_page(RentPayment.property_id.in_(property_ids.scalar_subquery()),
+                         ('payments', g.api_user.id))
+
+
+@api_bp.route('/properties/<int:property_id>/payments', methods=['GET'])
+@api_login_required
+def list_property_payments(property_id):
+    property = _get_property(property_id)
+    return _payment_page(RentPayment.property_id == property.id, ('property_payments', property.id))
+
+
+def _payment_page(scope, etag_key):
+    fields = _selected_fields(PAYMENT_FIELDS)
+    limit = _page_size()
+    after = _decode_cursor()
+
+    count, latest = db.session.query(func.count(RentPayment.id), func.max(RentPayment.updated_at)) \
+        .filter(scope).one()
+
+    def build():
+        query = RentPayment.query.filter(scope)
+        if after is not None:
+            try:
+                due_date, payment_id = date.fromisoformat(after[0]), int(after[1])
+            except (TypeError, ValueError, IndexError):
+                raise APIError('Invalid cursor')
+            query = query.filter(or_(RentPayment.due_date < due_date,
+                                     and_(RentPayment.due_date == due_date, RentPayment.id < payment_id)))
+        page = query.order_by(RentPayment.due_date.desc(), RentPayment.id.desc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(page) > limit:
+            last = page[limit - 1]
+            next_cursor = _encode_cursor(last.due_date, last.id)
+        return {'data': [_serialize(p, fields) for p in page[:limit]], 'next_cursor': next_cursor}
+
+    return _conditional(_etag(*etag_key, count, latest), build)
@@ -1,5 +1,4 @@
 import os
-import secrets
 from datetime import datetime, timedelta, timezone
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_user, logout_user, login_required, current_user
@@ -11,6 +10,7 @@ from app import db
 from flask import current_app
 from models.user import User, PasswordResetToken
 from services.email_service import EmailService
+from utils.tokens import generate_token, hash_token, token_matches
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 email_service = EmailService()
@@ -62,8 +62,9 @@ def register():
         )
         user.set_password(password)
 
-        # Generate email verification token
-        user.email_verification_token = secrets.token_urlsafe(32)
+        # Generate email verification token (only the digest is stored)
+        verification_token = generate_token()
+        user.email_verification_token = hash_token(verification_token)
         user.email_verification_expires = datetime.now(timezone.utc) + timedelta(hours=24)
 
         db.session.add(user)
@@ -71,19 +72,13 @@ def register():
 
         # Send verification email in background to prevent blocking
         verification_url = url_for('auth.verify_email',
-                                   token=user.email_verification_token,
+                                   token=verification_token,
                                    _external=True)
 
         # Try to send email but don't block the response
         try:
-            from threading import Thread
-            def send_email_async():
-                try:
-                    email_service.send_email_verification(email, first_name, verification_url)
-                except Exception as e:
-                    current_app.logger.error(f"Failed to send verification email: {e}")
-
-            Thread(target=send_email_async, daemon=True).start()
+            email_service.send_in_background(email_service.send_email_verification,
+                                             email, first_name, verification_url)
             flash('Registration successful! Please check your email to verify your account.', 'success')
         except Exception as e:
             current_app.logger.error(f"Failed to start email thread: {e}")
@@ -139,9 +134,9 @@ def logout():
 
 @auth_bp.route('/verify_email/<token>')
 def verify_email(token):
-    user = User.query.filter_by(email_verification_token=token).first()
+    user = User.query.filter_by(email_verification_token=hash_token(token)).first()
 
-    if not user:
+    if not user or not token_matches(token, user.email_verification_token):
         flash('Invalid or expired verification token.', 'error')
         return redirect(url_for('auth.login'))
 
@@ -170,16 +165,18 @@ def resend_verification():
 
         if user and not user.email_verified:
             # Generate new token
-            user.email_verification_token = secrets.token_urlsafe(32)
+            verification_token = generate_token()
+            user.email_verification_token = hash_token(verification_token)
             user.email_verification_expires = datetime.now(timezone.utc) + timedelta(hours=24)
             db.session.commit()
 
             # Send verification email
             verification_url = url_for('auth.verify_email',
-                                       token=user.email_verification_token,
+                                       token=verification_token,
                                        _external=True)
 
-            email_service.send_email_verification(email, user.first_name, verification_url)
+            email_service.send_in_background(email_service.send_email_verification,
+                                             email, user.first_name, verification_url)
 
         # Always show the same message to prevent email enumeration
         flash('If an account with that email exists and is unverified, we\'ve sent a new verification email.', 'info')
@@ -202,10 +199,11 @@ def forgot_password():
             # Clean up old tokens
             PasswordResetToken.query.filter_by(user_id=user.id).delete()
 
-            # Create new reset token
+            # Create new reset token (only the digest is stored)
+            raw_token = generate_token()
             reset_token = PasswordResetToken(
                 user_id=user.id,
-                token=secrets.token_urlsafe(32),
+                token=hash_token(raw_token),
                 expires_at=datetime.now(timezone.utc) + timedelta(hours=24)
             )
             db.session.add(reset_token)
@@ -213,10 +211,11 @@ def forgot_password():
 
             # Send reset email
             reset_url = url_for('auth.reset_password',
-                                token=reset_token.token,
+                                token=raw_token,
                                 _external=True)
 
-            email_service.send_password_reset_email(email, user.first_name, reset_url)
+            email_service.send_in_background(email_service.send_password_reset_email,
+                                             email, user.first_name, reset_url)
 
         # Always show the same message to prevent email enumeration
         flash('If an account with that email exists, we\'ve sent you a password reset link.', 'info')
@@ -226,9 +225,9 @@ def forgot_password():
 
 @auth_bp.route('/reset_password/<token>', methods=['GET', 'POST'])
 def reset_password(token):
-    reset_token = PasswordResetToken.query.filter_by(token=token, used=False).first()
+    reset_token = PasswordResetToken.query.filter_by(token=hash_token(token), used=False).first()
 
-    if not reset_token or reset_token.expires_at < datetime.now(timezone.utc):
+    if not reset_token or not token_matches(token, reset_token.token) or reset_token.expires_at < datetime.now(timezone.utc):
         flash('Invalid or expired reset token.', 'error')
         return redirect(url_for('auth.forgot_password'))
 
@@ -260,4 +259,13 @@ def reset_password(token):
         flash('Password reset successful! You can now log in with your new password.', 'success')
         return redirect(url_for('auth.login'))
 
-    return render_template('auth/reset_password.html', token=token)
\ No newline at end of file
+    return render_template('auth/reset_password.html', token=token)
+
+def purge_password_reset_tokens():
+    """Bulk-delete expired and used password reset tokens"""
+    deleted = PasswordResetToken.query.filter(
+        db.or_(PasswordResetToken.used.is_(True),
+               PasswordResetToken.expires_at < datetime.now(timezone.utc))
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -1,14 +1,18 @@
-from flask import Blueprint, render_template, redirect, url_for
+from flask import Blueprint, render_template, redirect, request, url_for, flash
 from flask_login import login_required, current_user
 from models.user import User
 from models.property import Property
-from app import login_manager
+from app import db, login_manager
+from services import check_schedule
+from utils.database import read_replica, replica_reads
+from utils.tokens import generate_token, hash_token
 
 main_bp = Blueprint('main', __name__)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    with replica_reads():
+        return User.query.get(int(user_id))
 
 @main_bp.route('/')
 def index():
@@ -18,6 +22,7 @@ def index():
 
 @main_bp.route('/dashboard')
 @login_required
+@read_replica
 def dashboard():
     properties = Property.query.filter_by(user_id=current_user.id).all()
     property_count = len(properties)
@@ -31,4 +36,43 @@ def dashboard():
 @main_bp.route('/profile')
 @login_required
 def profile():
-    return render_template('profile.html')
\ No newline at end of file
+    return _render_profile()
+
+def _render_profile(**context):
+    return render_template('profile.html', time_zones=check_schedule.TIME_ZONE_CHOICES,
+                           default_time_zone=check_schedule.DEFAULT_TIME_ZONE, **context)
+
+@main_bp.route('/profile/time-zone', methods=['POST'])
+@login_required
+def update_time_zone():
+    """The zone the morning payment check runs in for this landlord"""
+    time_zone = request.form.get('time_zone', '').strip()
+    if time_zone not in check_schedule.TIME_ZONE_CHOICES:
+        flash('Please choose a valid time zone.', 'error')
+        return redirect(url_for('main.profile'))
+
+    current_user.time_zone = time_zone
+    db.session.commit()
+    flash('Time zone updated.', 'success')
+    return redirect(url_for('main.profile'))
+
+@main_bp.route('/profile/api-token', methods=['POST'])
+@login_required
+def create_api_token():
+    """Issue a new JSON API token, replacing any previous one"""
+    token = generate_token()
+    current_user.api_token_hash = hash_token(token)
+    db.session.commit()
+
+    # Shown once on this page; only the hash is stored
+    flash('New API token created. Copy it now, it will not be shown again.', 'success')
+    return _render_profile(api_token=token)
+
+@main_bp.route('/profile/api-token/revoke', methods=['POST'])
+@login_required
+def revoke_api_token():
+    current_user.api_token_hash = None
+    db.session.commit()
+
+    flash('API token revoked.', 'success')
+    return redirect(url_for('main.profile'))
@@ -0,0 +1,59 @@
+import os
+import hmac
+import logging
+from datetime import datetime, timezone
+from flask import Blueprint, Response, request, abort, jsonify
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# A daily check that hasn't completed for longer than this is reported stale
+HEALTH_MAX_RUN_AGE = float(os.environ.get('HEALTH_MAX_RUN_AGE_HOURS', 26)) * 3600
+
+@metrics_bp.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    token = os.environ.get('METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied, f'Bearer {token}'):
+            abort(401)
+
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@metrics_bp.route('/health')
+def health():
+    """Liveness, plus the scheduler state and when the payment check last completed.
+
+    Answers 200 while the database is reachable, with status 'stale' if the
+    last completed run is older than HEALTH_MAX_RUN_AGE, so a deploy probe
+    doesn't restart a healthy process over a missed check; monitors alert
+    on the status. 503 if the database can't be read.
+    """
+    from routes.payments import last_successful_run
+    from services.scheduler import scheduler_running
+
+    if os.environ.get('FLASK_ENV') == 'development':
+        scheduler = 'disabled'
+    else:
+        scheduler = 'running' if scheduler_running() else 'stopped'
+
+    try:
+        run = last_successful_run()
+    except Exception as e:
+        logger.error(f"Health check could not read payment check runs: {e}")
+        return jsonify({'status': 'error', 'scheduler': scheduler}), 503
+
+    last_run = None
+    status = 'stale'
+    if run is not None and run.finished_at is not None:
+        finished_at = run.finished_at if run.finished_at.tzinfo else run.finished_at.replace(tzinfo=timezone.utc)
+        age = (datetime.now(timezone.utc) - finished_at).total_seconds()
+        last_run = {'id': run.id, 'check_date': run.check_date.isoformat(),
+                    'finished_at': finished_at.isoformat(), 'age_seconds': int(age)}
+        if age <= HEALTH_MAX_RUN_AGE:
+            status = 'ok'
+    return jsonify({'status': status, 'scheduler': scheduler, 'last_successful_run': last_run})
@@ -1,17 +1,63 @@
-import requests
-import os
-from datetime import datetime, timedelta, date
-from flask import Blueprint, render_template, jsonify
+import time
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta, date, timezone
+from flask import (Blueprint, Response, render_template, jsonify, request, abort, has_app_context,
+                   stream_with_context)
 from flask_login import login_required, current_user
 from decimal import Decimal
+from sqlalchemy import and_, func, insert, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 
 from models.property import Property, RentPayment
+from models.payment_check import PaymentCheckRun, PaymentCheckOutcome
 from services.email_service import EmailService
+from services import check_schedule, payment_stats, shutdown, transaction_cache
+from services.reconciliation import (already_recorded, due_on, match_payments, open_payments, payment_window,
+                                     window_closed)
+from services import metrics
 from app import db
+from utils.database import read_replica, replica_reads
+from utils.export import EXPORT_BATCH_SIZE, stream_csv, stream_json
+
+logger = logging.getLogger(__name__)
 
 payments_bp = Blueprint('payments', __name__, url_prefix='/payments')
 email_service = EmailService()
 
+run_duration = metrics.histogram(
+    'payment_check_run_seconds',
+    'Wall time of a full check_rent_payments run',
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+phase_duration = metrics.histogram(
+    'payment_check_phase_seconds',
+    'Time spent in each phase of the payment check (sync, match, write, notify)'
+)
+properties_checked = metrics.counter(
+    'payment_check_properties_total',
+    'Properties processed by the payment check, by outcome'
+)
+payments_settled = metrics.counter(
+    'payment_check_settled_total',
+    'Earlier pending or missed payments resolved by a later run, by new status'
+)
+last_success = metrics.gauge(
+    'payment_check_last_success_timestamp_seconds',
+    'Unix time the most recent completed payment check run finished'
+)
+
+# Outcomes that need no further work when a run is resumed
+FINAL_OUTCOMES = ('received', 'partial', 'pending', 'missed', 'skipped')
+
+# A due date near today that has no RentPayment yet
+UpcomingDue = namedtuple('UpcomingDue', 'property due_date expected_amount')
+
+class RunInterrupted(Exception):
+    """The process is shutting down; the run stops before writing anything"""
+
 @payments_bp.route('/check')
 @login_required
 def check_payments():
@@ -19,16 +65,422 @@ def check_payments():
     check_rent_payments()
     return jsonify({'success': True, 'message': 'Payment check completed'})
 
-def check_rent_payments():
-    """Check for rent payments for the previous day"""
-    yesterday = date.today() - timedelta(days=1)
+def check_rent_payments(check_date=None, run=None, time_zone=None, slot=None):
+    """Check for rent payments for the previous day, recording a run ledger.
+
+    The check is set-based. Each landlord with rent due, or with payments
+    still outstanding, is synced from Akahu once into bank_transactions.
+    Transactions are then matched within each property's early/late window
+    (services.reconciliation), and the results are written in bulk. Rent
+    with no payment yet stays 'pending' until the late window has passed,
+    and only then is reported missed; a payment that turns up later settles
+    the pending or missed record in place. If a landlord's sync fails,
+    their properties get 'error' outcomes and the rest carry on. If the
+    process starts shutting down during the syncs, the run rolls back and
+    is left 'interrupted', ready to resume. Passing an
+    existing run resumes it: only due properties without a final outcome
+    are processed again. With a time zone and slot, only the landlords in
+    that group of the staggered schedule (services.check_schedule) are
+    checked.
+    """
+    if run is None:
+        run = PaymentCheckRun(check_date=check_date or date.today() - timedelta(days=1),
+                              time_zone=time_zone, slot=slot)
+        db.session.add(run)
+        outcomes = {}
+    else:
+        outcomes = {outcome.property_id: outcome for outcome in run.outcomes}
+    run.status = 'running'
+    run.error = None
+    db.session.commit()
+    check_date = run.check_date
+    landlord_ids = None
+    if run.slot is not None:
+        landlord_ids = check_schedule.slot_landlords(run.time_zone, run.slot)
+
+    try:
+        with run_duration.time():
+            scanned = db.session.query(func.count(Property.id))
+            due = Property.query.options(joinedload(Property.landlord)).filter(due_on(check_date))
+            if landlord_ids is not None:
+                scanned = scanned.filter(Property.user_id.in_(landlord_ids))
+                due = due.filter(Property.user_id.in_(landlord_ids))
+            run.properties_scanned = scanned.scalar()
+            pending = [p for p in due.order_by(Property.id)
+                       if p.id not in outcomes or outcomes[p.id].status not in FINAL_OUTCOMES]
+            outstanding = open_payments(check_date, user_ids=landlord_ids)
+
+            if pending or outstanding:
+                recorded = already_recorded(check_date) if pending else set()
+                with phase_duration.time(phase='sync'):
+                    failures, sync_ms = _sync_landlords(
+                        run, {p.landlord for p in pending if p.id not in recorded}
+                        | {payment.property.landlord for payment in outstanding})
+                # Without fresh transactions an outstanding payment can wait for the next run
+                outstanding = [payment for payment in outstanding if payment.property.user_id not in failures]
+                with phase_duration.time(phase='match'):
+                    matches, late_matches = match_payments(
+                        check_date,
+                        [p for p in pending if p.id not in recorded and p.user_id not in failures],
+                        outstanding, _previous_run_started(run))
+                with phase_duration.time(phase='write'):
+                    stats = payment_stats.Changes()
+                    notifications = _record_results(run, check_date, pending, outcomes, recorded,
+                                                    failures, sync_ms, matches, stats)
+                    settled, emails = _settle_outstanding(check_date, outstanding, late_matches, stats)
+                    run.settled_count = (run.settled_count or 0) + settled
+                    notifications += emails
+                    stats.apply()
+                    db.session.commit()
+
+                # Only after the results are committed, so a failed run sends nothing.
+                # Landlord mail goes first so tenant reminders are the ones the quota defers.
+                notifications.sort(key=lambda item: item[0] == email_service.send_tenant_reminder)
+                with phase_duration.time(phase='notify'):
+                    for send_method, args in notifications:
+                        send_method(*args)
+
+        _finish_run(run)
+    except RunInterrupted:
+        db.session.rollback()
+        run.error = 'Interrupted by shutdown'
+        _finish_run(run, status='interrupted')
+    except Exception as e:
+        db.session.rollback()
+        run.error = str(e)
+        _finish_run(run, status='failed')
+        raise
+
+    return run
+
+def _sync_landlords(run, landlords):
+    """Refresh each landlord's stored transactions, one Akahu call apiece.
+
+    Returns ({landlord id: error}, {landlord id: sync ms}). Each sync runs in
+    a savepoint so a failure only discards that landlord's rows.
+    """
+    failures, sync_ms = {}, {}
+    for landlord in landlords:
+        if shutdown.requested():
+            raise RunInterrupted()
+        if not landlord.akahu_app_token or not landlord.akahu_user_token:
+            continue  # No bank feed: nothing can match, so their rent shows as missed
+
+        started = time.perf_counter()
+        try:
+            with db.session.begin_nested():
+                transaction_cache.sync_transactions(landlord, commit=False, prune=False)
+        except Exception as e:
+            logger.error(f"Error fetching bank transactions for user {landlord.id}: {e}")
+            failures[landlord.id] = f'{type(e).__name__}: {e}'
+        sync_ms[landlord.id] = int((time.perf_counter() - started) * 1000)
+
+    # One statement for everyone instead of a prune per landlord
+    transaction_cache.prune_transactions(date.today() - timedelta(days=transaction_cache.CACHE_DAYS))
+
+    run.akahu_seconds = (run.akahu_seconds or 0) + sum(sync_ms.values()) / 1000
+    return failures, sync_ms
+
+def _record_results(run, check_date, pending, outcomes, recorded, failures, sync_ms, matches, stats):
+    """Queue RentPayment rows and outcomes for every pending property.
+
+    New payments are counted into stats (a payment_stats.Changes). Returns
+    the notifications to send once the transaction is committed.
+    """
+    payments, assessed, new_outcomes, notifications = [], [], [], []
+
+    for property in pending:
+        payment, emails = None, []
+        result = {'akahu_ms': sync_ms.get(property.user_id), 'error': None}
+
+        if property.id in recorded:
+            result['status'] = 'skipped'  # Already processed
+        elif property.user_id in failures:
+            # Retried on resume rather than reported as missed
+            result['status'] = 'error'
+            result['error'] = failures[property.user_id]
+        else:
+            values, emails = _assess_payment(property, check_date, property.rent_amount,
+                                             matches.get(property.id),
+                                             window_closed(property, check_date, check_date))
+            payment = dict(values, property_id=property.id,
+                           expected_amount=property.rent_amount, due_date=check_date)
+            payments.append(payment)
+            result['status'] = payment['status']
+        assessed.append((property, payment, emails, result))
+
+    inserted = _insert_payments(payments)
+    for property, payment, emails, result in assessed:
+        if payment is not None:
+            if (property.id, check_date) in inserted:
+                stats.add(property.user_id, after=payment)
+            else:
+                # The webhook worker recorded it since `recorded` was read, and sent its mail
+                result['status'], emails = 'skipped', []
+
+        result['emails_queued'] = len(emails)
+        notifications.extend(emails)
+        properties_checked.inc(outcome=result['status'])
+
+        outcome = outcomes.get(property.id)
+        if outcome is None:
+            new_outcomes.append(dict(result, run_id=run.id, property_id=property.id, attempts=1))
+        else:
+            # Resumed: update the earlier attempt's row
+            for name, value in result.items():
+                setattr(outcome, name, value)
+            outcome.attempts = (outcome.attempts or 0) + 1
+
+    # Plain executemany insert; no ORM objects are needed back
+    if new_outcomes:
+        db.session.execute(insert(PaymentCheckOutcome), new_outcomes)
+    return notifications
+
+def _insert_payments(payments):
+    """Insert new RentPayment rows, skipping due dates that are already recorded.
+
+    The daily check and the webhook worker both record due dates, in
+    separate processes. The unique (property_id, due_date) constraint lets
+    whichever commits first keep the row; the other's insert does nothing.
+    Returns the (property id, due date) pairs this call inserted.
+    """
+    if not payments:
+        return set()
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    # ORM bulk insert: rows with different keys (pending vs matched) are batched apart
+    statement = dialect.insert(RentPayment).on_conflict_do_nothing(
+        index_elements=[RentPayment.property_id, RentPayment.due_date]
+    ).returning(RentPayment.property_id, RentPayment.due_date)
+    return {(row.property_id, row.due_date) for row in db.session.execute(statement, payments)}
+
+def _settle_outstanding(check_date, outstanding, late_matches, stats):
+    """Update earlier pending/missed payments that matched or whose window closed.
+
+    The daily check and the webhook worker can both load the same payment.
+    The rows are locked before they change, and only those still in the
+    status they were loaded with are settled, so only one writer counts a
+    payment and sends its mail. If the other writer meanwhile recorded one
+    of the transactions against the same property, that payment is left
+    for the next run instead of failing this one. Changes are counted into
+    stats (a payment_stats.Changes). Returns (payments changed,
+    notifications to send once committed).
+    """
+    settling = []
+    for payment in outstanding:
+        match = late_matches.get(payment)
+        if match is None and (payment.status == 'missed'
+                              or not window_closed(payment.property, payment.due_date, check_date)):
+            continue  # Nothing new to say about it
+        values, emails = _assess_payment(payment.property, payment.due_date, payment.expected_amount,
+                                         match, closed=True)
+        settling.append((payment, payment_stats.snapshot(payment), values, emails))
+    if not settling:
+        return 0, []
+
+    # A writer that loaded the same rows waits here until the first commits,
+    # then reads the status it left
+    current = dict(db.session.execute(
+        select(RentPayment.id, RentPayment.status)
+        .where(RentPayment.id.in_([payment.id for payment, _, _, _ in settling]))
+        .with_for_update()).all())
+    settling = [item for item in settling if current.get(item[0].id) == item[1]['status']]
+
+    try:
+        with db.session.begin_nested():
+            for payment, _, values, _ in settling:
+                _update_payment(payment, values)
+    except IntegrityError:
+        settling = [item for item in settling if _settle_one(item[0], item[2])]
+
+    notifications = []
+    for payment, before, values, emails in settling:
+        stats.add(payment.property.user_id, after=dict(before, **values), before=before)
+        notifications.extend(emails)
+        payments_settled.inc(status=values['status'])
+    return len(settling), notifications
+
+def _settle_one(payment, values):
+    """Settle one payment in its own savepoint; False if the update breaks a unique constraint"""
+    try:
+        with db.session.begin_nested():
+            _update_payment(payment, values)
+    except IntegrityError as e:
+        logger.warning(f"Could not settle rent payment {payment.id}: {e.orig}")
+        return False
+    return True
+
+def _update_payment(payment, values):
+    for name, value in values.items():
+        setattr(payment, name, value)
+
+def _previous_run_started(run):
+    """When the previous day's last successful run over the same landlords started, or None.
+
+    A run over everyone covers any slot's landlords; a run over everyone
+    only follows on from another run over everyone.
+    """
+    same_landlords = PaymentCheckRun.slot.is_(None)
+    if run.slot is not None:
+        same_landlords = or_(same_landlords, and_(PaymentCheckRun.time_zone == run.time_zone,
+                                                  PaymentCheckRun.slot == run.slot))
+    return db.session.query(func.max(PaymentCheckRun.started_at)).filter(
+        PaymentCheckRun.id != run.id,
+        PaymentCheckRun.check_date == run.check_date - timedelta(days=1),
+        PaymentCheckRun.status.in_(('completed', 'completed_with_errors')),
+        same_landlords,
+    ).scalar()
+
+def _assess_payment(property, due_date, expected_amount, match, closed):
+    """RentPayment values and notifications for one due date's match (or None).
+
+    With no match the payment stays 'pending' until the late window has
+    closed, and only then becomes 'missed' with its alerts.
+    """
+    landlord = property.landlord
+    due = due_date.strftime('%Y-%m-%d')
+
+    if match is None:
+        if not closed:
+            return {'status': 'pending'}, []
+        # No matching transaction found - rent missed
+        emails = [(email_service.send_rent_missed_notification,
+                   (landlord.email, property.address, property.tenant_name, expected_amount, due))]
+        # Send reminder to tenant if enabled
+        if property.send_tenant_reminder:
+            emails.append((email_service.send_tenant_reminder,
+                           (property.tenant_email, property.tenant_name, property.address, expected_amount, due)))
+        return {'status': 'missed'}, emails
+
+    # Transaction found - check amount
+    transaction_amount = Decimal(match.amount_cents).scaleb(-2)
+    received = match.date.strftime('%Y-%m-%d')
+    payment = {
+        'actual_amount': transaction_amount,
+        'received_date': match.date,
+        'bank_transaction_id': match.id,
+        'transaction_description': match.description,
+        'transaction_reference': match.reference
+    }
+
+    if transaction_amount == expected_amount:
+        # Exact match - rent received
+        payment['status'] = 'received'
+        emails = [(email_service.send_rent_received_notification,
+                   (landlord.email, property.address, property.tenant_name, transaction_amount, received))]
+    else:
+        # Amount mismatch - partial payment
+        payment['status'] = 'partial'
+        emails = [(email_service.send_rent_partial_notification,
+                   (landlord.email, property.address, property.tenant_name, expected_amount,
+                    transaction_amount, received))]
+    return payment, emails
+
+def _finish_run(run, status=None):
+    """Recompute run counters from its outcome rows and close it"""
+    totals = {row.status: row for row in db.session.query(
+        PaymentCheckOutcome.status,
+        func.count(PaymentCheckOutcome.id).label('count'),
+        func.coalesce(func.sum(PaymentCheckOutcome.emails_queued), 0).label('emails')
+    ).filter(PaymentCheckOutcome.run_id == run.id).group_by(PaymentCheckOutcome.status)}
+
+    def count(name):
+        return totals[name].count if name in totals else 0
+
+    run.properties_due = sum(row.count for row in totals.values())
+    run.matched_count = count('received')
+    run.partial_count = count('partial')
+    run.missed_count = count('missed')
+    run.error_count = count('error')
+    run.emails_queued = sum(row.emails for row in totals.values())
+    run.status = status or ('completed_with_errors' if run.error_count else 'completed')
+    run.finished_at = datetime.now(timezone.utc)
+    db.session.commit()
+
+def last_successful_run():
+    """The most recently finished run that completed, with or without errors, or None"""
+    return PaymentCheckRun.query.filter(PaymentCheckRun.status.in_(('completed', 'completed_with_errors'))) \
+        .order_by(PaymentCheckRun.finished_at.desc()).first()
+
+@metrics.register_collector
+def _collect_last_success():
+    if not has_app_context():
+        return
+    try:
+        run = last_successful_run()
+    except Exception as e:
+        logger.debug(f"Could not read the last payment check run: {e}")
+        return
+    if run is not None and run.finished_at is not None:
+        finished_at = run.finished_at
+        if finished_at.tzinfo is None:
+            finished_at = finished_at.replace(tzinfo=timezone.utc)
+        last_success.set(finished_at.timestamp())
+
+def resume_payment_check(run):
+    """Re-process only the unfinished properties of an earlier run"""
+    return check_rent_payments(run=run)
+
+def match_landlord_payments(landlord, today=None):
+    """Match one landlord's rent as soon as new transactions arrive.
+
+    Used by the Akahu webhook worker. Syncs the landlord once, settles
+    their outstanding payments, and records due dates near today that a
+    new transaction already pays; the daily check skips those as already
+    recorded. Unpaid due dates are left for the daily check to assess.
+    Returns the number of payments recorded or settled.
+    """
+    today = today or date.today()
+    if landlord.akahu_app_token and landlord.akahu_user_token:
+        transaction_cache.sync_transactions(landlord, today=today, commit=False)
+
+    outstanding = open_payments(today, user_ids=[landlord.id])
+    upcoming = _upcoming_due_dates(landlord, today)
+    _, late_matches = match_payments(today, [], upcoming + outstanding)
+
+    payments, notifications = [], []
+    stats = payment_stats.Changes()
+    for due in upcoming:
+        match = late_matches.get(due)
+        if match is None:
+            continue
+        values, emails = _assess_payment(due.property, due.due_date, due.expected_amount, match, closed=True)
+        payments.append((dict(values, property_id=due.property.id,
+                              expected_amount=due.expected_amount, due_date=due.due_date), emails))
+    inserted = _insert_payments([payment for payment, _ in payments])
+    # Due dates the daily check recorded meanwhile keep its row and its mail
+    for payment, emails in payments:
+        if (payment['property_id'], payment['due_date']) in inserted:
+            stats.add(landlord.id, after=payment)
+            notifications.extend(emails)
+
+    # Today's feed is still incomplete, so windows close as they would in the daily check
+    settled, emails = _settle_outstanding(today - timedelta(days=1), outstanding, late_matches, stats)
+    notifications += emails
+    stats.apply()
+    db.session.commit()
 
-    # Get all properties for all users
-    properties = Property.query.all()
+    for send_method, args in notifications:
+        send_method(*args)
+    return len(inserted) + settled
 
+def _upcoming_due_dates(landlord, today):
+    """Unrecorded due dates of the landlord's properties whose window covers today"""
+    properties = Property.query.filter_by(user_id=landlord.id).order_by(Property.id).all()
+    windows = {p.id: payment_window(p) for p in properties}
+    earliest = today - timedelta(days=max((late for _, late in windows.values()), default=0))
+    latest = today + timedelta(days=max((early for early, _ in windows.values()), default=0))
+    recorded = {(property_id, due_date) for property_id, due_date in db.session.query(
+        RentPayment.property_id, RentPayment.due_date).join(RentPayment.property).filter(
+        Property.user_id == landlord.id, RentPayment.due_date.between(earliest, latest))}
+
+    upcoming = []
     for property in properties:
-        if is_rent_due(property, yesterday):
-            process_rent_payment(property, yesterday)
+        early, late = windows[property.id]
+        for offset in range(-late, early + 1):
+            due_date = today + timedelta(days=offset)
+            if is_rent_due(property, due_date) and (property.id, due_date) not in recorded:
+                upcoming.append(UpcomingDue(property, due_date, property.rent_amount))
+    return upcoming
 
 def is_rent_due(property, check_date):
     """Check if rent is due on the given date for this property"""
@@ -43,148 +495,113 @@ def is_rent_due(property, check_date):
 
     return False
 
-def process_rent_payment(property, check_date):
-    """Process rent payment checking for a property"""
-    landlord = property.landlord
+@payments_bp.route('/history/<int:property_id>')
+@login_required
+@read_replica
+def payment_history(property_id):
+    """View payment history for a property"""
+    property = Property.query.filter_by(id=property_id, user_id=current_user.id).first_or_404()
+    payments = RentPayment.query.filter_by(property_id=property_id).order_by(RentPayment.due_date.desc()).all()
 
-    # Check if we already processed this date
-    existing_payment = RentPayment.query.filter_by(
-        property_id=property.id,
-        due_date=check_date
-    ).first()
+    return render_template('payments/history.html', property=property, payments=payments)
 
-    if existing_payment:
-        return  # Already processed
+# Months the analytics views cover by default, and at most
+ANALYTICS_MONTHS = 12
+ANALYTICS_MAX_MONTHS = 60
 
-    # Check bank transactions
-    transaction = get_bank_transaction(landlord, property, check_date)
+@payments_bp.route('/analytics')
+@login_required
+@read_replica
+def analytics():
+    """Portfolio on-time rate, income and arrears per month"""
+    months, total = _portfolio_stats()
+    return render_template('payments/analytics.html', months=months, total=total,
+                           month_count=len(months), max_months=ANALYTICS_MAX_MONTHS)
 
-    if transaction is None:
-        # No matching transaction found - rent missed
-        rent_payment = RentPayment(
-            property_id=property.id,
-            expected_amount=property.rent_amount,
-            due_date=check_date,
-            status='missed'
-        )
-        db.session.add(rent_payment)
-        db.session.commit()
-
-        # Send notification to landlord
-        email_service.send_rent_missed_notification(
-            landlord.email,
-            property.address,
-            property.tenant_name,
-            property.rent_amount,
-            check_date.strftime('%Y-%m-%d')
-        )
+@payments_bp.route('/analytics.json')
+@login_required
+@read_replica
+def analytics_json():
+    """The analytics page's figures as JSON; amounts are decimal strings"""
+    months, total = _portfolio_stats()
 
-        # Send reminder to tenant if enabled
-        if property.send_tenant_reminder:
-            email_service.send_tenant_reminder(
-                property.tenant_email,
-                property.tenant_name,
-                property.address,
-                property.rent_amount,
-                check_date.strftime('%Y-%m-%d')
-            )
+    def serialize(stats):
+        return {name: str(value) if isinstance(value, Decimal) else value for name, value in stats.items()}
 
-    else:
-        # Transaction found - check amount
-        transaction_amount = Decimal(str(transaction['amount']))
-        expected_amount = property.rent_amount
-
-        if transaction_amount == expected_amount:
-            # Exact match - rent received
-            rent_payment = RentPayment(
-                property_id=property.id,
-                expected_amount=expected_amount,
-                actual_amount=transaction_amount,
-                due_date=check_date,
-                received_date=datetime.strptime(transaction['date'], '%Y-%m-%d').date(),
-                status='received',
-                transaction_description=transaction['description']
-            )
-            db.session.add(rent_payment)
-            db.session.commit()
-
-            email_service.send_rent_received_notification(
-                landlord.email,
-                property.address,
-                property.tenant_name,
-                transaction_amount,
-                transaction['date']
-            )
+    return jsonify({
+        'months': [dict(serialize(stats), month=stats['month'].strftime('%Y-%m')) for stats in months],
+        'total': serialize(total),
+    })
 
-        else:
-            # Amount mismatch - partial payment
-            rent_payment = RentPayment(
-                property_id=property.id,
-                expected_amount=expected_amount,
-                actual_amount=transaction_amount,
-                due_date=check_date,
-                received_date=datetime.strptime(transaction['date'], '%Y-%m-%d').date(),
-                status='partial',
-                transaction_description=transaction['description']
-            )
-            db.session.add(rent_payment)
-            db.session.commit()
-
-            email_service.send_rent_partial_notification(
-                landlord.email,
-                property.address,
-                property.tenant_name,
-                expected_amount,
-                transaction_amount,
-                transaction['date']
-            )
-
-def get_bank_transaction(landlord, property, check_date):
-    """Get bank transaction from Akahu API"""
-    if not landlord.akahu_app_token or not landlord.akahu_user_token:
-        return None
+def _portfolio_stats():
+    """Summaries for the current user's last ?months= months, newest first, and their total.
 
-    try:
-        # Mock implementation - replace with actual Akahu API call
-        # This is a simplified version for demonstration
-        headers = {
-            'Authorization': f'Bearer {landlord.akahu_user_token}',
-            'X-Akahu-ID': landlord.akahu_app_token
-        }
-
-        # Format date for API
-        date_str = check_date.strftime('%Y-%m-%d')
-
-        # In a real implementation, you would call the Akahu API here
-        # For now, we'll return None to simulate no transaction found
-        #
-        # Example API call (commented out):
-        # response = requests.get(
-        #     f'https://api.akahu.nz/v1/transactions',
-        #     headers=headers,
-        #     params={
-        #         'start': date_str,
-        #         'end': date_str
-        #     }
-        # )
-        #
-        # if response.status_code == 200:
-        #     transactions = response.json().get('items', [])
-        #     for transaction in transactions:
-        #         if property.bank_statement_keyword.lower() in transaction['description'].lower():
-        #             return transaction
-
-        return None
+    Read from payment_stats_monthly only: one row per month, however many
+    properties and payments the portfolio has.
+    """
+    count = max(1, min(request.args.get('months', ANALYTICS_MONTHS, type=int), ANALYTICS_MAX_MONTHS))
+    first, last = payment_stats.months_back(date.today(), count)
+    months = payment_stats.monthly(current_user.id, first, last)
+    return ([payment_stats.summarize(month._asdict()) for month in reversed(months)],
+            payment_stats.summarize(payment_stats.totals(months)))
 
-    except Exception as e:
-        print(f"Error fetching bank transactions: {e}")
-        return None
+EXPORT_COLUMNS = (
+    ('property_id', Property.id),
+    ('address', Property.address),
+    ('tenant_name', Property.tenant_name),
+    ('due_date', RentPayment.due_date),
+    ('expected_amount', RentPayment.expected_amount),
+    ('actual_amount', RentPayment.actual_amount),
+    ('status', RentPayment.status),
+    ('received_date', RentPayment.received_date),
+    ('transaction_description', RentPayment.transaction_description),
+    ('transaction_reference', RentPayment.transaction_reference),
+    ('landlord_notified', RentPayment.landlord_notified),
+    ('tenant_notified', RentPayment.tenant_notified),
+)
 
-@payments_bp.route('/history/<int:property_id>')
+@payments_bp.route('/export')
 @login_required
-def payment_history(property_id):
-    """View payment history for a property"""
-    property = Property.query.filter_by(id=property_id, user_id=current_user.id).first_or_404()
-    payments = RentPayment.query.filter_by(property_id=property_id).order_by(RentPayment.due_date.desc()).all()
+def export_all():
+    """Download the payment history of every property as CSV or JSON"""
+    return _export_response(current_user.id, None, 'rent4-payments')
+
+@payments_bp.route('/export/<int:property_id>')
+@login_required
+def export_property(property_id):
+    """Download the payment history of one property as CSV or JSON"""
+    with replica_reads():
+        Property.query.filter_by(id=property_id, user_id=current_user.id).first_or_404()
+    return _export_response(current_user.id, property_id, f'rent4-payments-property-{property_id}')
+
+def _export_response(user_id, property_id, filename):
+    """Build a streamed download; ?format=json switches from CSV"""
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ('csv', 'json'):
+        abort(400)
+
+    query = select(*(column for _, column in EXPORT_COLUMNS)) \
+        .select_from(RentPayment).join(RentPayment.property) \
+        .where(Property.user_id == user_id) \
+        .order_by(Property.id, RentPayment.due_date) \
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    if property_id is not None:
+        query = query.where(Property.id == property_id)
+
+    def rows():
+        # Runs while the response is sent, so the replica flag is set here
+        # rather than by the view; the cursor is fetched in batches
+        with replica_reads():
+            yield from db.session.execute(query)
+
+    names = [name for name, _ in EXPORT_COLUMNS]
+    if export_format == 'json':
+        body, mimetype = stream_json(names, rows()), 'application/json'
+    else:
+        body, mimetype = stream_csv(names, rows()), 'text/csv'
 
-    return render_template('payments/history.html', property=property, payments=payments)
\ No newline at end of file
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}.{export_format}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',  # let proxies pass chunks through as they are produced
+    })
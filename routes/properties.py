@@ -1,9 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from decimal import Decimal
 from app import db
 from models.property import Property
 from services.email_service import EmailService
+from services import transaction_cache
+from services.property_import import guess_format, import_properties, json_rows, read_rows
+from utils.validators import ValidationError, validate_property
 
 properties_bp = Blueprint('properties', __name__, url_prefix='/properties')
 email_service = EmailService()
@@ -16,61 +18,14 @@ def add_property():
         return redirect(url_for('stripe_routes.upgrade'))
 
     if request.method == 'POST':
-        # Get form data
-        address = request.form.get('address', '').strip()
-        tenant_name = request.form.get('tenant_name', '').strip()
-        tenant_email = request.form.get('tenant_email', '').strip().lower()
-        rent_amount = request.form.get('rent_amount', '').strip()
-        rent_frequency = request.form.get('rent_frequency', '')
-        rent_due_day_of_week = request.form.get('rent_due_day_of_week')
-        rent_due_day = request.form.get('rent_due_day')
-        bank_statement_keyword = request.form.get('bank_statement_keyword', '').strip()
-        send_tenant_reminder = bool(request.form.get('send_tenant_reminder'))
-
-        # Validation
-        if not all([address, tenant_name, tenant_email, rent_amount, rent_frequency, bank_statement_keyword]):
-            flash('Please fill in all required fields.', 'error')
-            return render_template('properties/add.html')
-
         try:
-            rent_amount = Decimal(rent_amount)
-            if rent_amount <= 0:
-                raise ValueError("Rent amount must be positive")
-        except (ValueError, TypeError):
-            flash('Please enter a valid rent amount.', 'error')
-            return render_template('properties/add.html')
-
-        # Validate rent frequency and due date
-        if rent_frequency not in ['Weekly', 'Fortnightly', 'Monthly']:
-            flash('Please select a valid rent frequency.', 'error')
+            values = validate_property(request.form)
+        except ValidationError as e:
+            flash(e.message, 'error')
             return render_template('properties/add.html')
 
-        if rent_frequency in ['Weekly', 'Fortnightly']:
-            if not rent_due_day_of_week or int(rent_due_day_of_week) not in range(7):
-                flash('Please select a valid day of the week.', 'error')
-                return render_template('properties/add.html')
-            rent_due_day_of_week = int(rent_due_day_of_week)
-            rent_due_day = None
-        else:  # Monthly
-            if not rent_due_day or int(rent_due_day) not in range(1, 32):
-                flash('Please select a valid day of the month.', 'error')
-                return render_template('properties/add.html')
-            rent_due_day = int(rent_due_day)
-            rent_due_day_of_week = None
-
         # Create property
-        property = Property(
-            user_id=current_user.id,
-            address=address,
-            tenant_name=tenant_name,
-            tenant_email=tenant_email,
-            rent_amount=rent_amount,
-            rent_frequency=rent_frequency,
-            rent_due_day_of_week=rent_due_day_of_week,
-            rent_due_day=rent_due_day,
-            bank_statement_keyword=bank_statement_keyword,
-            send_tenant_reminder=send_tenant_reminder
-        )
+        property = Property(user_id=current_user.id, **values)
 
         db.session.add(property)
         db.session.commit()
@@ -86,58 +41,15 @@ def edit_property(property_id):
     property = Property.query.filter_by(id=property_id, user_id=current_user.id).first_or_404()
 
     if request.method == 'POST':
-        # Get form data
-        address = request.form.get('address', '').strip()
-        tenant_name = request.form.get('tenant_name', '').strip()
-        tenant_email = request.form.get('tenant_email', '').strip().lower()
-        rent_amount = request.form.get('rent_amount', '').strip()
-        rent_frequency = request.form.get('rent_frequency', '')
-        rent_due_day_of_week = request.form.get('rent_due_day_of_week')
-        rent_due_day = request.form.get('rent_due_day')
-        bank_statement_keyword = request.form.get('bank_statement_keyword', '').strip()
-        send_tenant_reminder = bool(request.form.get('send_tenant_reminder'))
-
-        # Validation
-        if not all([address, tenant_name, tenant_email, rent_amount, rent_frequency, bank_statement_keyword]):
-            flash('Please fill in all required fields.', 'error')
-            return render_template('properties/edit.html', property=property)
-
         try:
-            rent_amount = Decimal(rent_amount)
-            if rent_amount <= 0:
-                raise ValueError("Rent amount must be positive")
-        except (ValueError, TypeError):
-            flash('Please enter a valid rent amount.', 'error')
+            values = validate_property(request.form)
+        except ValidationError as e:
+            flash(e.message, 'error')
             return render_template('properties/edit.html', property=property)
 
-        # Validate rent frequency and due date
-        if rent_frequency not in ['Weekly', 'Fortnightly', 'Monthly']:
-            flash('Please select a valid rent frequency.', 'error')
-            return render_template('properties/edit.html', property=property)
-
-        if rent_frequency in ['Weekly', 'Fortnightly']:
-            if not rent_due_day_of_week or int(rent_due_day_of_week) not in range(7):
-                flash('Please select a valid day of the week.', 'error')
-                return render_template('properties/edit.html', property=property)
-            rent_due_day_of_week = int(rent_due_day_of_week)
-            rent_due_day = None
-        else:  # Monthly
-            if not rent_due_day or int(rent_due_day) not in range(1, 32):
-                flash('Please select a valid day of the month.', 'error')
-                return render_template('properties/edit.html', property=property)
-            rent_due_day = int(rent_due_day)
-            rent_due_day_of_week = None
-
         # Update property
-        property.address = address
-        property.tenant_name = tenant_name
-        property.tenant_email = tenant_email
-        property.rent_amount = rent_amount
-        property.rent_frequency = rent_frequency
-        property.rent_due_day_of_week = rent_due_day_of_week
-        property.rent_due_day = rent_due_day
-        property.bank_statement_keyword = bank_statement_keyword
-        property.send_tenant_reminder = send_tenant_reminder
+        for name, value in values.items():
+            setattr(property, name, value)
 
         db.session.commit()
 
@@ -146,6 +58,38 @@ def edit_property(property_id):
 
     return render_template('properties/edit.html', property=property)
 
+@properties_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_properties_upload():
+    """Bulk-create properties from an uploaded CSV/JSON file or a JSON body"""
+    if request.method == 'GET':
+        return render_template('properties/import.html')
+
+    dry_run = bool(request.values.get('dry_run'))
+    if request.is_json:
+        rows = json_rows(request.get_json(silent=True))
+    else:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a CSV or JSON file to import.', 'error')
+            return render_template('properties/import.html')
+        rows = read_rows(upload.stream, guess_format(upload.filename, upload.mimetype))
+
+    try:
+        result = import_properties(current_user, rows, dry_run=dry_run)
+    except ValueError as e:
+        if request.is_json:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        flash(f'Could not read the import file: {e}', 'error')
+        return render_template('properties/import.html')
+
+    if request.is_json:
+        return jsonify(result.to_dict()), 200 if result.created or not result.errors else 400
+
+    if result.created and not dry_run:
+        flash(f'Imported {result.created} properties.', 'success')
+    return render_template('properties/import.html', result=result)
+
 @properties_bp.route('/delete/<int:property_id>', methods=['POST'])
 @login_required
 def delete_property(property_id):
@@ -160,9 +104,28 @@ def delete_property(property_id):
 @properties_bp.route('/search_transactions')
 @login_required
 def search_transactions():
-    # This will be implemented when we have the Akahu integration
-    # For now, return empty list
+    """Search the landlord's cached bank transactions as they type a keyword"""
+    if not current_user.akahu_app_token or not current_user.akahu_user_token:
+        return jsonify({
+            'success': False,
+            'error': 'Set up your bank integration to search transactions.',
+            'setup_url': url_for('akahu.setup')
+        })
+
+    # Keystrokes only hit the cache; a stale cache is refreshed in the background,
+    # at most once per SYNC_INTERVAL
+    sync = transaction_cache.refresh_in_background(current_user)
+    limit = min(request.args.get('limit', 20, type=int) or 20, 100)
+    transactions = transaction_cache.search_transactions(current_user, request.args.get('q', ''), limit)
+
     return jsonify({
         'success': True,
-        'transactions': []
-    })
\ No newline at end of file
+        'stale': sync != 'fresh',
+        'sync': sync,
+        'transactions': [{
+            'date': t.date.isoformat(),
+            'amount': str(t.amount),
+            'description': t.description,
+            'reference': t.reference
+        } for t in transactions]
+    })
@@ -1,14 +1,60 @@
 import os
-import stripe
+import time
+import threading
+from urllib.parse import urlparse
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 from app import db
 from models.user import User
+from services import metrics
 
 stripe_bp = Blueprint('stripe_routes', __name__, url_prefix='/subscription')
 
-# Initialize Stripe
-stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
+stripe_requests = metrics.counter(
+    'stripe_requests_total',
+    'Stripe API calls by resource and outcome'
+)
+stripe_latency = metrics.histogram(
+    'stripe_request_seconds',
+    'Stripe API call latency'
+)
+
+_stripe = None
+_stripe_lock = threading.Lock()
+
+def stripe_api():
+    """The stripe module, imported and configured on first use.
+
+    The SDK is slow to import and only the subscription pages need it, so
+    app start-up, CLI commands and scheduler jobs don't pay for it.
+    """
+    global _stripe
+    with _stripe_lock:
+        if _stripe is None:
+            import stripe
+
+            class InstrumentedStripeClient(stripe.http_client.RequestsClient):
+                """Requests-based Stripe client that records call counts and latency"""
+
+                def request(self, method, url, headers, post_data=None):
+                    resource = '/'.join(urlparse(url).path.split('/')[:3])
+                    started = time.perf_counter()
+                    outcome = 'error'
+                    try:
+                        response = super().request(method, url, headers, post_data)
+                        outcome = str(response[1])
+                        return response
+                    finally:
+                        stripe_requests.inc(resource=resource, method=method, outcome=outcome)
+                        stripe_latency.observe(time.perf_counter() - started, resource=resource)
+
+            stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
+            # Use the requests-based client (cooperative under gevent) with a bounded timeout
+            stripe.default_http_client = InstrumentedStripeClient(timeout=int(os.environ.get('STRIPE_TIMEOUT', 20)))
+            stripe.max_network_retries = 2
+            _stripe = stripe
+        return _stripe
+
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
 STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
 
@@ -27,6 +73,7 @@ def upgrade():
 @login_required
 def create_checkout_session():
     """Create Stripe checkout session"""
+    stripe = stripe_api()
     try:
         # Create or get Stripe customer
         if not current_user.stripe_customer_id:
@@ -93,6 +140,7 @@ def manage_subscription():
         flash('You don\'t have an active subscription to manage.', 'error')
         return redirect(url_for('main.dashboard'))
 
+    stripe = stripe_api()
     try:
         # Create customer portal session
         portal_session = stripe.billing_portal.Session.create(
@@ -111,6 +159,7 @@ def stripe_webhook():
     """Handle Stripe webhooks"""
     payload = request.get_data(as_text=True)
     sig_header = request.headers.get('Stripe-Signature')
+    stripe = stripe_api()
 
     try:
         event = stripe.Webhook.construct_event(
@@ -0,0 +1,288 @@
+"""Akahu webhook ingestion: subscriptions, signature checks, the event queue and its worker.
+
+Saving a landlord's Akahu tokens subscribes the app to their TRANSACTION
+webhooks, with their user id as the `state` Akahu echoes back.
+routes.akahu.webhook verifies each delivery against Akahu's RSA signing key,
+stores it as an AkahuWebhookEvent and answers straight away. The worker (a
+scheduler job every WEBHOOK_POLL_SECONDS, or `flask akahu-webhooks process`)
+claims a landlord's queued events in one statement and matches only that
+landlord's rent via routes.payments.match_landlord_payments. The daily
+payment check still runs as the reconciliation sweep for anything a webhook
+missed.
+"""
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models.user import User, UserSetting
+from models.webhook_event import AkahuWebhookEvent
+from services import metrics, shutdown, transaction_cache
+
+logger = logging.getLogger(__name__)
+
+# Akahu signs the body with RSA-SHA256 (base64) using the key named in SIGNING_KEY_HEADER
+SIGNATURE_HEADER = 'X-Akahu-Signature'
+SIGNING_KEY_HEADER = 'X-Akahu-Signing-Key'
+# A delivery naming a key we don't have waits this long before fetching again,
+# so forged key ids can't make every request call Akahu
+KEY_FETCH_INTERVAL = 60  # seconds
+
+# The local stand-in sender signs with a shared secret instead:
+# `t=<unix time>,v1=<hex HMAC-SHA256>`, accepted only with FLASK_ENV=development
+TEST_SECRET = os.environ.get('AKAHU_WEBHOOK_TEST_SECRET')
+TEST_SIGNATURE_HEADER = 'X-Akahu-Test-Signature'
+# Test deliveries signed longer ago than this are rejected as replays
+SIGNATURE_TOLERANCE = 300  # seconds
+
+# UserSetting holding the landlord's Akahu webhook subscription id
+WEBHOOK_ID_KEY = 'akahu_webhook_id'
+
+WEBHOOK_POLL_SECONDS = int(os.environ.get('AKAHU_WEBHOOK_POLL_SECONDS', 60))
+MAX_ATTEMPTS = 5
+# A claim older than this belongs to a worker that died; its events are queued again
+STALE_CLAIM = timedelta(minutes=10)
+
+webhook_events = metrics.counter(
+    'akahu_webhook_events_total',
+    'Akahu webhook deliveries and processing attempts by outcome',
+)
+webhook_lag = metrics.histogram(
+    'akahu_webhook_lag_seconds',
+    'Time from a webhook delivery to its landlord\'s payments being matched',
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+# Akahu's newest signing key: (key id, public key), fetched on first use
+_signing_key = None
+_key_lock = threading.Lock()
+_key_fetched_at = None
+
+
+def subscribe(user):
+    """Subscribe to the landlord's TRANSACTION webhooks, replacing an earlier subscription.
+
+    Returns False if Akahu refused; their payments are then only found by
+    the daily check. The caller commits.
+    """
+    client = transaction_cache.akahu_client
+    previous = UserSetting.get_value(user.id, WEBHOOK_ID_KEY)
+    try:
+        if previous:
+            try:
+                client.unsubscribe_webhook(user, previous)
+            except Exception as e:
+                # Made with tokens that have since changed; Akahu drops it with them
+                logger.info(f"Could not remove Akahu webhook {previous} for user {user.id}: {e}")
+        webhook_id = client.subscribe_webhook(user, 'TRANSACTION', state=str(user.id))
+    except Exception as e:
+        logger.warning(f"Could not subscribe to Akahu webhooks for user {user.id}: {e}")
+        return False
+    UserSetting.set_value(user.id, WEBHOOK_ID_KEY, webhook_id)
+    return True
+
+
+def verify_request(body, headers, landlord):
+    """True if a delivery is signed by Akahu, or by the stand-in sender in development.
+
+    landlord is who the delivery claims to be for; their tokens fetch the
+    signing key when it isn't cached yet.
+    """
+    if TEST_SIGNATURE_HEADER in headers:
+        return (bool(TEST_SECRET) and os.environ.get('FLASK_ENV') == 'development'
+                and verify_test_signature(body, headers[TEST_SIGNATURE_HEADER], TEST_SECRET))
+    return verify_signature(body, headers.get(SIGNATURE_HEADER), headers.get(SIGNING_KEY_HEADER), landlord)
+
+
+def verify_signature(body, signature, key_id, landlord=None):
+    """True if signature is Akahu's RSA-SHA256 signature of body under key key_id"""
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    try:
+        key_id = int(key_id)
+        signature = base64.b64decode(signature or '', validate=True)
+    except (TypeError, ValueError):
+        return False
+    key = signing_key(key_id, landlord)
+    if key is None:
+        return False
+    try:
+        key.verify(signature, body, padding.PKCS1v15(), hashes.SHA256())
+    except InvalidSignature:
+        return False
+    return True
+
+
+def signing_key(key_id, landlord=None):
+    """Akahu's public key with this id, cached; None if it can't be trusted or fetched.
+
+    Akahu signs with its newest key, so a key older than the cached one has
+    been rotated out. A newer one is fetched with the landlord's tokens.
+    """
+    global _signing_key, _key_fetched_at
+    from cryptography.hazmat.primitives.serialization import load_pem_public_key
+
+    with _key_lock:
+        if _signing_key is not None and key_id <= _signing_key[0]:
+            return _signing_key[1] if key_id == _signing_key[0] else None
+        if landlord is None or not landlord.akahu_app_token or not landlord.akahu_user_token:
+            return None
+        now = time.monotonic()
+        if _key_fetched_at is not None and now - _key_fetched_at < KEY_FETCH_INTERVAL:
+            return None
+        _key_fetched_at = now
+
+    try:
+        key = load_pem_public_key(transaction_cache.akahu_client.get_signing_key(landlord, key_id).encode())
+    except Exception as e:
+        logger.warning(f"Could not fetch Akahu signing key {key_id}: {e}")
+        return None
+    with _key_lock:
+        if _signing_key is None or key_id > _signing_key[0]:
+            _signing_key = (key_id, key)
+    return key
+
+
+def sign(body, secret, timestamp=None):
+    """The stand-in sender's signature header value for body: `t=<unix time>,v1=<hex HMAC-SHA256>`"""
+    timestamp = int(time.time() if timestamp is None else timestamp)
+    return f't={timestamp},v1={_digest(body, secret, timestamp)}'
+
+
+def _digest(body, secret, timestamp):
+    return hmac.new(secret.encode('utf-8'), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+
+
+def verify_test_signature(body, header, secret, now=None):
+    """True if header signs body with secret and was made within SIGNATURE_TOLERANCE"""
+    parts = dict(part.split('=', 1) for part in (header or '').split(',') if '=' in part)
+    try:
+        timestamp = int(parts['t'])
+    except (KeyError, ValueError):
+        return False
+    now = time.time() if now is None else now
+    if abs(now - timestamp) > SIGNATURE_TOLERANCE:
+        return False
+    return hmac.compare_digest(_digest(body, secret, timestamp), parts.get('v1', ''))
+
+
+def enqueue(user_id, body, payload):
+    """Store a verified delivery; returns False if the same body was already queued"""
+    event = AkahuWebhookEvent(
+        user_id=user_id,
+        digest=hashlib.sha256(body).hexdigest(),
+        webhook_type=payload.get('webhook_type'),
+        webhook_code=payload.get('webhook_code'),
+        item_id=payload.get('item_id'),
+        payload=body.decode('utf-8'),
+    )
+    db.session.add(event)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Akahu retries deliveries it didn't see acknowledged
+        db.session.rollback()
+        return False
+    return True
+
+
+def payload_user(payload):
+    """The landlord a delivery is for: its `state` carries their user id"""
+    try:
+        user_id = int(payload.get('state'))
+    except (TypeError, ValueError):
+        return None
+    return db.session.get(User, user_id)
+
+
+def process_queue(max_landlords=None):
+    """Match payments for every landlord with queued events.
+
+    Each landlord's events are claimed together, so a burst of deliveries
+    costs one sync and one matching pass. Failures go back to the queue
+    until MAX_ATTEMPTS, then stay 'failed' for the daily check to cover.
+    Returns counts of landlords processed and failed, and payments recorded.
+    """
+    from routes.payments import match_landlord_payments
+
+    _release_stale_claims()
+    query = db.session.query(AkahuWebhookEvent.user_id).filter_by(status='queued') \
+        .group_by(AkahuWebhookEvent.user_id).order_by(func.min(AkahuWebhookEvent.received_at))
+    if max_landlords:
+        query = query.limit(max_landlords)
+    user_ids = [user_id for user_id, in query]
+    db.session.commit()
+
+    results = {'processed': 0, 'failed': 0, 'recorded': 0}
+    for user_id in user_ids:
+        if shutdown.requested():
+            break  # Still queued; the next worker takes them
+        claimed_at = datetime.now(timezone.utc)
+        claimed = AkahuWebhookEvent.query.filter_by(user_id=user_id, status='queued') \
+            .update({'status': 'processing', 'claimed_at': claimed_at}, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            continue  # another worker got there first
+        mine = AkahuWebhookEvent.query.filter_by(user_id=user_id, status='processing', claimed_at=claimed_at)
+        oldest = mine.with_entities(func.min(AkahuWebhookEvent.received_at)).scalar()
+
+        try:
+            results['recorded'] += match_landlord_payments(db.session.get(User, user_id))
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Webhook processing failed for user {user_id}: {e}")
+            attempts = func.coalesce(AkahuWebhookEvent.attempts, 0) + 1
+            failed = mine.filter(func.coalesce(AkahuWebhookEvent.attempts, 0) + 1 >= MAX_ATTEMPTS) \
+                .update({'status': 'failed', 'attempts': attempts, 'error': str(e)[:2000],
+                         'processed_at': datetime.now(timezone.utc)}, synchronize_session=False)
+            retried = mine.update({'status': 'queued', 'attempts': attempts, 'error': str(e)[:2000]},
+                                  synchronize_session=False)
+            db.session.commit()
+            webhook_events.inc(failed, outcome='failed')
+            webhook_events.inc(retried, outcome='retried')
+            results['failed'] += 1
+            continue
+
+        mine.update({'status': 'done', 'error': None,
+                     'attempts': func.coalesce(AkahuWebhookEvent.attempts, 0) + 1,
+                     'processed_at': datetime.now(timezone.utc)}, synchronize_session=False)
+        db.session.commit()
+        webhook_events.inc(claimed, outcome='processed')
+        if oldest is not None:
+            webhook_lag.observe((datetime.now(timezone.utc) - _aware(oldest)).total_seconds())
+        results['processed'] += 1
+    return results
+
+
+def _release_stale_claims():
+    cutoff = datetime.now(timezone.utc) - STALE_CLAIM
+    released = AkahuWebhookEvent.query.filter(AkahuWebhookEvent.status == 'processing',
+                                              AkahuWebhookEvent.claimed_at < cutoff) \
+        .update({'status': 'queued'}, synchronize_session=False)
+    if released:
+        logger.warning(f"Re-queued {released} webhook events from an abandoned claim")
+    db.session.commit()
+
+
+def _aware(value):
+    # SQLite hands back naive datetimes for timezone-aware values
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def build_payload(user_id, item_id=None, webhook_code='DEFAULT_UPDATE'):
+    """A TRANSACTION notification shaped like Akahu's, for the local sender"""
+    payload = {'webhook_type': 'TRANSACTION', 'webhook_code': webhook_code, 'state': str(user_id),
+               'new_transactions': 1, 'sent_at': datetime.now(timezone.utc).isoformat()}
+    if item_id:
+        payload['item_id'] = item_id
+    return json.dumps(payload).encode('utf-8')
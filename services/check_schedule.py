@@ -0,0 +1,190 @@
+"""Staggered scheduling of the daily payment check.
+
+Instead of checking every landlord at once, each landlord gets a fixed slot
+inside a daily window in their own time zone: a hash of their user id picks
+one of the CHECK_WINDOW_MINUTES / CHECK_SLOT_MINUTES slots. The scheduler
+ticks every CHECK_SLOT_MINUTES and runs the check for each (time zone, slot)
+group whose start has passed and that has no run for its check date yet.
+The groups run one after another, so load is spread across the window, and
+a tick missed during a restart is caught up by the next one. A run a
+shutdown interrupted is resumed at the next tick; a failed one is retried
+after a backoff, up to MAX_RUN_ATTEMPTS.
+"""
+import os
+import hashlib
+import logging
+from collections import namedtuple
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models.payment_check import PaymentCheckRun
+from models.property import Property
+from models.user import User
+from services.reconciliation import due_on
+
+logger = logging.getLogger(__name__)
+
+# Local time the window opens, its length, and the length of one slot
+CHECK_WINDOW_START = time.fromisoformat(os.environ.get('CHECK_WINDOW_START', '06:00'))
+CHECK_WINDOW_MINUTES = int(os.environ.get('CHECK_WINDOW_MINUTES', 240))
+CHECK_SLOT_MINUTES = int(os.environ.get('CHECK_SLOT_MINUTES', 10))
+SLOT_COUNT = max(1, CHECK_WINDOW_MINUTES // CHECK_SLOT_MINUTES)
+
+# A failed slot run is retried RETRY_BACKOFF after it fails, doubling each
+# time, until it has been started MAX_RUN_ATTEMPTS times
+MAX_RUN_ATTEMPTS = int(os.environ.get('CHECK_MAX_ATTEMPTS', 3))
+RETRY_BACKOFF = timedelta(minutes=int(os.environ.get('CHECK_RETRY_MINUTES', CHECK_SLOT_MINUTES)))
+
+# For landlords who haven't chosen a time zone
+DEFAULT_TIME_ZONE = os.environ.get('DEFAULT_TIME_ZONE', 'Pacific/Auckland')
+
+# Zones a landlord can pick; listing them reads the tz database, so only once
+TIME_ZONE_CHOICES = tuple(sorted(available_timezones()))
+
+# A group of landlords checked together, and when (UTC) that happens today
+SlotGroup = namedtuple('SlotGroup', 'time_zone slot check_date starts_at user_ids')
+
+
+def slot_for(user_id):
+    """The landlord's slot; stable across processes and restarts, unlike hash()"""
+    digest = hashlib.sha256(str(user_id).encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % SLOT_COUNT
+
+
+def zone(time_zone):
+    """ZoneInfo for a stored time zone name, falling back to DEFAULT_TIME_ZONE"""
+    try:
+        return ZoneInfo(time_zone or DEFAULT_TIME_ZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown time zone {time_zone!r}, using {DEFAULT_TIME_ZONE}")
+        return ZoneInfo(DEFAULT_TIME_ZONE)
+
+
+def slot_start(time_zone, slot, local_date):
+    """UTC start of a slot on a local date (DST shifts move it with the wall clock)"""
+    opens = datetime.combine(local_date, CHECK_WINDOW_START, tzinfo=zone(time_zone))
+    return (opens + timedelta(minutes=slot * CHECK_SLOT_MINUTES)).astimezone(timezone.utc)
+
+
+def slot_groups(now=None):
+    """Every landlord with properties, grouped by (time zone, slot), with today's start"""
+    now = now or datetime.now(timezone.utc)
+    landlords = db.session.query(User.id, User.time_zone) \
+        .filter(User.id.in_(select(Property.user_id))).order_by(User.id)
+
+    members = {}
+    for user_id, time_zone in landlords:
+        members.setdefault((time_zone or DEFAULT_TIME_ZONE, slot_for(user_id)), []).append(user_id)
+
+    groups = []
+    for (time_zone, slot), user_ids in sorted(members.items()):
+        today = now.astimezone(zone(time_zone)).date()
+        groups.append(SlotGroup(time_zone, slot, today - timedelta(days=1),
+                                slot_start(time_zone, slot, today), user_ids))
+    return sorted(groups, key=lambda group: group.starts_at)
+
+
+def slot_landlords(time_zone, slot):
+    """Ids of the landlords in one group, e.g. to resume its run"""
+    for group in slot_groups():
+        if (group.time_zone, group.slot) == (time_zone, slot):
+            return group.user_ids
+    return []
+
+
+def due_groups(now=None):
+    """Groups whose slot has started today and whose check date has no run yet, or one to pick up again"""
+    now = now or datetime.now(timezone.utc)
+    started = [group for group in slot_groups(now) if group.starts_at <= now]
+    if not started:
+        return []
+    runs = db.session.query(PaymentCheckRun.time_zone, PaymentCheckRun.slot, PaymentCheckRun.check_date,
+                            PaymentCheckRun.status, PaymentCheckRun.attempts, PaymentCheckRun.finished_at) \
+        .filter(PaymentCheckRun.slot.isnot(None),
+                PaymentCheckRun.check_date >= min(group.check_date for group in started))
+    done = {(run.time_zone, run.slot, run.check_date) for run in runs if not _resumable(run, now)}
+    return [group for group in started if (group.time_zone, group.slot, group.check_date) not in done]
+
+
+def _resumable(run, now):
+    if run.status == 'interrupted':
+        return True
+    retry_at = next_retry(run)
+    return retry_at is not None and retry_at <= now
+
+
+def next_retry(run):
+    """When a failed run is due to be retried, or None if it isn't failed or has used its attempts"""
+    attempts = run.attempts or 1
+    if run.status != 'failed' or attempts >= MAX_RUN_ATTEMPTS or run.finished_at is None:
+        return None
+    finished_at = run.finished_at
+    if finished_at.tzinfo is None:
+        finished_at = finished_at.replace(tzinfo=timezone.utc)
+    return finished_at + RETRY_BACKOFF * 2 ** (attempts - 1)
+
+
+def unfinished_run(group):
+    """The group's run for its check date that was interrupted or failed, to pick up again, or None"""
+    return PaymentCheckRun.query.filter(
+        PaymentCheckRun.time_zone == group.time_zone, PaymentCheckRun.slot == group.slot,
+        PaymentCheckRun.check_date == group.check_date, PaymentCheckRun.status.in_(('interrupted', 'failed'))
+    ).order_by(PaymentCheckRun.started_at.desc()).first()
+
+
+def claim_run(group):
+    """This process's run for the group: a new ledger row, or its interrupted or failed run to resume.
+
+    Every worker's scheduler ticks, so several can find the same group due.
+    The unique (time_zone, slot, check_date) constraint lets only one insert
+    its run, and only one can move an unfinished run back to running; that
+    counts as another attempt. Returns None when another process has the
+    group.
+    """
+    run = unfinished_run(group)
+    if run is not None:
+        claimed = db.session.execute(update(PaymentCheckRun).where(
+            PaymentCheckRun.id == run.id, PaymentCheckRun.status == run.status,
+            func.coalesce(PaymentCheckRun.attempts, 1) == (run.attempts or 1)
+        ).values(status='running', attempts=func.coalesce(PaymentCheckRun.attempts, 1) + 1)).rowcount
+        db.session.commit()
+        return run if claimed else None
+
+    run = PaymentCheckRun(check_date=group.check_date, time_zone=group.time_zone, slot=group.slot,
+                          status='running', attempts=1)
+    db.session.add(run)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    return run
+
+
+def occupancy(now=None):
+    """Per-group load for the admin view: landlords, properties and today's run"""
+    groups = slot_groups(now)
+    properties = dict(db.session.query(Property.user_id, func.count(Property.id)).group_by(Property.user_id))
+    due = {}
+    for check_date in {group.check_date for group in groups}:
+        due[check_date] = dict(db.session.query(Property.user_id, func.count(Property.id))
+                               .filter(due_on(check_date)).group_by(Property.user_id))
+    runs = {}
+    if groups:
+        for run in PaymentCheckRun.query.filter(
+                PaymentCheckRun.slot.isnot(None),
+                PaymentCheckRun.check_date >= min(group.check_date for group in groups)) \
+                .order_by(PaymentCheckRun.started_at):
+            runs[(run.time_zone, run.slot, run.check_date)] = run
+
+    return [{
+        'group': group,
+        'local_start': group.starts_at.astimezone(zone(group.time_zone)),
+        'landlords': len(group.user_ids),
+        'properties': sum(properties.get(user_id, 0) for user_id in group.user_ids),
+        'due': sum(due[group.check_date].get(user_id, 0) for user_id in group.user_ids),
+        'run': runs.get((group.time_zone, group.slot, group.check_date)),
+    } for group in groups]
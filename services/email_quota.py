@@ -0,0 +1,251 @@
+"""Rate shaping for mail sent through the single Gmail account.
+
+Two token buckets, persisted in email_quota_buckets so every process and
+restart draws on the same allowance: one refills EMAIL_PER_MINUTE_LIMIT a
+minute, the other EMAIL_DAILY_LIMIT a day. Each priority class must leave a
+share of both buckets untouched (RESERVES), so rent notifications can't
+spend what account mail needs and tenant reminders go last. Mail that finds
+no token is stored in deferred_emails and sent by a scheduler job once the
+buckets refill, critical mail first.
+
+To keep a burst of notifications from costing a round trip each, a process
+takes tokens in leases and spends them locally. A lease starts at one token
+and doubles, up to LEASE_SIZE, while sends keep coming within LEASE_SECONDS,
+so a lone email never holds back more than it uses. LEASE_SIZE is a small
+share of the smaller bucket, so idle leases in other processes can't starve
+one that needs to send. Tokens still unspent when a lease expires, or when
+the process exits, go back to the buckets.
+"""
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models.outbound_email import DeferredEmail, EmailQuotaBucket
+from services import shutdown
+
+logger = logging.getLogger(__name__)
+
+EMAIL_DAILY_LIMIT = int(os.environ.get('EMAIL_DAILY_LIMIT', 500))
+EMAIL_PER_MINUTE_LIMIT = int(os.environ.get('EMAIL_PER_MINUTE_LIMIT', 20))
+
+# Highest priority first: account mail, then landlord notifications, then tenant reminders
+PRIORITIES = ('critical', 'notification', 'reminder')
+# Share of each bucket a class must leave for the classes above it
+RESERVES = {'critical': 0.0, 'notification': 0.1, 'reminder': 0.3}
+
+# Critical mail waits this long for a token before it is deferred
+CRITICAL_MAX_WAIT = 60  # seconds
+# Most of either bucket one lease may hold
+LEASE_SHARE = 0.1
+LEASE_SECONDS = 60
+
+# Deferred mail that keeps failing is given up on after this many sends
+MAX_SEND_ATTEMPTS = 5
+# How long a claimed row stays with its sender before another may retry it
+CLAIM_SECONDS = 600
+
+Bucket = namedtuple('Bucket', 'capacity per_second')
+BUCKETS = {
+    'minute': Bucket(EMAIL_PER_MINUTE_LIMIT, EMAIL_PER_MINUTE_LIMIT / 60),
+    'day': Bucket(EMAIL_DAILY_LIMIT, EMAIL_DAILY_LIMIT / 86400),
+}
+
+LEASE_SIZE = max(1, int(min(bucket.capacity for bucket in BUCKETS.values()) * LEASE_SHARE))
+
+_lock = threading.Lock()
+_leases = {}  # priority -> [tokens left, monotonic expiry, size of the last lease]
+_engine = None  # where leased tokens go back to, for release_leases at exit
+
+
+def acquire(priority):
+    """Take one send token; returns 0, or the seconds until one is available"""
+    expired = 0
+    with _lock:
+        lease = _leases.get(priority)
+        if lease and lease[1] > time.monotonic():
+            if lease[0] >= 1:
+                lease[0] -= 1
+                return 0
+            size = min(LEASE_SIZE, lease[2] * 2)
+        else:
+            size = 1
+            if lease:
+                expired = _leases.pop(priority)[0]
+
+    # The round trips run outside the lock, so other threads keep spending
+    # their leases meanwhile
+    if expired:
+        _give_back(db.engine, expired)
+    wait, granted = _take(priority, size)
+    if not granted:
+        return wait
+    with _lock:
+        lease = _leases.get(priority)
+        if lease and lease[1] > time.monotonic():
+            # Another thread leased tokens meanwhile; keep both
+            lease[0] += granted - 1
+            lease[2] = max(lease[2], granted)
+        else:
+            _leases[priority] = [granted - 1, time.monotonic() + LEASE_SECONDS, granted]
+    return 0
+
+
+def release_leases(expired_only=False):
+    """Give the unspent tokens of this process's leases (or only the expired ones) back"""
+    with _lock:
+        now = time.monotonic()
+        released = [priority for priority, lease in _leases.items() if not expired_only or lease[1] <= now]
+        unspent = sum(_leases.pop(priority)[0] for priority in released)
+    if unspent and _engine is not None:
+        _give_back(_engine, unspent)
+    return unspent
+
+
+@atexit.register
+def _release_at_exit():
+    try:
+        release_leases()
+    except Exception as e:
+        logger.warning(f"Could not return leased email tokens at exit: {e}")
+
+
+def _give_back(engine, tokens):
+    """Add unspent tokens back to both buckets, up to their capacity"""
+    table = EmailQuotaBucket.__table__
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        rows = {row.name: row for row in conn.execute(
+            select(table).where(table.c.name.in_(list(BUCKETS))).with_for_update())}
+        if len(rows) < len(BUCKETS):
+            return  # Tokens are only leased once every bucket row exists
+        conn.execute(update(table).where(table.c.name.in_(list(BUCKETS))).values(
+            tokens=case({name: min(bucket.capacity, _level(rows[name], bucket, now) + tokens)
+                         for name, bucket in BUCKETS.items()}, value=table.c.name),
+            updated_at=now))
+
+
+def _take(priority, wanted):
+    """Withdraw up to wanted tokens from both buckets, above the class's reserve"""
+    global _engine
+    _engine = db.engine
+    table = EmailQuotaBucket.__table__
+    now = datetime.now(timezone.utc)
+    try:
+        with db.engine.begin() as conn:
+            rows = {row.name: row for row in conn.execute(
+                select(table).where(table.c.name.in_(list(BUCKETS))).with_for_update())}
+            missing = [name for name in BUCKETS if name not in rows]
+            if missing:
+                conn.execute(insert(table), [{'name': name, 'tokens': BUCKETS[name].capacity, 'updated_at': now}
+                                             for name in missing])
+
+            levels = {name: _level(rows.get(name), bucket, now) for name, bucket in BUCKETS.items()}
+            spare = {name: levels[name] - RESERVES[priority] * bucket.capacity for name, bucket in BUCKETS.items()}
+            granted = int(min(wanted, *spare.values()))
+            if granted < 1:
+                return max((1 - spare[name]) / bucket.per_second
+                           for name, bucket in BUCKETS.items() if spare[name] < 1), 0
+
+            conn.execute(update(table).where(table.c.name.in_(list(BUCKETS))).values(
+                tokens=case({name: levels[name] - granted for name in BUCKETS}, value=table.c.name),
+                updated_at=now))
+            return 0, granted
+    except IntegrityError:
+        # Another process created the bucket rows first
+        return _take(priority, wanted)
+
+
+def _level(row, bucket, now):
+    if row is None:
+        return bucket.capacity
+    elapsed = (now - _aware(row.updated_at)).total_seconds()
+    return min(bucket.capacity, row.tokens + max(elapsed, 0) * bucket.per_second)
+
+
+def _aware(value):
+    # SQLite hands back naive datetimes for timezone-aware values
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def defer(priority, recipient, subject, html_body, text_body=None, wait=0, error=None, attempts=0):
+    """Queue a message to be sent by send_deferred once wait seconds have passed"""
+    with db.engine.begin() as conn:
+        conn.execute(insert(DeferredEmail.__table__).values(
+            priority=priority, rank=PRIORITIES.index(priority), recipient=recipient, subject=subject,
+            html_body=html_body, text_body=text_body, status='deferred', attempts=attempts, error=error,
+            not_before=datetime.now(timezone.utc) + timedelta(seconds=wait),
+            created_at=datetime.now(timezone.utc)))
+
+
+def send_deferred(deliver, limit=500):
+    """Send deferred mail, highest priority and oldest first, while tokens last.
+
+    deliver(recipient, subject, html_body, text_body, priority=...) raises
+    on failure; the message is then retried with backoff until
+    MAX_SEND_ATTEMPTS. A claimed row that was never finished (its sender
+    died) is picked up again after CLAIM_SECONDS. Returns (sent, failed).
+    """
+    # Runs every minute, so leases a quiet process no longer spends go back soon after expiring
+    release_leases(expired_only=True)
+    table = DeferredEmail.__table__
+    now = datetime.now(timezone.utc)
+    with db.engine.connect() as conn:
+        rows = conn.execute(select(table).where(table.c.status.in_(('deferred', 'sending')),
+                                                table.c.not_before <= now)
+                            .order_by(table.c.rank, table.c.created_at, table.c.id).limit(limit)).all()
+
+    sent = failed = 0
+    for row in rows:
+        if shutdown.requested():
+            break
+        if acquire(row.priority):
+            break  # Lower-priority rows have even less room
+
+        with db.engine.begin() as conn:
+            claimed = conn.execute(update(table).where(
+                table.c.id == row.id, table.c.status == row.status, table.c.not_before == row.not_before,
+            ).values(status='sending', not_before=now + timedelta(seconds=CLAIM_SECONDS))).rowcount
+        if not claimed:
+            continue  # Another sender has it
+
+        try:
+            deliver(row.recipient, row.subject, row.html_body, row.text_body, priority=row.priority)
+        except Exception as e:
+            attempts = (row.attempts or 0) + 1
+            values = {'attempts': attempts, 'error': str(e)[:2000], 'status': 'deferred',
+                      'not_before': datetime.now(timezone.utc) + timedelta(minutes=2 ** attempts)}
+            if attempts >= MAX_SEND_ATTEMPTS:
+                values['status'] = 'failed'
+                logger.error(f"Giving up on {row.priority} email to {row.recipient} after {attempts} attempts: {e}")
+            with db.engine.begin() as conn:
+                conn.execute(update(table).where(table.c.id == row.id).values(**values))
+            failed += 1
+        else:
+            with db.engine.begin() as conn:
+                conn.execute(delete(table).where(table.c.id == row.id))
+            sent += 1
+    return sent, failed
+
+
+def queue_summary():
+    """{(priority, status): count} of the deferred mail, for the CLI"""
+    with db.engine.connect() as conn:
+        table = DeferredEmail.__table__
+        return {(priority, status): count for priority, status, count in conn.execute(
+            select(table.c.priority, table.c.status, func.count()).group_by(table.c.priority, table.c.status))}
+
+
+def bucket_levels():
+    """{bucket name: (tokens now, capacity)}"""
+    now = datetime.now(timezone.utc)
+    with db.engine.connect() as conn:
+        table = EmailQuotaBucket.__table__
+        rows = {row.name: row for row in conn.execute(select(table))}
+    return {name: (_level(rows.get(name), bucket, now), bucket.capacity) for name, bucket in BUCKETS.items()}
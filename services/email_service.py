@@ -1,22 +1,45 @@
 import os
 import smtplib
 import logging
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 from flask import current_app
 
+from services import email_quota, metrics, shutdown
+
 logger = logging.getLogger(__name__)
 
+smtp_send_latency = metrics.histogram(
+    'smtp_send_seconds',
+    'Time taken to hand a message to the SMTP server'
+)
+smtp_sends = metrics.counter(
+    'smtp_sends_total',
+    'SMTP send attempts by outcome and priority class'
+)
+
 class EmailService:
     def __init__(self):
-        self.smtp_server = "smtp.gmail.com"
-        self.smtp_port = 587
+        self.smtp_server = os.environ.get('SMTP_SERVER', "smtp.gmail.com")
+        self.smtp_port = int(os.environ.get('SMTP_PORT', 587))
+        self.use_tls = os.environ.get('SMTP_USE_TLS', 'true').lower() == 'true'
         self.sender_email = os.environ.get('GMAIL_USER')
         self.sender_password = os.environ.get('GMAIL_APP_PASSWORD')
+        self.timeout = int(os.environ.get('SMTP_TIMEOUT', 30))
+
+    def send_email(self, recipient_email, subject, html_body, text_body=None, priority='notification'):
+        """Send now if the Gmail quota allows, otherwise queue it (services.email_quota).
 
-    def send_email(self, recipient_email, subject, html_body, text_body=None):
+        priority is 'critical' (account mail), 'notification' or 'reminder'.
+        Critical mail waits up to CRITICAL_MAX_WAIT seconds for a token
+        before it is queued; the rest is queued straight away. A send that
+        fails is queued for a retry as well, and so is everything once the
+        process is shutting down, so a slow SMTP server can't hold it up.
+        """
         try:
             if not self.sender_email or not self.sender_password:
                 logger.warning("Email credentials not configured. Skipping email send.")
@@ -27,29 +50,94 @@ class EmailService:
                     return True
                 return False
 
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.sender_email
-            msg['To'] = recipient_email
-            msg['Subject'] = subject
+            if shutdown.requested():
+                email_quota.defer(priority, recipient_email, subject, html_body, text_body)
+                smtp_sends.inc(outcome='deferred', priority=priority)
+                logger.info(f"Shutting down: {priority} email to {recipient_email} deferred")
+                return True
+
+            wait = email_quota.acquire(priority)
+            while wait and priority == 'critical' and wait <= email_quota.CRITICAL_MAX_WAIT:
+                time.sleep(wait)
+                wait = email_quota.acquire(priority)
+            if wait:
+                email_quota.defer(priority, recipient_email, subject, html_body, text_body, wait=wait)
+                smtp_sends.inc(outcome='deferred', priority=priority)
+                logger.info(f"Send quota used up: {priority} email to {recipient_email} deferred {wait:.0f}s")
+                return True
+
+            self._deliver(recipient_email, subject, html_body, text_body)
+            smtp_sends.inc(outcome='sent', priority=priority)
+            logger.info(f"Email sent successfully to {recipient_email}")
+            return True
+
+        except Exception as e:
+            smtp_sends.inc(outcome='failed', priority=priority)
+            logger.error(f"Failed to send email to {recipient_email}: {str(e)}")
+            try:
+                email_quota.defer(priority, recipient_email, subject, html_body, text_body,
+                                  wait=60, error=str(e)[:2000], attempts=1)
+            except Exception as queue_error:
+                logger.error(f"Could not queue email to {recipient_email} for a retry: {queue_error}")
+            return False
+
+    def _deliver(self, recipient_email, subject, html_body, text_body=None):
+        """Hand one message to the SMTP server; raises on failure"""
+        msg = MIMEMultipart('alternative')
+        msg['From'] = self.sender_email
+        msg['To'] = recipient_email
+        msg['Subject'] = subject
 
-            if text_body:
-                text_part = MIMEText(text_body, 'plain')
-                msg.attach(text_part)
+        if text_body:
+            text_part = MIMEText(text_body, 'plain')
+            msg.attach(text_part)
 
-            html_part = MIMEText(html_body, 'html')
-            msg.attach(html_part)
+        html_part = MIMEText(html_body, 'html')
+        msg.attach(html_part)
 
-            with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30) as server:
-                server.starttls()
+        started = time.perf_counter()
+        try:
+            with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout) as server:
+                if self.use_tls:
+                    server.starttls()
                 server.login(self.sender_email, self.sender_password)
                 server.send_message(msg)
+        finally:
+            smtp_send_latency.observe(time.perf_counter() - started)
 
-            logger.info(f"Email sent successfully to {recipient_email}")
-            return True
+    def send_deferred(self, limit=500):
+        """Send queued mail as the quota refills; returns (sent, failed)"""
+        if not self.sender_email or not self.sender_password:
+            return 0, 0
 
-        except Exception as e:
-            logger.error(f"Failed to send email to {recipient_email}: {str(e)}")
-            return False
+        def deliver(*message, priority):
+            try:
+                self._deliver(*message)
+            except Exception:
+                smtp_sends.inc(outcome='failed', priority=priority)
+                raise
+            smtp_sends.inc(outcome='sent', priority=priority)
+
+        return email_quota.send_deferred(deliver, limit)
+
+    def send_in_background(self, send_method, *args):
+        """Run one of the send_* methods without blocking the caller.
+
+        SMTP round trips to Gmail can take seconds; the send runs on its own
+        thread (a greenlet under gevent) with a copy of the app context.
+        """
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    send_method(*args)
+                except Exception as e:
+                    logger.error(f"Background email send failed: {str(e)}")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
 
     def send_email_verification(self, recipient_email, first_name, verification_url):
         subject = "Verify Your Email Address - Rent4"
@@ -104,7 +192,7 @@ class EmailService:
         If you didn't create an account with us, please ignore this email.
         """
 
-        return self.send_email(recipient_email, subject, html_body, text_body)
+        return self.send_email(recipient_email, subject, html_body, text_body, priority='critical')
 
     def send_password_reset_email(self, recipient_email, first_name, reset_url):
         subject = "Reset Your Password - Rent4"
@@ -147,7 +235,7 @@ class EmailService:
         </html>
         """
 
-        return self.send_email(recipient_email, subject, html_body)
+        return self.send_email(recipient_email, subject, html_body, priority='critical')
 
     def send_notification_email(self, recipient_email, subject, message):
         html_body = f"""
@@ -252,4 +340,4 @@ class EmailService:
         </html>
         """
 
-        return self.send_email(tenant_email, subject, html_body)
\ No newline at end of file
+        return self.send_email(tenant_email, subject, html_body, priority='reminder')
\ No newline at end of file
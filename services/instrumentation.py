@@ -0,0 +1,76 @@
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from services import metrics
+
+request_latency = metrics.histogram(
+    'http_request_duration_seconds',
+    'Request latency by blueprint endpoint'
+)
+request_sql_queries = metrics.histogram(
+    'http_request_sql_queries',
+    'SQL statements executed per request',
+    buckets=(1, 2, 5, 10, 20, 50, 100, 250, 1000)
+)
+request_sql_seconds = metrics.histogram(
+    'http_request_sql_seconds',
+    'Time spent in SQL per request'
+)
+
+
+# Called with (statement, seconds) after every statement, e.g. by the query profiler
+_statement_observers = []
+
+
+def observe_statements(observer):
+    """Have observer(statement, seconds) called after each SQL statement, timed once here"""
+    _statement_observers.append(observer)
+    return observer
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info['query_started_at'].pop()
+    if has_request_context():
+        g.sql_queries = g.get('sql_queries', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + seconds
+    for observer in _statement_observers:
+        observer(statement, seconds)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_failed_timer(context):
+    # A failed statement never reaches after_cursor_execute; drop its start
+    # time so the stack doesn't grow on a connection the pool hands out again
+    conn = context.connection
+    if conn is not None and not conn.invalidated:
+        started = conn.info.get('query_started_at')
+        if started:
+            started.pop()
+
+
+def init_app(app):
+    """Record latency and SQL usage for every request"""
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started_at = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('request_started_at', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            labels = {'endpoint': endpoint, 'method': request.method}
+            request_latency.observe(time.perf_counter() - started,
+                                    status=str(response.status_code), **labels)
+            request_sql_queries.observe(g.get('sql_queries', 0), **labels)
+            request_sql_seconds.observe(g.get('sql_seconds', 0.0), **labels)
+        return response
@@ -0,0 +1,171 @@
+"""Monthly portfolio statistics, maintained as rent payments are written.
+
+payment_stats_monthly holds running totals per landlord and month of due
+date. Code that inserts or changes RentPayment rows collects each payment's
+values before and after in a Changes, and applies the difference with one
+upsert in the same transaction, so the totals commit or roll back with the
+payments. The analytics views read only these rows. `flask payment-stats
+backfill` rebuilds them from rent_payments, for existing history or after
+a change made outside this path.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models.bank_transaction import to_cents
+from models.payment_stats import PaymentStatsMonthly
+from models.property import Property, RentPayment
+
+COUNTERS = ('payments', 'received', 'partial', 'missed', 'pending', 'on_time',
+            'expected_cents', 'received_cents', 'arrears_cents')
+STATUSES = ('received', 'partial', 'missed', 'pending')
+
+# Rows streamed per round trip by the backfill
+BACKFILL_BATCH_SIZE = 5000
+
+MonthStats = namedtuple('MonthStats', ('month',) + COUNTERS)
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def _field(payment, name):
+    # Payments arrive as ORM objects, or as the dicts bulk inserts are built from
+    if isinstance(payment, dict):
+        return payment.get(name)
+    return getattr(payment, name)
+
+
+def snapshot(payment):
+    """The values contribution() reads, copied before a payment is changed in place"""
+    return {name: _field(payment, name)
+            for name in ('status', 'due_date', 'received_date', 'expected_amount', 'actual_amount')}
+
+
+def contribution(payment):
+    """What one payment adds to its month's counters"""
+    status = _field(payment, 'status')
+    expected = to_cents(_field(payment, 'expected_amount'))
+    actual = _field(payment, 'actual_amount')
+    actual = to_cents(actual) if actual is not None else 0
+    received_date = _field(payment, 'received_date')
+
+    counters = dict.fromkeys(COUNTERS, 0)
+    counters['payments'] = 1
+    counters['expected_cents'] = expected
+    if status in STATUSES:
+        counters[status] = 1
+    if status in ('received', 'partial'):
+        counters['received_cents'] = actual
+    if status == 'received' and received_date is not None and received_date <= _field(payment, 'due_date'):
+        counters['on_time'] = 1
+    if status == 'missed':
+        counters['arrears_cents'] = expected
+    elif status == 'partial':
+        counters['arrears_cents'] = max(expected - actual, 0)
+    return counters
+
+
+class Changes:
+    """Differences to the monthly totals, collected while payments are written"""
+
+    def __init__(self):
+        self._rows = {}
+
+    def add(self, user_id, after=None, before=None):
+        """Count a payment written as after (None: deleted), replacing before (None: new)"""
+        for payment, sign in ((after, 1), (before, -1)):
+            if payment is None:
+                continue
+            key = (user_id, month_of(_field(payment, 'due_date')))
+            row = self._rows.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for name, value in contribution(payment).items():
+                row[name] += sign * value
+
+    def apply(self):
+        """Add the differences to payment_stats_monthly in the caller's transaction"""
+        now = datetime.now(timezone.utc)
+        # Key order, so concurrent writers lock the rows in the same order
+        rows = [dict(counters, user_id=user_id, month=month, updated_at=now)
+                for (user_id, month), counters in sorted(self._rows.items()) if any(counters.values())]
+        self._rows = {}
+        if rows:
+            db.session.execute(_upsert(), rows)
+        return len(rows)
+
+
+def _upsert():
+    """INSERT ... ON CONFLICT that adds to the counters of an existing row"""
+    table = PaymentStatsMonthly.__table__
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.month],
+        set_=dict({name: table.c[name] + statement.excluded[name] for name in COUNTERS},
+                  updated_at=statement.excluded.updated_at))
+
+
+def backfill(user_ids=None):
+    """Rebuild the totals from rent_payments (everyone's, or only user_ids'); returns rows written.
+
+    Runs in one transaction; the caller commits. Payments written while it
+    runs may be counted twice or not at all, so run it when no payment
+    check is running.
+    """
+    query = select(Property.user_id, RentPayment.status, RentPayment.due_date, RentPayment.received_date,
+                   RentPayment.expected_amount, RentPayment.actual_amount) \
+        .join(RentPayment.property).execution_options(yield_per=BACKFILL_BATCH_SIZE)
+    clear = delete(PaymentStatsMonthly)
+    if user_ids is not None:
+        query = query.where(Property.user_id.in_(user_ids))
+        clear = clear.where(PaymentStatsMonthly.user_id.in_(user_ids))
+
+    changes = Changes()
+    for row in db.session.execute(query):
+        changes.add(row.user_id, after=row._asdict())
+    db.session.execute(clear)
+    return changes.apply()
+
+
+def monthly(user_id, first_month, last_month):
+    """MonthStats for each month from first_month to last_month, oldest first, zeros where empty"""
+    rows = {row.month: row for row in PaymentStatsMonthly.query.filter(
+        PaymentStatsMonthly.user_id == user_id,
+        PaymentStatsMonthly.month.between(first_month, last_month))}
+
+    months, month = [], first_month
+    while month <= last_month:
+        row = rows.get(month)
+        months.append(MonthStats(month, *(getattr(row, name) if row else 0 for name in COUNTERS)))
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return months
+
+
+def months_back(today, count):
+    """(first month, last month) of the count months ending with today's"""
+    last = month_of(today)
+    index = last.year * 12 + last.month - 1 - (count - 1)
+    return date(index // 12, index % 12 + 1, 1), last
+
+
+def summarize(stats):
+    """Rates and dollar amounts for one month's counters (or totals over several)"""
+    settled = stats['received'] + stats['partial'] + stats['missed']
+    return dict(
+        stats,
+        on_time_rate=round(stats['on_time'] / settled, 4) if settled else None,
+        collection_rate=(round(stats['received_cents'] / stats['expected_cents'], 4)
+                         if stats['expected_cents'] else None),
+        expected=Decimal(stats['expected_cents']).scaleb(-2),
+        income=Decimal(stats['received_cents']).scaleb(-2),
+        arrears=Decimal(stats['arrears_cents']).scaleb(-2),
+    )
+
+
+def totals(months):
+    """Counters summed over months"""
+    return {name: sum(getattr(month, name) for month in months) for name in COUNTERS}
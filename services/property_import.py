@@ -0,0 +1,121 @@
+import csv
+import io
+import json
+from sqlalchemy import func, insert
+
+from app import db
+from models.property import Property
+from utils.validators import PROPERTY_SCHEMA
+
+# Rows sent to the database per INSERT statement
+IMPORT_BATCH_SIZE = 500
+
+PLAN_LIMIT_MESSAGE = 'You need to upgrade your account to add more properties.'
+
+
+class ImportResult:
+    """Outcome of one bulk import: rows created and per-row errors"""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.errors = []  # (row number, field, message)
+
+    def add_error(self, row, message, field=None):
+        self.errors.append((row, field, message))
+
+    def to_dict(self):
+        return {
+            'success': not self.errors,
+            'dry_run': self.dry_run,
+            'rows': self.rows,
+            'created': self.created,
+            'errors': [{'row': row, 'field': field, 'message': message}
+                       for row, field, message in self.errors],
+        }
+
+
+def read_rows(stream, format):
+    """Yield (row number, dict) from a binary CSV or JSON file object.
+
+    CSV rows are numbered as in a spreadsheet (the header is row 1). JSON must be
+    a list of objects, or {"properties": [...]}, numbered from 1.
+    """
+    if format == 'json':
+        yield from json_rows(json.load(stream))
+    elif format == 'csv':
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        try:
+            yield from enumerate(csv.DictReader(text), start=2)
+        except csv.Error as e:
+            raise ValueError(str(e))
+    else:
+        raise ValueError(f'Unsupported import format: {format}')
+
+
+def json_rows(data):
+    """Yield (row number, dict) from already-decoded JSON import data"""
+    if isinstance(data, dict):
+        data = data.get('properties')
+    if not isinstance(data, list):
+        raise ValueError('JSON imports must be a list of property objects.')
+    for number, item in enumerate(data, start=1):
+        yield number, item if isinstance(item, dict) else {}
+
+
+def guess_format(filename, mimetype=None):
+    """Pick 'csv' or 'json' from an upload's name or content type"""
+    if (filename or '').lower().endswith('.json') or (mimetype or '').endswith('json'):
+        return 'json'
+    return 'csv'
+
+
+def import_properties(user, rows, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """Validate rows and insert the valid ones for user in one transaction.
+
+    Rows are validated with the same rules as the property forms. Valid rows
+    are inserted batch_size at a time and committed together at the end, so
+    a database failure leaves nothing half-imported. Rows beyond the user's
+    plan limit are reported as errors rather than inserted.
+    """
+    result = ImportResult(dry_run=dry_run)
+    remaining = user.get_property_limit() - db.session.query(func.count(Property.id)) \
+        .filter(Property.user_id == user.id).scalar()
+    batch = []
+
+    try:
+        for number, values, error in PROPERTY_SCHEMA.validate_many(rows):
+            result.rows += 1
+            if error is not None:
+                result.add_error(number, error.message, error.field)
+                continue
+
+            if result.created + len(batch) >= remaining:
+                result.add_error(number, PLAN_LIMIT_MESSAGE)
+                continue
+
+            values['user_id'] = user.id
+            batch.append(values)
+            if len(batch) >= batch_size:
+                result.created += _insert_batch(batch, dry_run)
+                batch = []
+
+        if batch:
+            result.created += _insert_batch(batch, dry_run)
+
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return result
+
+
+def _insert_batch(batch, dry_run):
+    if not dry_run:
+        db.session.execute(insert(Property), batch)
+    return len(batch)
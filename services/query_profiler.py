@@ -0,0 +1,113 @@
+import os
+import sys
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, request
+
+from services import instrumentation
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 500))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+
+_current_profile = ContextVar('query_profile', default=None)
+# Frames between a statement and the application code that issued it
+_OWN_FILES = (__file__, instrumentation.__file__)
+
+
+def _call_site():
+    """First frame in application code that led to the current statement"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(APP_ROOT) and 'site-packages' not in filename
+                and filename not in _OWN_FILES):
+            return f'{os.path.relpath(filename, APP_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryProfile:
+    """Statements executed during one request or scheduler job"""
+
+    def __init__(self, name):
+        self.name = name
+        self.statements = []  # (statement, seconds, call site)
+
+    def record(self, statement, seconds, site):
+        self.statements.append((statement, seconds, site))
+
+    @property
+    def total_seconds(self):
+        return sum(seconds for _, seconds, _ in self.statements)
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Identical statements issued from the same call site, most frequent first"""
+        counts = Counter((statement, site) for statement, _, site in self.statements)
+        return [(statement, site, count) for (statement, site), count in counts.most_common()
+                if count >= threshold]
+
+    def header(self):
+        return (f'count={len(self.statements)}; time={self.total_seconds * 1000:.1f}ms; '
+                f'repeated={len(self.repeated())}')
+
+    def log_summary(self):
+        logger.info(f"SQL profile for {self.name}: {self.header()}")
+        for statement, site, count in self.repeated():
+            logger.warning(f"Possible N+1 in {self.name}: {count}x at {site}: {' '.join(statement.split())[:200]}")
+
+
+@instrumentation.observe_statements
+def _record_statement(statement, seconds):
+    profile = _current_profile.get()
+    slow = seconds * 1000 >= SLOW_QUERY_MS
+
+    if profile is None and not slow:
+        return
+
+    site = _call_site()
+    if profile is not None:
+        profile.record(statement, seconds, site)
+    if slow:
+        logger.warning(f"Slow query ({seconds * 1000:.0f}ms) at {site}: {' '.join(statement.split())[:500]}")
+
+
+@contextmanager
+def profile_job(name):
+    """Profile every statement run inside the block, e.g. a scheduler job"""
+    profile = QueryProfile(name)
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+        profile.log_summary()
+
+
+def init_app(app):
+    """Profile each request when SQL_PROFILE is set or the app is in debug mode"""
+    always_on = os.environ.get('SQL_PROFILE', '').lower() in ('1', 'true', 'yes')
+
+    @app.before_request
+    def start_query_profile():
+        if always_on or app.debug:
+            g.query_profile = QueryProfile(request.endpoint or request.path)
+            _current_profile.set(g.query_profile)
+
+    @app.after_request
+    def add_query_profile_header(response):
+        profile = g.get('query_profile')
+        if profile is not None:
+            response.headers['X-Query-Profile'] = profile.header()
+        return response
+
+    @app.teardown_request
+    def finish_query_profile(exception=None):
+        profile = g.pop('query_profile', None)
+        if profile is not None:
+            _current_profile.set(None)
+            profile.log_summary()
@@ -0,0 +1,212 @@
+"""Matching of due rent against locally stored bank transactions.
+
+Instead of asking Akahu about each property, the daily run syncs each
+landlord's transactions into bank_transactions once (services.transaction_cache)
+and loads the rows it needs in a single query. Each landlord's rows go into
+a date-sorted TransactionIndex, and a due date is matched by bisecting to
+its tolerance window: up to the property's early window before the due
+date and its late window after it.
+"""
+import os
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from itertools import groupby
+from operator import attrgetter
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import joinedload
+
+from app import db
+from models.bank_transaction import BankTransaction, to_cents
+from models.property import Property, RentPayment
+from services.transaction_cache import SYNC_OVERLAP_DAYS
+from utils.validators import MAX_WINDOW_DAYS
+
+# Windows for properties that don't set their own
+DEFAULT_EARLY_DAYS = int(os.environ.get('PAYMENT_WINDOW_EARLY_DAYS', 2))
+DEFAULT_LATE_DAYS = int(os.environ.get('PAYMENT_WINDOW_LATE_DAYS', 2))
+
+# Transaction rows fetched per round trip while building the indexes
+INDEX_BATCH_SIZE = 1000
+
+
+def due_on(check_date):
+    """SQL condition equivalent to routes.payments.is_rent_due for check_date"""
+    return or_(
+        and_(Property.rent_frequency.in_(('Weekly', 'Fortnightly')),
+             Property.rent_due_day_of_week == check_date.weekday()),
+        and_(Property.rent_frequency == 'Monthly', Property.rent_due_day == check_date.day),
+    )
+
+
+def payment_window(property):
+    """(early days, late days) for a property, falling back to the defaults"""
+    early, late = property.payment_window_early_days, property.payment_window_late_days
+    return (DEFAULT_EARLY_DAYS if early is None else early,
+            DEFAULT_LATE_DAYS if late is None else late)
+
+
+def window_closed(property, due_date, check_date):
+    """True once every day of the late window has been checked"""
+    return due_date + timedelta(days=payment_window(property)[1]) <= check_date
+
+
+def already_recorded(check_date):
+    """Ids of due properties that already have a RentPayment for check_date"""
+    query = select(RentPayment.property_id) \
+        .join(Property, Property.id == RentPayment.property_id) \
+        .where(due_on(check_date), RentPayment.due_date == check_date)
+    return set(db.session.execute(query).scalars())
+
+
+def open_payments(check_date, user_ids=None):
+    """Earlier payments that a newly synced transaction could still settle.
+
+    That is every 'pending' payment, plus 'missed' ones whose window ended
+    recently enough for the incremental sync to still fetch transactions
+    dated inside it (a bank feed can lag the transaction date). With
+    user_ids, only those landlords'.
+    """
+    reach = timedelta(days=SYNC_OVERLAP_DAYS)
+    longest = timedelta(days=max(MAX_WINDOW_DAYS, DEFAULT_LATE_DAYS))
+    query = RentPayment.query.options(joinedload(RentPayment.property).joinedload(Property.landlord)) \
+        .filter(RentPayment.due_date < check_date, or_(
+            RentPayment.status == 'pending',
+            and_(RentPayment.status == 'missed', RentPayment.due_date >= check_date - reach - longest)))
+    if user_ids is not None:
+        query = query.join(RentPayment.property).filter(Property.user_id.in_(user_ids))
+    candidates = query.order_by(RentPayment.due_date.desc(), RentPayment.id).all()
+    return [payment for payment in candidates if payment.status == 'pending'
+            or not window_closed(payment.property, payment.due_date, check_date - reach)]
+
+
+class TransactionIndex:
+    """One landlord's transactions sorted by date, for window lookups by bisection"""
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: (row.date, row.id))
+        self.dates = [row.date for row in self.rows]
+        self.descriptions = [row.description.lower() for row in self.rows]
+
+    def best_match(self, property, due_date, expected_amount, used=()):
+        """The best unused keyword match inside the property's window, or None.
+
+        An exact amount beats a different one; then the transaction closest
+        to the due date wins, the earlier one on a tie.
+        """
+        early, late = payment_window(property)
+        start = bisect_left(self.dates, due_date - timedelta(days=early))
+        end = bisect_right(self.dates, due_date + timedelta(days=late))
+        keyword = property.bank_statement_keyword.lower()
+        expected_cents = to_cents(expected_amount)
+
+        best, best_key = None, None
+        for position, description in enumerate(self.descriptions[start:end], start):
+            if keyword not in description:
+                continue
+            row = self.rows[position]
+            if row.id in used:
+                continue
+            key = (row.amount_cents != expected_cents, abs((row.date - due_date).days), row.date, row.id)
+            if best_key is None or key < best_key:
+                best, best_key = row, key
+        return best
+
+
+def iter_indexes(end, due_users=(), due_start=None, open_users=(), open_start=None, changed_since=None):
+    """Yield (user id, TransactionIndex) for the transactions matching needs.
+
+    Landlords with rent due get every row from due_start to end. Landlords
+    with outstanding payments also get older rows from open_start; with
+    changed_since, only those stored or changed since then, because earlier
+    runs already tried the rest against every payment that is still open.
+    Only credits can pay rent, so debits are left out. Rows come from one
+    query streamed in landlord order, so only one landlord's index is held
+    at a time.
+    """
+    scopes = []
+    if due_users:
+        scopes.append(and_(BankTransaction.user_id.in_(due_users), BankTransaction.date >= due_start))
+    if open_users:
+        scope = and_(BankTransaction.user_id.in_(open_users), BankTransaction.date >= open_start)
+        if changed_since is not None:
+            scope = and_(scope, BankTransaction.updated_at >= changed_since)
+        scopes.append(scope)
+    if not scopes:
+        return
+
+    query = select(
+        BankTransaction.id,
+        BankTransaction.user_id,
+        BankTransaction.date,
+        BankTransaction.amount_cents,
+        BankTransaction.description,
+        BankTransaction.reference,
+    ).where(BankTransaction.date <= end, BankTransaction.amount_cents > 0, or_(*scopes)) \
+        .order_by(BankTransaction.user_id, BankTransaction.date, BankTransaction.id) \
+        .execution_options(yield_per=INDEX_BATCH_SIZE)
+
+    for user_id, rows in groupby(db.session.execute(query), key=attrgetter('user_id')):
+        yield user_id, TransactionIndex(rows)
+
+
+def assigned_transactions(user_ids, start):
+    """{property id: ids of transactions already recorded against it}, from start on"""
+    if not user_ids:
+        return {}
+    query = select(RentPayment.property_id, RentPayment.bank_transaction_id) \
+        .join(BankTransaction, BankTransaction.id == RentPayment.bank_transaction_id) \
+        .where(BankTransaction.user_id.in_(user_ids), BankTransaction.date >= start)
+    used = {}
+    for property_id, transaction_id in db.session.execute(query):
+        used.setdefault(property_id, set()).add(transaction_id)
+    return used
+
+
+def match_payments(check_date, due, outstanding, changed_since=None):
+    """Pick a transaction for each property due on check_date and each outstanding payment.
+
+    outstanding holds anything with property, due_date and expected_amount:
+    payments from open_payments, or due dates not recorded yet. Returns
+    ({property id: row}, {outstanding item: row}); each row has id,
+    amount_cents, date, description and reference. A transaction is used at
+    most once per property, counting those already recorded against it.
+    Properties due on check_date choose first, then the outstanding items in
+    the order given. changed_since, when the previous day's run started,
+    limits those to transactions that arrived since.
+    """
+    windows = [(p, check_date) for p in due] + [(payment.property, payment.due_date) for payment in outstanding]
+    if not windows:
+        return {}, {}
+
+    starts = [due_date - timedelta(days=payment_window(p)[0]) for p, due_date in windows]
+    ends = [due_date + timedelta(days=payment_window(p)[1]) for p, due_date in windows]
+    used = assigned_transactions({p.user_id for p, _ in windows}, min(starts))
+
+    due_by_user, outstanding_by_user = {}, {}
+    for property in due:
+        due_by_user.setdefault(property.user_id, []).append(property)
+    for payment in outstanding:
+        outstanding_by_user.setdefault(payment.property.user_id, []).append(payment)
+
+    def pick(index, property, due_date, expected_amount):
+        taken = used.setdefault(property.id, set())
+        match = index.best_match(property, due_date, expected_amount, taken)
+        if match is not None:
+            taken.add(match.id)
+        return match
+
+    matches, late_matches = {}, {}
+    indexes = iter_indexes(max(ends),
+                           list(due_by_user), min(starts[:len(due)], default=None),
+                           list(outstanding_by_user), min(starts[len(due):], default=None),
+                           changed_since)
+    for user_id, index in indexes:
+        for property in due_by_user.get(user_id, ()):
+            match = pick(index, property, check_date, property.rent_amount)
+            if match is not None:
+                matches[property.id] = match
+        for payment in outstanding_by_user.get(user_id, ()):
+            match = pick(index, payment.property, payment.due_date, payment.expected_amount)
+            if match is not None:
+                late_matches[payment] = match
+    return matches, late_matches
@@ -1,46 +1,210 @@
 import os
+import atexit
+import signal
+import threading
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from flask import Flask
 import logging
 
+from services import shutdown
+
 logger = logging.getLogger(__name__)
 
+# How long a stopping process waits for running jobs to reach a checkpoint;
+# keep it under gunicorn's graceful timeout
+DRAIN_SECONDS = int(os.environ.get('SCHEDULER_DRAIN_SECONDS', 25))
+
+# One scheduler per process, and one app for its jobs to run in
+_lock = threading.Lock()
+_scheduler = None
+_app_lock = threading.Lock()  # separate, so building the app never holds up stop_scheduler
+_job_app = None
+
 def init_scheduler(app: Flask):
-    """Initialize the payment checking scheduler"""
+    """Start this process's scheduler, once; later calls are no-ops.
+
+    It stops with the process: gunicorn's worker_exit hook, SIGTERM outside
+    gunicorn, or interpreter exit all call stop_scheduler.
+    """
+    global _scheduler
     if os.environ.get('FLASK_ENV') == 'development':
         logger.info("Development mode: Scheduler disabled")
         return
+    with _lock:
+        if _scheduler is not None or shutdown.requested():
+            return
+        _scheduler = _start_scheduler()
+
+    atexit.register(stop_scheduler)
+    _exit_on_sigterm()
 
+def _start_scheduler():
     scheduler = BackgroundScheduler()
 
-    # Schedule rent payment checking to run every morning at 8:00 AM
+    # Check rent payments each morning, one slot of landlords at a time
+    # (see services.check_schedule); each tick runs the slots that have come due
+    from services.check_schedule import CHECK_SLOT_MINUTES
     scheduler.add_job(
         func=check_payments_job,
-        trigger=CronTrigger(hour=8, minute=0),
+        trigger=IntervalTrigger(minutes=CHECK_SLOT_MINUTES),
         id='check_rent_payments',
-        name='Check rent payments daily',
+        name='Check rent payments in staggered slots',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+
+    # Sweep expired and used password reset tokens every hour
+    scheduler.add_job(
+        func=purge_reset_tokens_job,
+        trigger=CronTrigger(minute=30),
+        id='purge_password_reset_tokens',
+        name='Purge expired password reset tokens',
         replace_existing=True
     )
 
+    # Match payments for landlords with queued Akahu webhook events
+    from services.akahu_webhooks import WEBHOOK_POLL_SECONDS
+    scheduler.add_job(
+        func=process_webhooks_job,
+        trigger=IntervalTrigger(seconds=WEBHOOK_POLL_SECONDS),
+        id='process_akahu_webhooks',
+        name='Process queued Akahu webhooks',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+
+    # Send mail deferred by the Gmail quota as it refills
+    scheduler.add_job(
+        func=send_deferred_emails_job,
+        trigger=IntervalTrigger(minutes=1),
+        id='send_deferred_emails',
+        name='Send deferred emails',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+
     scheduler.start()
-    logger.info("Payment checking scheduler started")
+    logger.info(f"Payment checking scheduler started (pid {os.getpid()})")
+    return scheduler
+
+def scheduler_running():
+    return _scheduler is not None and _scheduler.running
 
-    # Shutdown scheduler when app context ends
-    @app.teardown_appcontext
-    def shutdown_scheduler(exception=None):
-        if scheduler.running:
-            scheduler.shutdown()
+def stop_scheduler(timeout=DRAIN_SECONDS):
+    """Stop starting jobs and give running ones up to timeout seconds to checkpoint.
+
+    Returns True if every job finished in time. A payment check stopped
+    this way is left 'interrupted' and the next scheduler tick resumes it.
+    """
+    shutdown.request()
+    with _lock:
+        scheduler = _scheduler
+    if scheduler is None or not scheduler.running:
+        return True
+
+    # shutdown(wait=True) has no timeout of its own, so wait on it from a helper thread
+    drain = threading.Thread(target=scheduler.shutdown, kwargs={'wait': True}, daemon=True)
+    drain.start()
+    drain.join(timeout)
+    if drain.is_alive():
+        logger.warning(f"Scheduler jobs still running after {timeout}s; exiting without them")
+        return False
+    logger.info("Scheduler stopped")
+    return True
+
+def _exit_on_sigterm():
+    """Turn SIGTERM into a normal exit so atexit drains the scheduler.
+
+    Only where nothing else handles SIGTERM: a gunicorn worker has its own
+    handler and drains from the worker_exit hook instead.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGTERM) is not signal.SIG_DFL:
+        return
+
+    def handle_sigterm(signum, frame):
+        shutdown.request()
+        raise SystemExit(128 + signum)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+def _batch_app():
+    """The app jobs run in, built on first use rather than on every tick"""
+    global _job_app
+    with _app_lock:
+        if _job_app is None:
+            from app import create_app
+            _job_app = create_app(db_profile='batch')
+        return _job_app
 
 def check_payments_job():
-    """Job function to check rent payments"""
+    """Job function to check rent payments for the slots that have come due"""
     from routes.payments import check_rent_payments
-    from app import create_app
+    from services.check_schedule import claim_run, due_groups
+    from services.query_profiler import profile_job
+
+    with _batch_app().app_context():
+        try:
+            groups = due_groups()
+        except Exception as e:
+            logger.error(f"Error finding due payment check slots: {str(e)}")
+            return
+
+        for group in groups:
+            if shutdown.requested():
+                break  # The remaining slots have no run yet; the next process picks them up
+            try:
+                run = claim_run(group)
+                if run is None:
+                    logger.info(f"Slot {group.slot} ({group.time_zone}) is being checked by another process")
+                    continue
+                with profile_job('check_rent_payments'):
+                    run = check_rent_payments(run=run)
+                logger.info(f"Rent payment check {run.status} for slot {group.slot} ({group.time_zone}): "
+                            f"run {run.id}, {run.properties_due} due, {run.matched_count} received, "
+                            f"{run.partial_count} partial, {run.missed_count} missed")
+            except Exception as e:
+                # The run is marked failed; a later tick retries it (check_schedule.next_retry)
+                logger.error(f"Error in rent payment check for slot {group.slot} ({group.time_zone}): {str(e)}")
+
+def purge_reset_tokens_job():
+    """Job function to delete expired and used password reset tokens"""
+    from routes.auth import purge_password_reset_tokens
+
+    with _batch_app().app_context():
+        try:
+            deleted = purge_password_reset_tokens()
+            logger.info(f"Purged {deleted} password reset tokens")
+        except Exception as e:
+            logger.error(f"Error purging password reset tokens: {str(e)}")
+
+def process_webhooks_job():
+    """Job function to match payments for queued Akahu webhook events"""
+    from services.akahu_webhooks import process_queue
+
+    with _batch_app().app_context():
+        try:
+            results = process_queue()
+            if results['processed'] or results['failed']:
+                logger.info(f"Processed Akahu webhooks for {results['processed']} landlords "
+                            f"({results['failed']} failed), {results['recorded']} payments matched")
+        except Exception as e:
+            logger.error(f"Error processing Akahu webhooks: {str(e)}")
+
+def send_deferred_emails_job():
+    """Job function to send mail held back by the send quota"""
+    from services.email_service import EmailService
 
-    app = create_app()
-    with app.app_context():
+    with _batch_app().app_context():
         try:
-            check_rent_payments()
-            logger.info("Daily rent payment check completed")
+            sent, failed = EmailService().send_deferred()
+            if sent or failed:
+                logger.info(f"Sent {sent} deferred emails ({failed} failed)")
         except Exception as e:
-            logger.error(f"Error in daily rent payment check: {str(e)}")
\ No newline at end of file
+            logger.error(f"Error sending deferred emails: {str(e)}")
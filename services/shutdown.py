@@ -0,0 +1,19 @@
+"""Process-wide shutdown flag for long-running work.
+
+Set when the process is asked to stop (SIGTERM, a gunicorn worker
+recycling, interpreter exit). Jobs check it between units of work and stop
+at the next checkpoint: the payment check between landlord syncs, the
+webhook worker between landlords, the deferred mail sender between
+messages. New mail is deferred instead of sent.
+"""
+import threading
+
+_requested = threading.Event()
+
+
+def request():
+    _requested.set()
+
+
+def requested():
+    return _requested.is_set()
@@ -0,0 +1,138 @@
+"""Fingerprinted, precompressed static files.
+
+`flask assets build` copies every file under static/ into static/dist/ with
+a content hash in its name (css/styles.css -> css/styles.<hash>.css), writes
+gzip and brotli copies beside it, and records the names in
+static/dist/manifest.json. When a manifest is present, url_for('static', ...)
+returns the fingerprinted name and those files are served with a one-year
+immutable Cache-Control, from the precompressed copy the browser accepts.
+An edited file gets a new name, so browsers never need to revalidate.
+Without a build, static files are served unchanged.
+
+HTML is deliberately left uncompressed. Pages carry CSRF and API tokens next
+to text reflected from the request, and compressing them would expose those
+secrets to a BREACH-style length oracle.
+"""
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import mimetypes
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Under static/, so Flask's static route serves the build
+BUILD_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Fingerprinted names change with their content, so caches may keep them for good
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.xml')
+# Precompressed variants, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def build(static_folder):
+    """Fingerprint and precompress every static file; returns the manifest written"""
+    out = os.path.join(static_folder, BUILD_DIR)
+    shutil.rmtree(out, ignore_errors=True)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != out)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            stem, extension = os.path.splitext(relative)
+            hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+            target = os.path.join(out, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _write(target, data)
+            if extension.lower() in COMPRESSIBLE_EXTENSIONS:
+                for suffix, compressed in _precompress(data):
+                    if len(compressed) < len(data):
+                        _write(target + suffix, compressed)
+            manifest[relative] = f'{BUILD_DIR}/{hashed}'
+
+    _write(os.path.join(out, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def _precompress(data):
+    # Built once, so both use their slowest, smallest setting
+    yield '.gz', gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield '.br', brotli.compress(data, quality=11)
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def load_manifest(static_folder):
+    """{source name: fingerprinted name} from the last build, minus files edited since"""
+    path = os.path.join(static_folder, BUILD_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+
+    # A file edited after the build would otherwise be served at its old content
+    built_at = os.path.getmtime(path)
+    stale = [name for name in manifest
+             if not os.path.isfile(os.path.join(static_folder, name))
+             or os.path.getmtime(os.path.join(static_folder, name)) > built_at]
+    if stale:
+        logger.warning(f"Static files changed since `flask assets build`, serving them unversioned: "
+                       f"{', '.join(stale)}")
+    return {name: hashed for name, hashed in manifest.items() if name not in stale}
+
+
+def init_app(app):
+    """Serve fingerprinted static files from the build"""
+    manifest = load_manifest(app.static_folder)
+    fingerprinted = set(manifest.values())
+    app.extensions['static_manifest'] = manifest
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    def static(filename):
+        if filename not in fingerprinted:
+            return app.send_static_file(filename)
+        return _send_fingerprinted(app.static_folder, filename)
+
+    app.view_functions['static'] = static
+
+
+def _send_fingerprinted(static_folder, filename):
+    accepted = request.accept_encodings
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in ENCODINGS:
+        if accepted[encoding] and os.path.isfile(os.path.join(static_folder, filename + suffix)):
+            response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype,
+                                           max_age=IMMUTABLE_MAX_AGE)
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(static_folder, filename, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
@@ -0,0 +1,228 @@
+import os
+import hashlib
+import logging
+import threading
+from datetime import date, datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models.bank_transaction import BankTransaction, to_cents
+from models.property import RentPayment
+from models.user import User, UserSetting
+from services.akahu_client import AkahuClient
+
+logger = logging.getLogger(__name__)
+
+akahu_client = AkahuClient()
+
+# How much history is kept locally, and how often a user's copy is refreshed
+CACHE_DAYS = int(os.environ.get('TRANSACTION_CACHE_DAYS', 90))
+SYNC_INTERVAL = int(os.environ.get('TRANSACTION_SYNC_INTERVAL', 900))  # seconds
+# After a failed sync, wait this long before the search box tries again
+SYNC_RETRY = int(os.environ.get('TRANSACTION_SYNC_RETRY', 120))  # seconds
+# Re-fetch a few days before the cursor: pending transactions settle late
+SYNC_OVERLAP_DAYS = 3
+
+# ISO timestamp of the last sync; its date is the incremental fetch cursor
+SYNCED_AT_KEY = 'akahu_transactions_synced_at'
+# ISO timestamp of the last failed sync; cleared by the next successful one
+SYNC_FAILED_AT_KEY = 'akahu_transactions_sync_failed_at'
+# Comma-separated Akahu account ids that receive rent (unset: every account)
+RENT_ACCOUNTS_KEY = 'akahu_rent_account_ids'
+
+# Landlords with a background refresh running in this process
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def last_synced_at(user):
+    value = UserSetting.get_value(user.id, SYNCED_AT_KEY)
+    return datetime.fromisoformat(value) if value else None
+
+
+def needs_sync(user, now=None):
+    synced_at = last_synced_at(user)
+    now = now or datetime.now(timezone.utc)
+    return synced_at is None or (now - synced_at).total_seconds() >= SYNC_INTERVAL
+
+
+def rent_account_ids(user):
+    return _account_ids(UserSetting.get_value(user.id, RENT_ACCOUNTS_KEY))
+
+
+def _account_ids(value):
+    return [account_id for account_id in (value or '').split(',') if account_id]
+
+
+def set_rent_account_ids(user, account_ids):
+    """Store which accounts to fetch; a changed choice resets the user's cache.
+
+    Cached rows already recorded against a rent payment are kept, so the
+    refetch updates them in place rather than offering them for matching
+    again. The caller commits.
+    """
+    account_ids = sorted(set(account_ids))
+    if account_ids == sorted(rent_account_ids(user)):
+        return False
+    UserSetting.set_value(user.id, RENT_ACCOUNTS_KEY, ','.join(account_ids))
+
+    recorded = select(RentPayment.bank_transaction_id).where(RentPayment.bank_transaction_id.isnot(None))
+    BankTransaction.query.filter(BankTransaction.user_id == user.id, BankTransaction.id.not_in(recorded)) \
+        .delete(synchronize_session=False)
+    UserSetting.query.filter_by(user_id=user.id, setting_key=SYNCED_AT_KEY).delete(synchronize_session=False)
+    return True
+
+
+def _transaction_id(item):
+    """Akahu's id, or a stable stand-in built from the transaction itself"""
+    if item.id:
+        return item.id
+    raw = f"{item.date.isoformat()}|{item.amount}|{item.description}|{item.reference}"
+    return 'local_' + hashlib.sha256(raw.encode()).hexdigest()[:40]
+
+
+def sync_transactions(user, today=None, commit=True, prune=True):
+    """Refresh the user's cached transactions from Akahu.
+
+    Only the days since the last sync (minus a small overlap) are fetched,
+    and only from the user's rent accounts when they have chosen some.
+    New rows are bulk-inserted, changed ones updated by Akahu id, and with
+    prune=True history older than CACHE_DAYS is dropped. Returns the number
+    of rows inserted or changed. With commit=False the changes are only
+    flushed, for callers that own the transaction.
+    """
+    today = today or date.today()
+    oldest = today - timedelta(days=CACHE_DAYS)
+    settings = {row.setting_key: row for row in UserSetting.query.filter(
+        UserSetting.user_id == user.id,
+        UserSetting.setting_key.in_((SYNCED_AT_KEY, RENT_ACCOUNTS_KEY, SYNC_FAILED_AT_KEY)))}
+    setting = settings.get(SYNCED_AT_KEY)
+    accounts = settings.get(RENT_ACCOUNTS_KEY)
+    start = oldest
+    if setting is not None and setting.setting_value:
+        synced_to = datetime.fromisoformat(setting.setting_value).date()
+        start = max(oldest, synced_to - timedelta(days=SYNC_OVERLAP_DAYS))
+
+    fetched = akahu_client.get_transactions(
+        user, start, today, account_ids=_account_ids(accounts.setting_value if accounts else None))
+
+    existing = {}
+    if setting is not None:
+        existing = {t.akahu_id: t for t in BankTransaction.query.filter(
+            BankTransaction.user_id == user.id, BankTransaction.date >= start)}
+    new_rows = {}
+    changed = 0
+    for item in fetched:
+        values = {
+            'date': item.date,
+            'amount_cents': to_cents(item.amount),
+            'description': item.description,
+            'reference': item.reference,
+        }
+        akahu_id = _transaction_id(item)
+        row = existing.get(akahu_id)
+        if row is None:
+            new_rows[akahu_id] = dict(values, user_id=user.id, akahu_id=akahu_id)
+        elif any(getattr(row, name) != value for name, value in values.items()):
+            for name, value in values.items():
+                setattr(row, name, value)
+            changed += 1
+
+    if new_rows:
+        db.session.execute(insert(BankTransaction), list(new_rows.values()))
+    if prune:
+        prune_transactions(oldest, user_id=user.id)
+
+    if setting is None:
+        setting = UserSetting(user_id=user.id, setting_key=SYNCED_AT_KEY)
+        db.session.add(setting)
+    setting.setting_value = datetime.now(timezone.utc).isoformat()
+    if SYNC_FAILED_AT_KEY in settings:
+        db.session.delete(settings[SYNC_FAILED_AT_KEY])
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+    return changed + len(new_rows)
+
+
+def prune_transactions(oldest, user_id=None):
+    """Drop cached transactions dated before oldest (for one user, or everyone)"""
+    query = BankTransaction.query.filter(BankTransaction.date < oldest)
+    if user_id is not None:
+        query = query.filter(BankTransaction.user_id == user_id)
+    return query.delete(synchronize_session=False)
+
+
+def ensure_fresh(user):
+    """Sync if the cache is older than SYNC_INTERVAL; returns False if Akahu failed.
+
+    A failure is recorded under SYNC_FAILED_AT_KEY, so the search box can
+    say the refresh failed rather than that one is under way.
+    """
+    if not needs_sync(user):
+        return True
+    try:
+        sync_transactions(user)
+        return True
+    except IntegrityError:
+        # A concurrent request synced the same rows first
+        db.session.rollback()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Transaction sync failed for user {user.id}: {e}")
+        UserSetting.set_value(user.id, SYNC_FAILED_AT_KEY, datetime.now(timezone.utc).isoformat())
+        db.session.commit()
+        return False
+
+
+def refresh_in_background(user, now=None):
+    """Start a sync on its own thread if the cache is older than SYNC_INTERVAL.
+
+    The caller answers from the cache as it is, so a long first sync
+    doesn't hold up a request. At most one refresh per landlord runs at a
+    time in each process, and after a failed one the next waits
+    SYNC_RETRY. Returns 'fresh' if the cache is up to date, 'refreshing'
+    while a sync runs, or 'failed' if the last sync failed and the next
+    attempt has to wait.
+    """
+    now = now or datetime.now(timezone.utc)
+    times = {row.setting_key: datetime.fromisoformat(row.setting_value) for row in UserSetting.query.filter(
+        UserSetting.user_id == user.id, UserSetting.setting_key.in_((SYNCED_AT_KEY, SYNC_FAILED_AT_KEY)))
+        if row.setting_value}
+    synced_at, failed_at = times.get(SYNCED_AT_KEY), times.get(SYNC_FAILED_AT_KEY)
+    if synced_at is not None and (now - synced_at).total_seconds() < SYNC_INTERVAL:
+        return 'fresh'
+    with _refreshing_lock:
+        if user.id in _refreshing:
+            return 'refreshing'
+        if failed_at is not None and (now - failed_at).total_seconds() < SYNC_RETRY:
+            return 'failed'
+        _refreshing.add(user.id)
+
+    app = current_app._get_current_object()
+    user_id = user.id
+
+    def run():
+        with app.app_context():
+            try:
+                ensure_fresh(db.session.get(User, user_id))
+            finally:
+                with _refreshing_lock:
+                    _refreshing.discard(user_id)
+
+    threading.Thread(target=run, daemon=True).start()
+    return 'refreshing'
+
+
+def search_transactions(user, query, limit=20):
+    """Cached transactions whose description contains query, newest first"""
+    search = BankTransaction.query.filter(BankTransaction.user_id == user.id)
+    query = (query or '').strip()
+    if query:
+        pattern = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        search = search.filter(BankTransaction.description.ilike(f'%{pattern}%', escape='\\'))
+    return search.order_by(BankTransaction.date.desc(), BankTransaction.id.desc()).limit(limit).all()
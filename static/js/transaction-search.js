@@ -0,0 +1,102 @@
+// Keyword helper for the add/edit property forms: searches the landlord's
+// cached bank transactions and fills the form from the one they pick.
+let transactionSearchTimer = null;
+let transactionSearchSeq = 0;
+
+function searchTransactions() {
+    const modalElement = document.getElementById('transactionModal');
+    const input = document.getElementById('transactionSearch');
+    input.value = document.getElementById('bank_statement_keyword').value;
+
+    new bootstrap.Modal(modalElement).show();
+    loadTransactions(input.value);
+}
+
+function onTransactionSearchInput(value) {
+    clearTimeout(transactionSearchTimer);
+    transactionSearchTimer = setTimeout(() => loadTransactions(value), 250);
+}
+
+function loadTransactions(query) {
+    const list = document.getElementById('transactionList');
+    const url = document.getElementById('transactionModal').dataset.searchUrl;
+    const seq = ++transactionSearchSeq;
+
+    fetch(`${url}?q=${encodeURIComponent(query.trim())}`, {credentials: 'same-origin'})
+        .then(response => response.json())
+        .then(data => {
+            if (seq !== transactionSearchSeq) {
+                return;  // a newer search has been sent since
+            }
+            list.replaceChildren();
+
+            if (!data.success) {
+                const alert = document.createElement('div');
+                alert.className = 'alert alert-info';
+                alert.textContent = data.error + ' ';
+                if (data.setup_url) {
+                    const link = document.createElement('a');
+                    link.href = data.setup_url;
+                    link.className = 'alert-link';
+                    link.textContent = 'Set up now';
+                    alert.appendChild(link);
+                }
+                list.appendChild(alert);
+                return;
+            }
+
+            if (data.sync === 'failed') {
+                const warning = document.createElement('p');
+                warning.className = 'small text-warning';
+                warning.textContent = 'Could not refresh your bank transactions from Akahu; showing previously downloaded ones.';
+                list.appendChild(warning);
+            } else if (data.stale) {
+                const warning = document.createElement('p');
+                warning.className = 'small text-muted';
+                warning.textContent = 'Fetching your latest bank transactions; showing previously downloaded ones for now.';
+                list.appendChild(warning);
+            }
+
+            if (!data.transactions.length) {
+                const empty = document.createElement('p');
+                empty.className = 'text-muted';
+                empty.textContent = 'No matching transactions in the last few months.';
+                list.appendChild(empty);
+                return;
+            }
+
+            const group = document.createElement('div');
+            group.className = 'list-group';
+            data.transactions.forEach(t => {
+                const item = document.createElement('button');
+                item.type = 'button';
+                item.className = 'list-group-item list-group-item-action d-flex justify-content-between';
+
+                const description = document.createElement('span');
+                description.textContent = `${t.date}  ${t.description}`;
+                const amount = document.createElement('strong');
+                amount.textContent = `$${t.amount}`;
+
+                item.append(description, amount);
+                item.addEventListener('click', () => selectTransaction(t));
+                group.appendChild(item);
+            });
+            list.appendChild(group);
+        })
+        .catch(() => {
+            if (seq === transactionSearchSeq) {
+                list.textContent = 'Transaction search failed. Please try again.';
+            }
+        });
+}
+
+function selectTransaction(transaction) {
+    document.getElementById('bank_statement_keyword').value = transaction.description;
+
+    const rentAmount = document.getElementById('rent_amount');
+    if (!rentAmount.value && Number(transaction.amount) > 0) {
+        rentAmount.value = transaction.amount;
+    }
+
+    bootstrap.Modal.getInstance(document.getElementById('transactionModal')).hide();
+}
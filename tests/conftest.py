@@ -0,0 +1,63 @@
+"""Fixtures shared by the tests: an app on a temporary SQLite file, and its landlords."""
+from decimal import Decimal
+
+import pytest
+
+from app import create_app, db
+from models.property import Property
+from models.user import User
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on an empty SQLite database, inside an app context"""
+    monkeypatch.setenv('FLASK_ENV', 'development')
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.delenv('REPLICA_DATABASE_URL', raising=False)
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        # Only the primary: an earlier test's replica bind stays registered on db
+        db.create_all(bind_key=None)
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def make_landlord(app):
+    def make(email='landlord@example.com', **fields):
+        user = User(email=email, first_name='Test', last_name='Landlord', password_hash='x', **fields)
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return make
+
+
+@pytest.fixture
+def make_property(app):
+    """A weekly property due on Mondays, paid with 'RENT' in the description"""
+    def make(landlord, **fields):
+        values = dict(address='1 Test Street', tenant_name='Tenant', tenant_email='tenant@example.com',
+                      rent_amount=Decimal('500.00'), rent_frequency='Weekly', rent_due_day_of_week=0,
+                      bank_statement_keyword='rent')
+        values.update(fields)
+        property = Property(user_id=landlord.id, **values)
+        db.session.add(property)
+        db.session.commit()
+        return property
+
+    return make
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Rent notifications the payment check sends, as (method name, args)"""
+    from routes import payments
+
+    sent = []
+    for name in ('send_rent_received_notification', 'send_rent_missed_notification',
+                 'send_rent_partial_notification', 'send_tenant_reminder'):
+        monkeypatch.setattr(payments.email_service, name,
+                            lambda *args, name=name: sent.append((name, args)))
+    return sent
@@ -0,0 +1,270 @@
+"""Akahu webhook ingestion: the endpoint, the queue worker and incremental matching.
+
+Deliveries come from the local stand-in sender (build_payload and sign with
+a test secret), except where Akahu's own RSA signature is under test.
+"""
+import base64
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app import db
+from models.bank_transaction import BankTransaction
+from models.payment_stats import PaymentStatsMonthly
+from models.property import RentPayment
+from models.webhook_event import AkahuWebhookEvent
+from routes import payments
+from routes.payments import match_landlord_payments
+from services import akahu_webhooks, payment_stats, transaction_cache
+from services.akahu_webhooks import build_payload, process_queue, sign
+
+SECRET = 'test-secret'
+
+
+@pytest.fixture(autouse=True)
+def webhook_settings(monkeypatch):
+    monkeypatch.setattr(akahu_webhooks, 'TEST_SECRET', SECRET)
+    monkeypatch.setattr(akahu_webhooks, '_signing_key', None)
+    monkeypatch.setattr(akahu_webhooks, '_key_fetched_at', None)
+
+
+@pytest.fixture
+def deliver(app):
+    client = app.test_client()
+
+    def deliver(body, signature=None, headers=None):
+        if headers is None:
+            headers = {akahu_webhooks.TEST_SIGNATURE_HEADER: signature or sign(body, SECRET)}
+        return client.post('/akahu/webhook', data=body, headers=headers, content_type='application/json')
+
+    return deliver
+
+
+def _events():
+    return AkahuWebhookEvent.query.order_by(AkahuWebhookEvent.id).all()
+
+
+def _queue(user, count=1, **fields):
+    for number in range(count):
+        body = build_payload(user.id, webhook_code=f'DEFAULT_UPDATE_{number}')
+        db.session.add(AkahuWebhookEvent(user_id=user.id, digest=f'{user.id}-{number}', webhook_type='TRANSACTION',
+                                         payload=body.decode(), **fields))
+    db.session.commit()
+
+
+def test_signed_delivery_is_queued(make_landlord, deliver):
+    landlord = make_landlord()
+    response = deliver(build_payload(landlord.id))
+    assert response.status_code == 202
+    assert [(event.user_id, event.status) for event in _events()] == [(landlord.id, 'queued')]
+
+
+def test_bad_signature_is_rejected(make_landlord, deliver):
+    landlord = make_landlord()
+    body = build_payload(landlord.id)
+    assert deliver(body, signature=sign(body, 'wrong-secret')).status_code == 401
+    assert deliver(body, headers={}).status_code == 401
+    assert _events() == []
+
+
+def test_replayed_signature_is_rejected(make_landlord, deliver):
+    landlord = make_landlord()
+    body = build_payload(landlord.id)
+    old = time.time() - akahu_webhooks.SIGNATURE_TOLERANCE - 60
+    assert deliver(body, signature=sign(body, SECRET, timestamp=old)).status_code == 401
+    assert _events() == []
+
+
+def test_test_signatures_need_development_mode(make_landlord, deliver, monkeypatch):
+    landlord = make_landlord()
+    monkeypatch.setenv('FLASK_ENV', 'production')
+    assert deliver(build_payload(landlord.id)).status_code == 401
+
+
+def test_duplicate_delivery_is_stored_once(make_landlord, deliver):
+    landlord = make_landlord()
+    body = build_payload(landlord.id)
+    assert deliver(body).status_code == 202
+    response = deliver(body)
+    assert response.status_code == 200
+    assert response.json == {'status': 'duplicate'}
+    assert len(_events()) == 1
+
+
+def test_unknown_state_is_ignored(make_landlord, deliver):
+    make_landlord()
+    response = deliver(build_payload(9999))
+    assert response.status_code == 200
+    assert response.json == {'status': 'ignored'}
+    assert _events() == []
+
+
+def test_account_that_takes_no_rent_is_ignored(make_landlord, deliver):
+    landlord = make_landlord()
+    transaction_cache.set_rent_account_ids(landlord, ['acc_rent'])
+    db.session.commit()
+    assert deliver(build_payload(landlord.id, item_id='acc_savings')).json == {'status': 'ignored'}
+    assert deliver(build_payload(landlord.id, item_id='acc_rent')).status_code == 202
+    assert [event.item_id for event in _events()] == ['acc_rent']
+
+
+def test_akahu_rsa_signature_is_verified(make_landlord, deliver, monkeypatch):
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+    landlord = make_landlord(akahu_app_token='app_token', akahu_user_token='user_token')
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.public_key().public_bytes(serialization.Encoding.PEM,
+                                        serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    fetched = []
+    monkeypatch.setattr(transaction_cache.akahu_client, 'get_signing_key',
+                        lambda user, key_id: fetched.append(key_id) or pem)
+
+    def headers(body, key_id):
+        signature = base64.b64encode(key.sign(body, padding.PKCS1v15(), hashes.SHA256())).decode()
+        return {akahu_webhooks.SIGNATURE_HEADER: signature, akahu_webhooks.SIGNING_KEY_HEADER: str(key_id)}
+
+    first, second = build_payload(landlord.id, webhook_code='A'), build_payload(landlord.id, webhook_code='B')
+    assert deliver(first, headers=headers(first, 7)).status_code == 202
+    assert deliver(second, headers=headers(second, 7)).status_code == 202
+    assert fetched == [7]  # fetched once, then cached
+    assert deliver(second + b' ', headers=headers(second, 7)).status_code == 401
+    # An older key has been rotated out
+    assert deliver(first, headers=headers(first, 6)).status_code == 401
+
+
+def test_process_queue_claims_each_landlords_events_together(make_landlord, monkeypatch):
+    first, second = make_landlord('one@example.com'), make_landlord('two@example.com')
+    _queue(first, count=3)
+    _queue(second)
+    calls = []
+    monkeypatch.setattr(payments, 'match_landlord_payments', lambda user: calls.append(user.id) or 1)
+
+    assert process_queue() == {'processed': 2, 'failed': 0, 'recorded': 2}
+    assert calls == [first.id, second.id]
+    assert {(event.status, event.attempts) for event in _events()} == {('done', 1)}
+
+
+def test_process_queue_leaves_other_workers_claims(make_landlord, monkeypatch):
+    landlord = make_landlord()
+    _queue(landlord, status='processing', claimed_at=datetime.now(timezone.utc))
+    monkeypatch.setattr(payments, 'match_landlord_payments', lambda user: pytest.fail('claimed twice'))
+    assert process_queue()['processed'] == 0
+
+
+def test_process_queue_requeues_abandoned_claims(make_landlord, monkeypatch):
+    landlord = make_landlord()
+    _queue(landlord, status='processing',
+           claimed_at=datetime.now(timezone.utc) - akahu_webhooks.STALE_CLAIM - timedelta(minutes=1))
+    monkeypatch.setattr(payments, 'match_landlord_payments', lambda user: 0)
+    assert process_queue()['processed'] == 1
+    assert [event.status for event in _events()] == ['done']
+
+
+def test_failed_processing_is_retried(make_landlord, monkeypatch):
+    landlord = make_landlord()
+    _queue(landlord, count=2)
+
+    def fail(user):
+        raise RuntimeError('Akahu is down')
+
+    monkeypatch.setattr(payments, 'match_landlord_payments', fail)
+    assert process_queue() == {'processed': 0, 'failed': 1, 'recorded': 0}
+    assert {(event.status, event.attempts, event.error) for event in _events()} == {('queued', 1, 'Akahu is down')}
+
+
+def test_processing_fails_for_good_after_max_attempts(make_landlord, monkeypatch):
+    landlord = make_landlord()
+    _queue(landlord, attempts=akahu_webhooks.MAX_ATTEMPTS - 1)
+
+    def fail(user):
+        raise RuntimeError('Akahu is down')
+
+    monkeypatch.setattr(payments, 'match_landlord_payments', fail)
+    process_queue()
+    [event] = _events()
+    assert (event.status, event.attempts) == ('failed', akahu_webhooks.MAX_ATTEMPTS)
+    assert event.processed_at is not None
+
+
+def _transaction(landlord, day, amount, description='RENT 1 Test Street'):
+    transaction = BankTransaction(user_id=landlord.id, akahu_id=f'tx-{day.isoformat()}-{amount}', date=day,
+                                  amount_cents=int(Decimal(amount) * 100), description=description)
+    db.session.add(transaction)
+    db.session.commit()
+    return transaction
+
+
+def _pending(property, due_date):
+    """A pending payment, counted into the monthly totals as the payment check would"""
+    values = dict(property_id=property.id, expected_amount=property.rent_amount, due_date=due_date, status='pending')
+    db.session.add(RentPayment(**values))
+    changes = payment_stats.Changes()
+    changes.add(property.user_id, after=values)
+    changes.apply()
+    db.session.commit()
+
+
+def _monthly(landlord):
+    return [(row.month, row.payments, row.received, row.pending, row.missed) for row in
+            PaymentStatsMonthly.query.filter_by(user_id=landlord.id).order_by(PaymentStatsMonthly.month)]
+
+
+def test_match_landlord_payments_records_and_settles(make_landlord, make_property, sent):
+    landlord = make_landlord()
+    property = make_property(landlord)
+    today = date(2026, 10, 7)  # a Wednesday; rent was due on Monday the 5th
+    _pending(property, date(2026, 9, 28))
+    late = _transaction(landlord, date(2026, 9, 30), '500.00')
+    on_time = _transaction(landlord, date(2026, 10, 6), '500.00')
+
+    assert match_landlord_payments(landlord, today=today) == 2
+
+    rows = {payment.due_date: payment for payment in RentPayment.query.filter_by(property_id=property.id)}
+    assert (rows[date(2026, 9, 28)].status, rows[date(2026, 9, 28)].bank_transaction_id) == ('received', late.id)
+    assert (rows[date(2026, 10, 5)].status, rows[date(2026, 10, 5)].bank_transaction_id) == ('received', on_time.id)
+    assert [name for name, _ in sent] == ['send_rent_received_notification'] * 2
+
+    # The incremental totals match a rebuild from rent_payments
+    incremental = _monthly(landlord)
+    payment_stats.backfill([landlord.id])
+    db.session.commit()
+    assert incremental == _monthly(landlord)
+
+    # Nothing new: a second pass records, settles and sends nothing
+    assert match_landlord_payments(landlord, today=today) == 0
+    assert len(sent) == 2
+
+
+def test_match_landlord_payments_leaves_unpaid_due_dates_to_the_daily_check(make_landlord, make_property, sent):
+    landlord = make_landlord()
+    make_property(landlord)
+    assert match_landlord_payments(landlord, today=date(2026, 10, 7)) == 0
+    assert RentPayment.query.count() == 0
+    assert sent == []
+
+
+def test_payment_settled_by_another_writer_is_not_settled_again(make_landlord, make_property, sent):
+    from services.reconciliation import match_payments, open_payments
+
+    landlord = make_landlord()
+    property = make_property(landlord)
+    today = date(2026, 10, 7)
+    _pending(property, date(2026, 9, 28))
+    _transaction(landlord, date(2026, 9, 30), '500.00')
+
+    # The daily check loads the payment, then the webhook worker settles it first
+    stale = open_payments(today, user_ids=[landlord.id])
+    _, late_matches = match_payments(today, [], stale)
+    for payment in stale:
+        db.session.expunge(payment)
+    assert match_landlord_payments(landlord, today=today) == 1
+
+    changes = payment_stats.Changes()
+    assert payments._settle_outstanding(today, stale, late_matches, changes) == (0, [])
+    changes.apply()
+    db.session.commit()
+    assert len(sent) == 1
+    assert _monthly(landlord)[0][1:] == (1, 1, 0, 0)
@@ -0,0 +1,69 @@
+"""Claiming and retrying the daily check's per-slot runs (services.check_schedule)."""
+from datetime import timedelta
+
+import pytest
+
+from app import db
+from models.payment_check import PaymentCheckRun
+from services import check_schedule
+from services.check_schedule import claim_run, due_groups
+
+
+@pytest.fixture
+def group(make_landlord, make_property):
+    landlord = make_landlord(time_zone='UTC')
+    make_property(landlord)
+    [group] = check_schedule.slot_groups()
+    return group
+
+
+def _due(group, now):
+    return [(g.time_zone, g.slot) for g in due_groups(now)] == [(group.time_zone, group.slot)]
+
+
+def _fail(run, finished_at):
+    run.status = 'failed'
+    run.finished_at = finished_at
+    db.session.commit()
+
+
+def test_only_one_claim_per_slot(group):
+    run = claim_run(group)
+    assert (run.status, run.attempts) == ('running', 1)
+    assert claim_run(group) is None
+    assert not _due(group, group.starts_at + timedelta(minutes=1))
+
+
+def test_interrupted_run_is_resumed_at_the_next_tick(group):
+    run = claim_run(group)
+    run.status = 'interrupted'
+    db.session.commit()
+    assert _due(group, group.starts_at + timedelta(minutes=1))
+    assert claim_run(group).id == run.id
+    assert claim_run(group) is None
+
+
+def test_failed_run_is_retried_after_a_growing_backoff(group):
+    failed_at = group.starts_at + timedelta(minutes=1)
+    run = claim_run(group)
+    _fail(run, failed_at)
+    assert not _due(group, failed_at + check_schedule.RETRY_BACKOFF - timedelta(seconds=1))
+    assert _due(group, failed_at + check_schedule.RETRY_BACKOFF)
+
+    assert claim_run(group).id == run.id
+    assert (run.status, run.attempts) == ('running', 2)
+    _fail(run, failed_at)
+    assert not _due(group, failed_at + check_schedule.RETRY_BACKOFF)
+    assert _due(group, failed_at + check_schedule.RETRY_BACKOFF * 2)
+
+
+def test_failed_run_stops_after_max_attempts(group, monkeypatch):
+    monkeypatch.setattr(check_schedule, 'MAX_RUN_ATTEMPTS', 2)
+    failed_at = group.starts_at + timedelta(minutes=1)
+    run = claim_run(group)
+    _fail(run, failed_at)
+    claim_run(group)
+    _fail(run, failed_at)
+    assert check_schedule.next_retry(run) is None
+    assert not _due(group, failed_at + timedelta(hours=6))
+    assert db.session.get(PaymentCheckRun, run.id).attempts == 2
@@ -0,0 +1,107 @@
+"""RoutingSession / read_replica against two SQLite files standing in for primary and replica.
+
+Each database gets a user with a different email, so a query shows which
+one answered. Run with `python -m pytest -q` from the project root.
+"""
+import pytest
+
+from app import create_app, db
+from models.user import User
+from utils.database import replica_fallbacks, replica_health, replica_reads
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Build an app on a primary SQLite file and the given replica URL (default: a second file)"""
+    monkeypatch.setenv('FLASK_ENV', 'development')
+    # Recheck replica health on every query instead of caching it
+    monkeypatch.setattr(replica_health, 'interval', 0)
+    monkeypatch.setattr(replica_health, '_checked_at', {})
+    monkeypatch.setattr(replica_health, '_healthy', {})
+
+    def make(replica_url=None):
+        monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'primary.db'}")
+        monkeypatch.setenv('REPLICA_DATABASE_URL', replica_url or f"sqlite:///{tmp_path / 'replica.db'}")
+        app = create_app()
+        with app.app_context():
+            db.create_all(bind_key=None)
+            db.session.add(_user('primary@example.com'))
+            db.session.commit()
+            if replica_url is None:
+                replica = db.engines['replica']
+                db.metadata.create_all(replica)
+                with replica.begin() as conn:
+                    conn.execute(User.__table__.insert(), [_row('replica@example.com')])
+        return app
+
+    return make
+
+
+def _user(email):
+    return User(email=email, first_name='Test', last_name='User', password_hash='x')
+
+
+def _row(email):
+    return {'email': email, 'first_name': 'Test', 'last_name': 'User', 'password_hash': 'x'}
+
+
+def _emails():
+    return [user.email for user in User.query.order_by(User.id)]
+
+
+def _fallbacks():
+    return sum(value for _, _, value in replica_fallbacks.samples())
+
+
+def test_reads_go_to_the_primary_outside_replica_reads(make_app):
+    with make_app().app_context():
+        assert _emails() == ['primary@example.com']
+
+
+def test_reads_go_to_a_healthy_replica_inside_replica_reads(make_app):
+    with make_app().app_context():
+        with replica_reads():
+            assert _emails() == ['replica@example.com']
+        assert _emails() == ['primary@example.com']
+
+
+def test_writes_inside_replica_reads_go_to_the_primary(make_app):
+    app = make_app()
+    with app.app_context():
+        with replica_reads():
+            db.session.add(_user('new@example.com'))
+            db.session.flush()
+            db.session.commit()
+        assert _emails() == ['primary@example.com', 'new@example.com']
+        with db.engines['replica'].connect() as conn:
+            assert conn.execute(User.__table__.select()).all()[0].email == 'replica@example.com'
+
+
+def test_lagging_replica_falls_back_to_the_primary(make_app, monkeypatch):
+    app = make_app()
+    monkeypatch.setattr(replica_health, '_lag', lambda conn: replica_health.max_lag + 1)
+    before = _fallbacks()
+    with app.app_context():
+        with replica_reads():
+            assert _emails() == ['primary@example.com']
+    assert _fallbacks() > before
+
+
+def test_replica_that_catches_up_is_used_again(make_app, monkeypatch):
+    app = make_app()
+    with app.app_context():
+        monkeypatch.setattr(replica_health, '_lag', lambda conn: replica_health.max_lag + 1)
+        with replica_reads():
+            assert _emails() == ['primary@example.com']
+        monkeypatch.setattr(replica_health, '_lag', lambda conn: 0)
+        with replica_reads():
+            assert _emails() == ['replica@example.com']
+
+
+def test_unreachable_replica_falls_back_to_the_primary(make_app, tmp_path):
+    app = make_app(replica_url=f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    before = _fallbacks()
+    with app.app_context():
+        with replica_reads():
+            assert _emails() == ['primary@example.com']
+    assert _fallbacks() > before
@@ -0,0 +1,170 @@
+"""Rent matching within payment windows (services.reconciliation) and the daily check built on it.
+
+Dates are relative to today, because the check prunes stored transactions
+older than TRANSACTION_CACHE_DAYS.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app import db
+from models.bank_transaction import BankTransaction
+from models.payment_stats import PaymentStatsMonthly
+from models.property import RentPayment
+from routes.payments import UpcomingDue, check_rent_payments
+from services import payment_stats
+from services.reconciliation import match_payments, open_payments, window_closed
+
+# A Monday a few weeks back; the test properties are due on Mondays
+MONDAY = date.today() - timedelta(days=date.today().weekday() + 28)
+
+
+@pytest.fixture
+def landlord(make_landlord):
+    return make_landlord()
+
+
+@pytest.fixture
+def property(landlord, make_property):
+    return make_property(landlord, payment_window_early_days=2, payment_window_late_days=2)
+
+
+def _transaction(landlord, day, amount='500.00', description='RENT 1 Test Street'):
+    transaction = BankTransaction(user_id=landlord.id, akahu_id=f'tx-{BankTransaction.query.count()}', date=day,
+                                  amount_cents=int(Decimal(amount) * 100), description=description)
+    db.session.add(transaction)
+    db.session.commit()
+    return transaction
+
+
+def _match(property, *due_dates):
+    """{due date: matched transaction id} for the property's due dates, in the order given"""
+    due = [UpcomingDue(property, due_date, property.rent_amount) for due_date in due_dates]
+    _, late_matches = match_payments(max(due_dates), [], due)
+    return {item.due_date: match.id for item, match in late_matches.items()}
+
+
+def _payment(property, due_date):
+    return RentPayment.query.filter_by(property_id=property.id, due_date=due_date).one()
+
+
+@pytest.mark.parametrize('offset, matches', [(-3, False), (-2, True), (0, True), (2, True), (3, False)])
+def test_window_edges(landlord, property, offset, matches):
+    transaction = _transaction(landlord, MONDAY + timedelta(days=offset))
+    assert _match(property, MONDAY) == ({MONDAY: transaction.id} if matches else {})
+
+
+def test_exact_amount_beats_a_closer_date(landlord, property):
+    _transaction(landlord, MONDAY, amount='450.00')
+    exact = _transaction(landlord, MONDAY + timedelta(days=2))
+    assert _match(property, MONDAY) == {MONDAY: exact.id}
+
+
+def test_closest_transaction_wins_and_the_earlier_on_a_tie(landlord, property):
+    early = _transaction(landlord, MONDAY - timedelta(days=1))
+    _transaction(landlord, MONDAY + timedelta(days=1))
+    _transaction(landlord, MONDAY + timedelta(days=2))
+    assert _match(property, MONDAY) == {MONDAY: early.id}
+
+
+def test_keyword_must_appear_in_the_description(landlord, property):
+    _transaction(landlord, MONDAY, description='GROCERIES')
+    assert _match(property, MONDAY) == {}
+
+
+def test_transaction_is_used_once_across_overlapping_windows(landlord, make_property):
+    # Weekly rent with five days either side: consecutive windows share four days
+    property = make_property(landlord, payment_window_early_days=5, payment_window_late_days=5)
+    following = MONDAY + timedelta(days=7)
+    shared = _transaction(landlord, MONDAY + timedelta(days=3))
+    assert _match(property, MONDAY, following) == {MONDAY: shared.id}
+
+    second = _transaction(landlord, MONDAY + timedelta(days=4))
+    assert _match(property, MONDAY, following) == {MONDAY: shared.id, following: second.id}
+
+
+def test_transaction_recorded_against_an_earlier_due_date_is_not_reused(landlord, make_property):
+    property = make_property(landlord, payment_window_early_days=5, payment_window_late_days=5)
+    shared = _transaction(landlord, MONDAY + timedelta(days=3))
+    db.session.add(RentPayment(property_id=property.id, due_date=MONDAY, expected_amount=property.rent_amount,
+                               status='received', actual_amount=property.rent_amount,
+                               received_date=shared.date, bank_transaction_id=shared.id))
+    db.session.commit()
+    assert _match(property, MONDAY + timedelta(days=7)) == {}
+
+
+def test_other_properties_can_use_the_same_transaction(landlord, property, make_property):
+    neighbour = make_property(landlord, address='2 Test Street')
+    transaction = _transaction(landlord, MONDAY)
+    assert _match(property, MONDAY) == {MONDAY: transaction.id}
+    assert _match(neighbour, MONDAY) == {MONDAY: transaction.id}
+
+
+def test_debits_are_ignored(landlord, property):
+    _transaction(landlord, MONDAY, amount='-500.00', description='RENT REFUND 1 Test Street')
+    assert _match(property, MONDAY) == {}
+    credit = _transaction(landlord, MONDAY + timedelta(days=1), amount='500.00')
+    assert _match(property, MONDAY) == {MONDAY: credit.id}
+
+
+def test_window_closed_after_the_last_late_day(property):
+    assert not window_closed(property, MONDAY, MONDAY + timedelta(days=1))
+    assert window_closed(property, MONDAY, MONDAY + timedelta(days=2))
+
+
+def test_open_payments(property):
+    # The incremental sync refetches SYNC_OVERLAP_DAYS (3), so a missed payment
+    # stays open while its late window ended at most that long ago
+    for days_ago, status in ((70, 'pending'), (4, 'missed'), (6, 'missed')):
+        db.session.add(RentPayment(property_id=property.id, due_date=MONDAY - timedelta(days=days_ago),
+                                   expected_amount=property.rent_amount, status=status))
+    db.session.commit()
+    assert sorted((payment.status, (MONDAY - payment.due_date).days) for payment in open_payments(MONDAY)) == [
+        ('missed', 4), ('pending', 70)]
+
+
+def test_unpaid_rent_is_pending_until_the_late_window_closes(landlord, property, sent):
+    run = check_rent_payments(check_date=MONDAY)
+    assert (run.status, run.missed_count) == ('completed', 0)
+    assert _payment(property, MONDAY).status == 'pending'
+    assert sent == []
+
+    run = check_rent_payments(check_date=MONDAY + timedelta(days=2))
+    assert run.settled_count == 1
+    assert _payment(property, MONDAY).status == 'missed'
+    assert [name for name, _ in sent] == ['send_rent_missed_notification']
+
+
+def test_late_payment_settles_a_missed_payment(landlord, property, sent):
+    check_rent_payments(check_date=MONDAY)
+    check_rent_payments(check_date=MONDAY + timedelta(days=2))
+    assert _payment(property, MONDAY).status == 'missed'
+
+    # The bank feed delivers a payment dated inside the window a day late
+    transaction = _transaction(landlord, MONDAY + timedelta(days=1))
+    run = check_rent_payments(check_date=MONDAY + timedelta(days=3))
+    payment = _payment(property, MONDAY)
+    assert (payment.status, payment.bank_transaction_id, payment.received_date) == (
+        'received', transaction.id, transaction.date)
+    assert run.settled_count == 1
+    assert [name for name, _ in sent] == ['send_rent_missed_notification', 'send_rent_received_notification']
+
+    # The incremental monthly totals agree with a rebuild
+    def monthly():
+        return [(row.month, row.payments, row.received, row.missed, row.pending, row.arrears_cents)
+                for row in PaymentStatsMonthly.query.order_by(PaymentStatsMonthly.month)]
+
+    incremental = monthly()
+    payment_stats.backfill()
+    db.session.commit()
+    assert incremental == monthly()
+
+
+def test_partial_payment_on_the_due_date(landlord, property, sent):
+    _transaction(landlord, MONDAY, amount='300.00')
+    run = check_rent_payments(check_date=MONDAY)
+    payment = _payment(property, MONDAY)
+    assert (payment.status, payment.actual_amount) == ('partial', Decimal('300.00'))
+    assert run.partial_count == 1
+    assert [name for name, _ in sent] == ['send_rent_partial_notification']
@@ -0,0 +1,73 @@
+"""Background refreshes of the cached transactions behind the keyword search box."""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app import db
+from models.user import UserSetting
+from services import transaction_cache
+from services.transaction_cache import SYNC_FAILED_AT_KEY, refresh_in_background
+
+
+class _Thread:
+    """Runs the refresh on start(), so the test sees its outcome"""
+
+    def __init__(self, target, daemon):
+        self.target = target
+
+    def start(self):
+        # The refresh opens its own session; hand it the pool's only connection
+        db.session.rollback()
+        self.target()
+
+
+@pytest.fixture
+def landlord(make_landlord, monkeypatch):
+    monkeypatch.setattr(transaction_cache, 'threading', SimpleNamespace(Thread=_Thread))
+    return make_landlord(akahu_app_token='app_token', akahu_user_token='user_token')
+
+
+def _akahu(monkeypatch, error=None):
+    def get_transactions(user, start, end, account_ids=None):
+        if error:
+            raise error
+        return []
+
+    monkeypatch.setattr(transaction_cache.akahu_client, 'get_transactions', get_transactions)
+
+
+def test_failed_refresh_is_reported_until_the_retry(landlord, monkeypatch):
+    _akahu(monkeypatch, RuntimeError('Akahu is down'))
+    assert refresh_in_background(landlord) == 'refreshing'
+    failed_at = datetime.fromisoformat(UserSetting.get_value(landlord.id, SYNC_FAILED_AT_KEY))
+
+    # Nothing is fetching now, so the search box must not say otherwise
+    assert refresh_in_background(landlord) == 'failed'
+    retry_at = failed_at + timedelta(seconds=transaction_cache.SYNC_RETRY)
+    assert refresh_in_background(landlord, now=retry_at - timedelta(seconds=1)) == 'failed'
+
+    _akahu(monkeypatch)
+    assert refresh_in_background(landlord, now=retry_at) == 'refreshing'
+    assert UserSetting.get_value(landlord.id, SYNC_FAILED_AT_KEY) is None
+    assert refresh_in_background(landlord) == 'fresh'
+
+
+def test_refresh_already_running_is_not_started_twice(landlord, monkeypatch):
+    monkeypatch.setattr(transaction_cache, '_refreshing', {landlord.id})
+    _akahu(monkeypatch, AssertionError('started a second refresh'))
+    assert refresh_in_background(landlord) == 'refreshing'
+    assert UserSetting.get_value(landlord.id, SYNC_FAILED_AT_KEY) is None
+
+
+def test_search_reports_the_sync_state(app, landlord, monkeypatch):
+    _akahu(monkeypatch, RuntimeError('Akahu is down'))
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(landlord.id)
+        session['_fresh'] = True
+
+    first = client.get('/properties/search_transactions?q=rent').json
+    second = client.get('/properties/search_transactions?q=rent').json
+    assert (first['stale'], first['sync']) == (True, 'refreshing')
+    assert (second['stale'], second['sync']) == (True, 'failed')
@@ -0,0 +1,247 @@
+import os
+import time
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
+from functools import wraps
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from flask_sqlalchemy.session import Session
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+pool_checkout_wait = metrics.histogram(
+    'db_pool_checkout_wait_seconds',
+    'Time spent waiting to check a connection out of the pool',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+pool_connections = metrics.gauge(
+    'db_pool_connections',
+    'Connections held by the pool, by state'
+)
+replica_fallbacks = metrics.counter(
+    'db_replica_fallbacks_total',
+    'Read-only queries sent to the primary because the replica was lagging or down'
+)
+
+# Pool profiles. Each setting can be overridden with DB_<SETTING> for the web
+# profile or DB_BATCH_<SETTING> for the batch profile.
+POOL_PROFILES = {
+    'web': {
+        'pool_size': None,  # derived from the worker's concurrency
+        'max_overflow': None,
+        'pool_timeout': 10,
+        'pool_recycle': 300,
+        'pool_pre_ping': True,
+        'statement_timeout_ms': 15000,
+    },
+    'batch': {
+        'pool_size': 2,
+        'max_overflow': 0,
+        'pool_timeout': 60,
+        'pool_recycle': 300,
+        'pool_pre_ping': True,
+        'statement_timeout_ms': 120000,
+    },
+}
+
+_pools = weakref.WeakKeyDictionary()
+_engines = weakref.WeakSet()
+
+
+def web_concurrency():
+    """Number of requests a single worker process can serve at once"""
+    worker_class = os.environ.get('WEB_WORKER_CLASS', 'sync')
+    if worker_class == 'gevent':
+        return int(os.environ.get('WEB_WORKER_CONNECTIONS', 100))
+    if worker_class == 'gthread':
+        return int(os.environ.get('WEB_THREADS', 1))
+    return 1
+
+
+def _setting(profile, name, default):
+    prefix = 'DB_' if profile == 'web' else f'DB_{profile.upper()}_'
+    value = os.environ.get(prefix + name.upper())
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return int(value)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started,
+                                       profile=_pools.get(self, 'unknown'))
+
+    def recreate(self):
+        pool = super().recreate()
+        _pools[pool] = _pools.get(self, 'unknown')
+        return pool
+
+
+def engine_options(database_uri, profile='web'):
+    """Build SQLALCHEMY_ENGINE_OPTIONS for the given pool profile"""
+    defaults = POOL_PROFILES[profile]
+    url = make_url(database_uri)
+
+    if profile == 'web':
+        concurrency = web_concurrency()
+        pool_size = min(concurrency, _setting(profile, 'pool_size', 10))
+        max_overflow = _setting(profile, 'max_overflow', min(max(concurrency - pool_size, 0), pool_size))
+    else:
+        pool_size = _setting(profile, 'pool_size', defaults['pool_size'])
+        max_overflow = _setting(profile, 'max_overflow', defaults['max_overflow'])
+
+    options = {
+        'pool_pre_ping': _setting(profile, 'pool_pre_ping', defaults['pool_pre_ping']),
+    }
+
+    # In-memory SQLite uses a single shared connection; leave its pool alone
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+
+    options.update({
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': _setting(profile, 'pool_timeout', defaults['pool_timeout']),
+        'pool_recycle': _setting(profile, 'pool_recycle', defaults['pool_recycle']),
+    })
+
+    statement_timeout = _setting(profile, 'statement_timeout_ms', defaults['statement_timeout_ms'])
+    if url.get_backend_name() == 'postgresql' and statement_timeout:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+
+    return options
+
+
+def register_engine_metrics(engine, profile):
+    """Track an engine's pool so its connection counts are reported"""
+    _pools[engine.pool] = profile
+    _engines.add(engine)
+
+
+def dispose_after_fork():
+    """Drop pooled connections inherited from a parent process without closing them.
+
+    The parent still owns those sockets; the child opens its own on first use.
+    """
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+
+@metrics.register_collector
+def _collect_pool_connections():
+    for engine in list(_engines):
+        pool = engine.pool
+        profile = _pools.get(pool, 'unknown')
+        if not hasattr(pool, 'checkedout'):
+            continue
+        pool_connections.set(pool.checkedout(), profile=profile, state='checked_out')
+        pool_connections.set(pool.checkedin(), profile=profile, state='idle')
+        pool_connections.set(max(pool.overflow(), 0), profile=profile, state='overflow')
+        pool_connections.set(pool.size(), profile=profile, state='pool_size')
+
+
+class ReplicaHealth:
+    """Cached lag / availability check for the read replica engine"""
+
+    # Lag is zero when everything received has been replayed; otherwise it is
+    # the age of the last replayed transaction. NULL on a primary.
+    POSTGRES_LAG_SQL = text(
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+    )
+
+    def __init__(self):
+        self.max_lag = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 10))
+        self.interval = float(os.environ.get('REPLICA_HEALTH_INTERVAL', 5))
+        self._lock = threading.Lock()
+        self._checked_at = {}
+        self._healthy = {}
+
+    def is_healthy(self, engine):
+        now = time.monotonic()
+        if now - self._checked_at.get(engine, float('-inf')) < self.interval:
+            return self._healthy.get(engine, False)
+
+        with self._lock:
+            # Another thread may have refreshed the status while we waited
+            if now - self._checked_at.get(engine, float('-inf')) >= self.interval:
+                self._healthy[engine] = self._check(engine)
+                self._checked_at[engine] = time.monotonic()
+        return self._healthy[engine]
+
+    def _check(self, engine):
+        try:
+            with engine.connect() as conn:
+                lag = self._lag(conn)
+        except Exception as e:
+            logger.warning(f"Read replica unavailable, using primary: {e}")
+            return False
+
+        if lag > self.max_lag:
+            logger.warning(f"Read replica lagging by {lag:.1f}s, using primary")
+            return False
+        return True
+
+    def _lag(self, conn):
+        """Seconds of replay lag; other databases (SQLite in development) only prove they answer"""
+        if conn.dialect.name == 'postgresql':
+            return conn.execute(self.POSTGRES_LAG_SQL).scalar() or 0
+        conn.execute(text('SELECT 1'))
+        return 0
+
+
+replica_health = ReplicaHealth()
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the 'replica' bind inside replica_reads().
+
+    Flushes always go to the primary, as does everything outside a
+    replica_reads() block or when the replica is unhealthy.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('use_replica') and not self._flushing:
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                if replica_health.is_healthy(replica):
+                    return replica
+                replica_fallbacks.inc()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def replica_reads():
+    """Route queries in this block to the read replica, if one is configured"""
+    from app import db
+
+    session = db.session()
+    previous = session.info.get('use_replica', False)
+    session.info['use_replica'] = True
+    try:
+        yield
+    finally:
+        session.info['use_replica'] = previous
+
+
+def read_replica(view):
+    """Decorator for read-only views that can be served from the replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
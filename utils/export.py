@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+# Rows fetched from the database cursor per round trip while streaming
+EXPORT_BATCH_SIZE = 500
+
+
+def plain_value(value):
+    """Convert a column value into something CSV/JSON can carry losslessly"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def stream_csv(columns, rows, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a CSV document chunk by chunk: the header first, then batches of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    for row in rows:
+        writer.writerow(['' if value is None else plain_value(value) for value in row])
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if pending:
+        yield buffer.getvalue()
+
+
+def stream_json(columns, rows, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a JSON array of objects chunk by chunk without building it in memory"""
+    yield '['
+    chunk = []
+    separator = ''
+    for row in rows:
+        chunk.append(separator + json.dumps({column: plain_value(value) for column, value in zip(columns, row)}))
+        separator = ','
+        if len(chunk) >= batch_size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+    yield ']\n'
@@ -0,0 +1,104 @@
+import codecs
+import json
+
+_WHITESPACE = ' \t\r\n'
+
+
+class JSONArrayStream:
+    """Iterate over one array member of a JSON object while its bytes arrive.
+
+    chunks is an iterable of bytes, e.g. response.iter_content(). Only one
+    array element is decoded at a time, so memory stays flat however long
+    the array is. The object's other members (small ones such as a paging
+    cursor) are collected into `fields` and are complete once iteration ends.
+    """
+
+    def __init__(self, chunks, key, parse_float=None):
+        self.chunks = chunks
+        self.key = key
+        self.fields = {}
+        self.parse_float = parse_float
+
+    def __iter__(self):
+        reader = _Reader(self.chunks, json.JSONDecoder(parse_float=self.parse_float))
+        reader.expect('{')
+        while True:
+            char = reader.peek()
+            if char == '}':
+                return
+            if char == ',':
+                reader.pos += 1
+                continue
+
+            name = reader.value()
+            reader.expect(':')
+            if name != self.key:
+                self.fields[name] = reader.value()
+                continue
+
+            reader.expect('[')
+            while True:
+                char = reader.peek()
+                if char == ']':
+                    reader.pos += 1
+                    break
+                if char == ',':
+                    reader.pos += 1
+                    continue
+                yield reader.value()
+
+
+class _Reader:
+    """A text window over the chunks, refilled whenever a value runs off its end"""
+
+    def __init__(self, chunks, decoder):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = decoder
+        self.text = ''
+        self.pos = 0
+        self.done = False
+
+    def _fill(self):
+        if self.done:
+            raise ValueError('Unexpected end of JSON input')
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.done = True
+            decoded = self._utf8.decode(b'', final=True)
+        else:
+            decoded = self._utf8.decode(chunk)
+        # Drop what has been consumed so the window never grows past one value
+        self.text = self.text[self.pos:] + decoded
+        self.pos = 0
+
+    def peek(self):
+        """The next non-whitespace character, without consuming it"""
+        while True:
+            text, pos = self.text, self.pos
+            while pos < len(text) and text[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(text):
+                return text[pos]
+            self._fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f'Expected {char!r} in JSON input')
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.text, self.pos)
+                # A value touching the end of the window (e.g. a number) may continue in the next chunk
+                if end < len(self.text) or self.done:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.done:
+                    raise
+            self._fill()
@@ -0,0 +1,98 @@
+"""Bring an existing database up to date with the models.
+
+db.create_all() creates missing tables but never changes a table that
+already exists, so columns, indexes and unique constraints added to a model
+later would be missing on a database created before them. upgrade_schema()
+adds them. Each step checks the live schema first, so running it again, or
+against a database create_all() just built, changes nothing. Altering or
+dropping an existing column still needs a hand-written migration.
+"""
+import logging
+from sqlalchemy import UniqueConstraint, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaUpgradeError(Exception):
+    """Existing rows stop the database being brought up to date with the models"""
+
+
+def upgrade_schema(engine, metadata):
+    """Add missing columns, indexes and unique constraints; returns a description of each change.
+
+    Raises SchemaUpgradeError after making every other change if existing
+    rows stop a unique constraint being added; remove the duplicates and run
+    it again. Also raises it, straight away, for a new NOT NULL column with
+    no server default, which existing rows would need a migration to fill.
+    """
+    changes, failures = [], []
+    existing = set(inspect(engine).get_table_names())
+    for table in metadata.sorted_tables:
+        if table.name not in existing:
+            continue  # create_all() makes it whole
+        with engine.begin() as conn:
+            changes += _add_columns(conn, table)
+            changes += _add_indexes(conn, table)
+        for constraint in _missing_unique_constraints(engine, table):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(_create_unique_index(conn.dialect, table, constraint)))
+                changes.append(f'{table.name}: unique ({", ".join(constraint.columns.keys())})')
+            except IntegrityError as e:
+                logger.error(f'Could not add unique ({", ".join(constraint.columns.keys())}) '
+                             f'to {table.name}: {e.orig}')
+                failures.append(f'{table.name} ({", ".join(constraint.columns.keys())})')
+    if failures:
+        raise SchemaUpgradeError(f'Duplicate rows block unique constraints on {"; ".join(failures)}')
+    return changes
+
+
+def _add_columns(conn, table):
+    present = {column['name'] for column in inspect(conn).get_columns(table.name)}
+    preparer = conn.dialect.identifier_preparer
+    changes = []
+    for column in table.columns:
+        if column.name in present:
+            continue
+        if not column.nullable and column.server_default is None:
+            raise SchemaUpgradeError(f'{table.name}.{column.name} is NOT NULL without a server default; '
+                                     f'existing rows need a migration that fills it')
+        ddl = str(CreateColumn(column).compile(dialect=conn.dialect))
+        for foreign_key in column.foreign_keys:
+            target = foreign_key.column
+            ddl += (f' REFERENCES {preparer.format_table(target.table)} ({preparer.quote(target.name)})')
+            if foreign_key.ondelete:
+                ddl += f' ON DELETE {foreign_key.ondelete}'
+        conn.execute(text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}'))
+        changes.append(f'{table.name}: column {column.name}')
+    return changes
+
+
+def _add_indexes(conn, table):
+    present = {index['name'] for index in inspect(conn).get_indexes(table.name)}
+    changes = []
+    for index in sorted(table.indexes, key=lambda index: index.name):
+        if index.name not in present:
+            index.create(conn)
+            changes.append(f'{table.name}: index {index.name}')
+    return changes
+
+
+def _missing_unique_constraints(engine, table):
+    inspector = inspect(engine)
+    # A unique index enforces the same rule as a unique constraint on its columns
+    present = {frozenset(constraint['column_names']) for constraint in inspector.get_unique_constraints(table.name)}
+    present |= {frozenset(index['column_names']) for index in inspector.get_indexes(table.name) if index['unique']}
+    present |= {frozenset(inspector.get_pk_constraint(table.name)['constrained_columns'])}
+    return [constraint for constraint in table.constraints
+            if isinstance(constraint, UniqueConstraint)
+            and frozenset(constraint.columns.keys()) not in present]
+
+
+def _create_unique_index(dialect, table, constraint):
+    preparer = dialect.identifier_preparer
+    name = constraint.name or f'uq_{table.name}_{"_".join(constraint.columns.keys())}'
+    columns = ', '.join(preparer.quote(column) for column in constraint.columns.keys())
+    return f'CREATE UNIQUE INDEX {preparer.quote(name)} ON {preparer.format_table(table)} ({columns})'
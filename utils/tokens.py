@@ -0,0 +1,20 @@
+import hashlib
+import hmac
+import secrets
+
+
+def generate_token():
+    """Generate a URL-safe token to send to the user"""
+    return secrets.token_urlsafe(32)
+
+
+def hash_token(token):
+    """Return the SHA-256 hex digest stored in place of the raw token"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def token_matches(token, token_hash):
+    """Constant-time comparison of a raw token against a stored digest"""
+    if not token or not token_hash:
+        return False
+    return hmac.compare_digest(hash_token(token), token_hash)
@@ -0,0 +1,173 @@
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+RENT_FREQUENCIES = ('Weekly', 'Fortnightly', 'Monthly')
+
+# Longest early or late payment window a property can set
+MAX_WINDOW_DAYS = 14
+
+_FALSE_FLAGS = ('', '0', 'false', 'no', 'off', 'n', 'f')
+
+# A cached rejection. Each raise gets a fresh ValidationError: re-raising one
+# instance would chain every row's traceback onto it.
+_Rejected = namedtuple('_Rejected', 'message field')
+
+
+class ValidationError(ValueError):
+    """Raised with a user-facing message when submitted data is invalid"""
+
+    def __init__(self, message, field=None):
+        super().__init__(message)
+        self.message = message
+        self.field = field
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _flag(text):
+    return text.lower() not in _FALSE_FLAGS
+
+
+def _positive_decimal(text):
+    value = Decimal(text)
+    if not value.is_finite() or value <= 0:
+        raise ValueError(text)
+    return value
+
+
+class Field:
+    """One field of a payload schema: how to convert and check its text.
+
+    convert turns the stripped text into a value and may raise ValueError,
+    InvalidOperation or TypeError; choices and valid are checked on the
+    result. Fields with `when=(other field, values)` only apply when that
+    earlier field has one of those values, and are None otherwise.
+    Optional fields are None when left blank instead of being converted.
+    """
+
+    def __init__(self, name, convert=None, required=False, choices=None, valid=None,
+                 message=None, lower=False, when=None, optional=False):
+        self.name = name
+        self.convert = convert
+        self.required = required
+        self.choices = choices
+        self.valid = valid
+        self.message = message
+        self.lower = lower
+        self.when = when
+        self.optional = optional
+
+    def compile(self):
+        """Return a function from raw text to the cleaned value"""
+        name, convert, choices, valid, message, lower, optional = (
+            self.name, self.convert, self.choices, self.valid, self.message, self.lower, self.optional)
+
+        def clean(text):
+            if optional and not text:
+                return None
+            if lower:
+                text = text.lower()
+            try:
+                value = convert(text) if convert is not None else text
+            except (ValueError, TypeError, InvalidOperation):
+                raise ValidationError(message, name)
+            if (choices is not None and value not in choices) or (valid is not None and value not in valid):
+                raise ValidationError(message, name)
+            return value
+
+        return clean
+
+
+class Schema:
+    """A payload validator compiled once from a list of fields.
+
+    validate() checks one mapping (a form, JSON object or CSV row);
+    validate_many() is the batch path used by imports. It reuses the
+    compiled steps and memoises conversions of repeated values, such as
+    the same rent amount or due day, across the whole batch.
+    """
+
+    def __init__(self, *fields, required_message='Please fill in all required fields.'):
+        self.fields = fields
+        self.required_message = required_message
+        self._names = tuple(field.name for field in fields)
+        self._required = tuple(field.name for field in fields if field.required)
+        self._steps = tuple(
+            (field.name, field.compile(), field.convert is not None, field.when) for field in fields
+        )
+
+    def validate(self, data, cache=None):
+        """Return a dict of cleaned values, or raise ValidationError"""
+        raw = {name: _text(data.get(name)) for name in self._names}
+
+        for name in self._required:
+            if not raw[name]:
+                raise ValidationError(self.required_message, name)
+
+        values = {}
+        for name, clean, cacheable, when in self._steps:
+            if when is not None and values[when[0]] not in when[1]:
+                values[name] = None
+                continue
+
+            text = raw[name]
+            if cache is None or not cacheable:
+                values[name] = clean(text)
+                continue
+
+            key = (name, text)
+            if key not in cache:
+                try:
+                    cache[key] = clean(text)
+                except ValidationError as e:
+                    cache[key] = _Rejected(e.message, e.field)
+            result = cache[key]
+            if isinstance(result, _Rejected):
+                raise ValidationError(result.message, result.field)
+            values[name] = result
+
+        return values
+
+    def validate_many(self, rows):
+        """Yield (row number, values, error) for each (row number, data) pair"""
+        cache = {}
+        validate = self.validate
+        for number, data in rows:
+            try:
+                yield number, validate(data, cache), None
+            except ValidationError as e:
+                yield number, None, e
+
+
+PROPERTY_SCHEMA = Schema(
+    Field('address', required=True),
+    Field('tenant_name', required=True),
+    Field('tenant_email', required=True, lower=True),
+    Field('rent_amount', required=True, convert=_positive_decimal,
+          message='Please enter a valid rent amount.'),
+    Field('rent_frequency', required=True, choices=RENT_FREQUENCIES,
+          message='Please select a valid rent frequency.'),
+    Field('rent_due_day_of_week', convert=int, valid=range(7),
+          message='Please select a valid day of the week.',
+          when=('rent_frequency', ('Weekly', 'Fortnightly'))),
+    Field('rent_due_day', convert=int, valid=range(1, 32),
+          message='Please select a valid day of the month.',
+          when=('rent_frequency', ('Monthly',))),
+    Field('bank_statement_keyword', required=True),
+    Field('send_tenant_reminder', convert=_flag),
+    Field('payment_window_early_days', convert=int, valid=range(MAX_WINDOW_DAYS + 1), optional=True,
+          message=f'Please enter an early payment window between 0 and {MAX_WINDOW_DAYS} days.'),
+    Field('payment_window_late_days', convert=int, valid=range(MAX_WINDOW_DAYS + 1), optional=True,
+          message=f'Please enter a late payment window between 0 and {MAX_WINDOW_DAYS} days.'),
+)
+
+
+def validate_property(data):
+    """Validate property fields from a form, CSV row or JSON object.
+
+    Returns a dict of cleaned values ready for Property(**values); raises
+    ValidationError with the same messages the property forms show.
+    """
+    return PROPERTY_SCHEMA.validate(data)
@@ -0,0 +1,17 @@
+"""Production entry point: `gunicorn wsgi:app -c gunicorn.conf.py`.
+
+Building the app here, rather than on `import app`, keeps models, CLI
+commands and scheduler jobs free of start-up side effects. gunicorn
+preloads this module in the arbiter, so the tables are created once and
+forked workers share the imported code; each worker then starts its own
+scheduler from gunicorn.conf.py's post_worker_init. If the schema can't
+be upgraded, this exits non-zero and gunicorn stops rather than serving.
+"""
+from app import create_app, create_tables
+from utils.schema import SchemaUpgradeError
+
+app = create_app()
+try:
+    create_tables(app)
+except SchemaUpgradeError:
+    raise SystemExit(1)